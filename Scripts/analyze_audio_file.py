@@ -3,70 +3,59 @@
 # This script performs sentiment analysis on any audio file provided as input
 
 import os
+import sys
+import csv
+import glob
+import json
 import numpy as np
-import librosa
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from sklearn.preprocessing import StandardScaler
 import pickle
 import argparse
+import multiprocessing
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from audio_decode import iter_audio_blocks, load_audio_file
+from audio_features import extract_features_batch, prepare_waveform
+from compiled_inference import CompiledModel
+from feature_store import FeatureStore, file_digest
+from label_schema import LabelSchema
+from model_registry import latest_model
+from segments import SEGMENT_BATCH_SIZE, SEGMENT_HOP_SECONDS, iter_segment_batches, summarize_segments
 
 # Define constants
 SAMPLE_RATE = 16000  # 16kHz sampling rate for speech
 DURATION = 3.0       # 3 seconds per sample
 N_MFCC = 40          # Number of MFCC coefficients
+TRIM_TOP_DB = 20     # Silence threshold for trimming (dB below peak)
 MODELS_DIR = "models"  # Directory where models are stored
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.ogg', '.mp3', '.m4a')
 
 def extract_features_from_audio(audio, feature_type='mfcc', sr=SAMPLE_RATE, n_mfcc=N_MFCC):
     """Extract features from an audio array"""
-    if feature_type == 'mfcc':
-        # Extract Mel-Frequency Cepstral Coefficients
-        mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=n_mfcc)
-        
-        # Normalize the MFCCs
-        mfccs = StandardScaler().fit_transform(mfccs.T).T
-        return mfccs
-        
-    elif feature_type == 'melspec':
-        # Extract Mel spectrogram
-        melspec = librosa.feature.melspectrogram(y=audio, sr=sr, n_mels=128)
-        
-        # Convert to decibels
-        melspec_db = librosa.power_to_db(melspec, ref=np.max)
-        return melspec_db
-        
-    elif feature_type == 'combined':
-        # Extract both MFCCs and Mel spectrogram
-        mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=n_mfcc)
-        mfccs = StandardScaler().fit_transform(mfccs.T).T
-        
-        melspec = librosa.feature.melspectrogram(y=audio, sr=sr, n_mels=128)
-        melspec_db = librosa.power_to_db(melspec, ref=np.max)
-        
-        # Combine features
-        combined = np.concatenate([mfccs, melspec_db[:n_mfcc]])
-        return combined
-    
-    else:
-        raise ValueError(f"Unknown feature type: {feature_type}")
+    # Shared batched extractor; these models were trained on standardized MFCCs
+    return extract_features_batch(audio[np.newaxis], feature_type, normalize=True, sr=sr, n_mfcc=n_mfcc)[0]
 
-def analyze_audio_file(file_path, model_path=None, encoder_path=None, feature_type='mfcc'):
-    """Analyze a single audio file for sentiment"""
-    print(f"\nAnalyzing file: {file_path}")
-    start_time = time.time()
+def load_model_and_encoder(model_path=None, encoder_path=None):
+    """Load the model and label encoder, defaulting to the newest model in models/"""
+    if model_path is None and encoder_path is None:
+        # Prefer the newest versioned emotion_model_<version>.h5 / label_encoder pair
+        latest = latest_model(MODELS_DIR)
+        if latest is not None:
+            _, model_path, encoder_path = latest
+            print(f"Using model: {model_path}")
     
-    # Load the model and label encoder
     if model_path is None:
-        # Find the most recent model
-        model_files = [f for f in os.listdir(MODELS_DIR) if f.endswith('.h5')]
+        # Otherwise fall back to the most recent .h5
+        model_files = [f for f in os.listdir(MODELS_DIR) if f.endswith('.h5')] if os.path.isdir(MODELS_DIR) else []
         if model_files:
             model_file = max(model_files, key=lambda x: os.path.getmtime(os.path.join(MODELS_DIR, x)))
             model_path = os.path.join(MODELS_DIR, model_file)
             print(f"Using model: {model_path}")
         else:
             print("No model found in models directory. Please train a model first.")
-            return
+            return None
     
     if encoder_path is None:
         # Try to find the label encoder
@@ -74,27 +63,106 @@ def analyze_audio_file(file_path, model_path=None, encoder_path=None, feature_ty
         if os.path.exists(default_encoder):
             encoder_path = default_encoder
     
-    # Load model
-    model = load_model(model_path)
+    # TensorFlow is imported here so batch-mode worker processes never load it
+    from tensorflow.keras.models import load_model
+    # One traced graph per batch-size bucket instead of model.predict's per-call setup
+    model = CompiledModel(load_model(model_path))
     
-    # Load label encoder
     with open(encoder_path, 'rb') as f:
         label_encoder = pickle.load(f)
+    return model, LabelSchema.from_encoder(label_encoder)
+
+def analyze_segments(file_path, model, labels, feature_type='mfcc',
+                     hop_seconds=SEGMENT_HOP_SECONDS, batch_size=SEGMENT_BATCH_SIZE):
+    """Analyze a whole recording as overlapping DURATION-second windows
+
+    The file is decoded in blocks and every batch of windows goes through the
+    model in one call, so memory stays bounded for arbitrarily long files.
+    Returns (timeline, mean class probabilities).
+    """
+    timeline = []
+    window_scores = []
+    batches = iter_segment_batches(
+        iter_audio_blocks(file_path, SAMPLE_RATE),
+        feature_type=feature_type,
+        normalize=True,
+        sr=SAMPLE_RATE,
+        duration=DURATION,
+        hop_seconds=hop_seconds,
+        batch_size=batch_size,
+        n_mfcc=N_MFCC
+    )
+    for spans, features in batches:
+        # Add the channel dimension
+        predictions = model.predict(features[..., np.newaxis])
+        for (start, end), (label, sentiment, confidence) in zip(spans, labels.labels(predictions)):
+            timeline.append({
+                "start": start,
+                "end": end,
+                "emotion": label,
+                "sentiment": sentiment,
+                "confidence": confidence * 100
+            })
+        window_scores.extend(predictions)
+    if not window_scores:
+        raise ValueError("No audio decoded")
+    mean_scores, _ = summarize_segments(window_scores)
+    return timeline, mean_scores
+
+def analyze_audio_file(file_path, model_path=None, encoder_path=None, feature_type='mfcc',
+                       segmented=False, hop_seconds=SEGMENT_HOP_SECONDS, batch_size=SEGMENT_BATCH_SIZE):
+    """Analyze a single audio file for sentiment
+
+    By default only the first DURATION seconds (after trimming silence) are
+    analyzed. With segmented=True the whole file is analyzed as overlapping
+    windows and the result also contains a per-window timeline.
+    """
+    print(f"\nAnalyzing file: {file_path}")
+    start_time = time.time()
+    
+    # Load the model and label encoder
+    loaded = load_model_and_encoder(model_path, encoder_path)
+    if loaded is None:
+        return
+    model, labels = loaded
     
     try:
+        if segmented:
+            print(f"Analyzing overlapping {DURATION:.0f}s windows every {hop_seconds}s...")
+            timeline, mean_scores = analyze_segments(
+                file_path, model, labels, feature_type, hop_seconds, batch_size)
+            
+            # Aggregated verdict: the class with the highest mean probability
+            predicted_label, sentiment, confidence = labels.labels(mean_scores[np.newaxis])[0]
+            confidence *= 100
+            
+            # Print results
+            print("\nTimeline:")
+            for segment in timeline:
+                print(f"  {segment['start']:7.2f}s - {segment['end']:7.2f}s  {segment['emotion']:16s} "
+                      f"{segment['sentiment']:9s} {segment['confidence']:5.1f}%")
+            print("\nResults:")
+            print(f"Overall emotion: {predicted_label}")
+            print(f"Sentiment category: {sentiment}")
+            print(f"Confidence: {confidence:.1f}% (mean over {len(timeline)} windows)")
+            print(f"Analysis completed in {time.time() - start_time:.2f} seconds")
+            
+            return {
+                "file": file_path,
+                "emotion": predicted_label,
+                "sentiment": sentiment,
+                "confidence": float(confidence),
+                "duration": float(timeline[-1]["end"]),
+                "timeline": timeline,
+                "processing_time": float(time.time() - start_time)
+            }
+        
         # Load and preprocess audio
         print("Loading audio file...")
-        audio, _ = librosa.load(file_path, sr=SAMPLE_RATE)
+        audio = load_audio_file(file_path, SAMPLE_RATE)
         
-        # Trim silence
-        audio, _ = librosa.effects.trim(audio, top_db=20)
-        
-        # Standardize length
-        target_length = int(DURATION * SAMPLE_RATE)
-        if len(audio) > target_length:
-            audio = audio[:target_length]
-        else:
-            audio = np.pad(audio, (0, max(0, target_length - len(audio))), 'constant')
+        # Trim silence and standardize length
+        audio = prepare_waveform(audio, TRIM_TOP_DB, sr=SAMPLE_RATE, duration=DURATION)
         
         # Extract features
         print(f"Extracting {feature_type} features...")
@@ -105,21 +173,11 @@ def analyze_audio_file(file_path, model_path=None, encoder_path=None, feature_ty
         
         # Make prediction
         print("Predicting sentiment...")
-        prediction = model.predict(features, verbose=0)
-        predicted_class = np.argmax(prediction, axis=1)[0]
-        
-        # Get label
-        predicted_label = label_encoder.inverse_transform([predicted_class])[0]
-        confidence = np.max(prediction) * 100
+        prediction = model.predict(features)
         
-        # Map to sentiment category
-        sentiment = "unknown"
-        if "_happy" in predicted_label or "_surprise" in predicted_label:
-            sentiment = "positive"
-        elif "_sad" in predicted_label or "_angry" in predicted_label or "_fear" in predicted_label or "_disgust" in predicted_label:
-            sentiment = "negative"
-        elif "_neutral" in predicted_label:
-            sentiment = "neutral"
+        # Get label and sentiment category
+        predicted_label, sentiment, confidence = labels.labels(prediction)[0]
+        confidence *= 100
         
         # Print results
         print("\nResults:")
@@ -141,19 +199,318 @@ def analyze_audio_file(file_path, model_path=None, encoder_path=None, feature_ty
         print(f"Error analyzing file: {e}")
         return None
 
+def is_batch_input(target):
+    """True when target names many clips: a directory, a glob or a manifest"""
+    return (
+        os.path.isdir(target)
+        or glob.has_magic(target)
+        or target.lower().endswith(('.txt', '.csv'))
+    )
+
+def collect_clips(target):
+    """Expand a directory, glob pattern or manifest into a sorted list of paths
+
+    A .txt manifest lists one path per line; a .csv manifest has a `path`
+    column. Relative manifest paths are resolved against the manifest folder.
+    """
+    if os.path.isdir(target):
+        pattern = os.path.join(target, '**', '*')
+    elif glob.has_magic(target):
+        pattern = target
+    else:
+        base = os.path.dirname(os.path.abspath(target))
+        with open(target, newline='') as f:
+            if target.lower().endswith('.csv'):
+                paths = [row['path'] for row in csv.DictReader(f)]
+            else:
+                paths = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        return [os.path.join(base, path) for path in paths]
+    return sorted(
+        path for path in glob.glob(pattern, recursive=True)
+        if path.lower().endswith(AUDIO_EXTENSIONS) and os.path.isfile(path)
+    )
+
+def load_clip_features(path, feature_type):
+    """Decode one clip and extract its model features (runs in a worker process)"""
+    audio = load_audio_file(path, SAMPLE_RATE)
+    audio = prepare_waveform(audio, TRIM_TOP_DB, sr=SAMPLE_RATE, duration=DURATION)
+    return extract_features_from_audio(audio, feature_type)
+
+def open_feature_store(root, feature_type):
+    """The feature store for clips featurized the way load_clip_features does"""
+    return FeatureStore(root, feature_type=feature_type, sr=SAMPLE_RATE, n_mfcc=N_MFCC,
+                        duration=DURATION, trim_top_db=TRIM_TOP_DB, normalize=True)
+
+class ResultWriter:
+    """Append result rows to a CSV, JSONL or Parquet output, flushing every batch
+
+    Rows already in the output are read back first, so an interrupted run can
+    be resumed and skips clips it has already scored. Parquet output is a
+    directory of part files (one per flush) and needs pyarrow.
+    """
+    FIELDS = ['file', 'emotion', 'sentiment', 'confidence', 'error']
+
+    def __init__(self, path, resume=True):
+        self.path = path
+        lower = path.lower()
+        self.format = 'parquet' if lower.endswith('.parquet') else 'jsonl' if lower.endswith(('.jsonl', '.ndjson')) else 'csv'
+        self.done = set()
+        self._file = None
+        self._parts = 0
+
+        if self.format == 'parquet':
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise SystemExit("Parquet output requires pyarrow: pip install pyarrow")
+            self._pa = pyarrow
+            self._pq = pyarrow.parquet
+            os.makedirs(path, exist_ok=True)
+            parts = sorted(glob.glob(os.path.join(path, 'part-*.parquet')))
+            if not resume:
+                for part in parts:
+                    os.remove(part)
+                parts = []
+            for part in parts:
+                self.done.update(self._pq.read_table(part, columns=['file']).column('file').to_pylist())
+            self._parts = len(parts)
+            return
+
+        exists = resume and os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            self._drop_partial_line()
+            with open(path, newline='') as f:
+                if self.format == 'csv':
+                    self.done.update(row['file'] for row in csv.DictReader(f))
+                else:
+                    self.done.update(json.loads(line)['file'] for line in f if line.strip())
+        self._file = open(path, 'a' if exists else 'w', newline='')
+        if self.format == 'csv':
+            self._csv = csv.DictWriter(self._file, fieldnames=self.FIELDS)
+            if not exists:
+                self._csv.writeheader()
+
+    def _drop_partial_line(self):
+        """Cut off a row left half-written by an interrupted run"""
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self.format == 'parquet':
+            table = self._pa.Table.from_pylist([{field: row.get(field) for field in self.FIELDS} for row in rows])
+            self._pq.write_table(table, os.path.join(self.path, f"part-{self._parts:05d}.parquet"))
+            self._parts += 1
+        elif self.format == 'csv':
+            self._csv.writerows(rows)
+        else:
+            for row in rows:
+                self._file.write(json.dumps(row) + '\n')
+        if self._file is not None:
+            self._file.flush()
+        self.done.update(row['file'] for row in rows)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def analyze_many(target, output, model_path=None, encoder_path=None, feature_type='mfcc',
+                 workers=None, batch_size=SEGMENT_BATCH_SIZE, resume=True, feature_store=None):
+    """Score every clip in a directory, glob or manifest and write one row per clip
+
+    The model is loaded once. Clips are decoded and featurized by a pool of
+    worker processes and scored batch_size at a time; each batch of results is
+    appended to output, so an interrupted run resumes where it stopped.
+
+    With feature_store (a directory), features are looked up by the hash of
+    each file's content first and only clips not seen before are decoded; their
+    features are added to the store, so scoring the archive again (e.g. with a
+    new model) skips decoding and feature extraction.
+    """
+    clips = collect_clips(target)
+    writer = ResultWriter(output, resume=resume)
+    pending_clips = [path for path in clips if path not in writer.done]
+    print(f"Found {len(clips)} clips, {len(clips) - len(pending_clips)} already in {output}")
+    if not pending_clips:
+        writer.close()
+        return
+    
+    loaded = load_model_and_encoder(model_path, encoder_path)
+    if loaded is None:
+        writer.close()
+        return
+    model, labels = loaded
+    
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 2) - 1)
+    executor = None
+    if workers > 0:
+        # Workers import this module but not TensorFlow
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+    
+    store = open_feature_store(feature_store, feature_type) if feature_store else None
+    digests = {}   # path -> content hash of clips being featurized for the store
+    
+    start_time = time.time()
+    processed = 0
+    ready = []   # (path, features) waiting for the next batched prediction
+    
+    def error_row(path, e):
+        return {'file': path, 'emotion': None, 'sentiment': None, 'confidence': None, 'error': str(e) or type(e).__name__}
+    
+    def stored_features(path):
+        """Features of the clip from the store, or None when it has to be decoded"""
+        if store is None:
+            return None
+        digest = digests[path] = file_digest(path)
+        return store.get(digest)
+    
+    def featurized(path, features):
+        if store is not None:
+            store.put(digests.pop(path), features)
+        ready.append((path, features))
+    
+    def flush(rows):
+        """Score the ready clips and write their rows after rows (error rows of failed clips)"""
+        nonlocal processed
+        batch = list(ready)
+        ready.clear()
+        rows = list(rows)
+        if batch:
+            try:
+                predictions = model.predict(np.stack([features for _, features in batch])[..., np.newaxis])
+                for (path, _), (label, sentiment, confidence) in zip(batch, labels.labels(predictions)):
+                    rows.append({
+                        'file': path,
+                        'emotion': label,
+                        'sentiment': sentiment,
+                        'confidence': confidence * 100,
+                        'error': None
+                    })
+            except Exception as e:
+                # e.g. a stored feature tensor of the wrong shape: the whole batch fails
+                rows.extend(error_row(path, e) for path, _ in batch)
+        writer.write(rows)
+        processed += len(rows)
+        elapsed = time.time() - start_time
+        print(f"\r{processed}/{len(pending_clips)} clips, {processed / max(elapsed, 1e-9):.1f} clips/s", end="")
+    
+    failed = []   # error rows of clips that could not be decoded, written with the next batch
+    try:
+        if executor is None:
+            for path in pending_clips:
+                try:
+                    features = stored_features(path)
+                    if features is not None:
+                        ready.append((path, features))
+                    else:
+                        featurized(path, load_clip_features(path, feature_type))
+                except Exception as e:
+                    digests.pop(path, None)
+                    failed.append(error_row(path, e))
+                if len(ready) >= batch_size or len(failed) >= batch_size:
+                    flush(failed)
+                    failed = []
+        else:
+            # Keep a bounded number of clips in flight so memory stays flat
+            queue = iter(pending_clips)
+            in_flight = {}
+            max_in_flight = max(2 * batch_size, 4 * workers)
+            while True:
+                for path in queue:
+                    # Clips already in the feature store never reach the workers
+                    try:
+                        features = stored_features(path)
+                    except OSError as e:
+                        failed.append(error_row(path, e))
+                        continue
+                    if features is not None:
+                        ready.append((path, features))
+                        if len(ready) >= batch_size:
+                            flush(failed)
+                            failed = []
+                        continue
+                    in_flight[executor.submit(load_clip_features, path, feature_type)] = path
+                    if len(in_flight) >= max_in_flight:
+                        break
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = in_flight.pop(future)
+                    try:
+                        featurized(path, future.result())
+                    except Exception as e:
+                        digests.pop(path, None)
+                        failed.append(error_row(path, e))
+                if len(ready) >= batch_size or len(failed) >= batch_size:
+                    flush(failed)
+                    failed = []
+        if ready or failed:
+            flush(failed)
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun the same command to resume.")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        writer.close()
+        if store is not None:
+            store.close()
+    
+    elapsed = time.time() - start_time
+    print(f"\nScored {processed} clips in {elapsed:.1f}s ({processed / max(elapsed, 1e-9):.1f} clips/s) -> {output}")
+    if store is not None:
+        stats = store.stats()
+        print(f"Feature store: {stats['hits']} clips loaded, {stats['misses']} not stored yet "
+              f"({stats['clips']} clips in {stats['directory']})")
+
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="Audio File Sentiment Analysis")
-    parser.add_argument("file", type=str, help="Path to audio file for analysis")
+    parser.add_argument("file", type=str,
+                        help="Audio file to analyze, or a directory, glob or manifest (.txt/.csv) for batch mode")
     parser.add_argument("--model", type=str, default=None, help="Path to model file (default: most recent in models/)")
     parser.add_argument("--encoder", type=str, default=None, help="Path to label encoder file (default: models/label_encoder.pkl)")
     parser.add_argument("--feature", type=str, default="mfcc", choices=["mfcc", "melspec", "combined"], 
                         help="Feature extraction method (default: mfcc)")
     
+    parser.add_argument("--segmented", action="store_true",
+                        help="Analyze the whole file as overlapping windows and print a timeline")
+    parser.add_argument("--hop", type=float, default=SEGMENT_HOP_SECONDS,
+                        help=f"Seconds between window starts with --segmented (default: {SEGMENT_HOP_SECONDS})")
+    parser.add_argument("--batch-size", type=int, default=SEGMENT_BATCH_SIZE,
+                        help=f"Windows (--segmented) or clips (batch mode) per model call (default: {SEGMENT_BATCH_SIZE})")
+    parser.add_argument("--output", type=str, default="results.csv",
+                        help="Batch mode results file: .csv, .jsonl or .parquet (default: results.csv)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Batch mode decode/feature processes; 0 runs them in-process (default: CPUs - 1)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Batch mode: overwrite the output instead of skipping clips already in it")
+    parser.add_argument("--feature-store", type=str, default=None,
+                        help="Batch mode: directory of cached features, reused across runs and models")
+    
     args = parser.parse_args()
     
+    if is_batch_input(args.file):
+        if args.segmented:
+            parser.error("--segmented analyzes a single file")
+        analyze_many(args.file, args.output, args.model, args.encoder, args.feature,
+                     workers=args.workers, batch_size=args.batch_size, resume=not args.no_resume,
+                     feature_store=args.feature_store)
+        return
+    
+    if args.feature_store:
+        parser.error("--feature-store is for batch mode (a directory, glob or manifest)")
+    
     # Analyze the file
-    analyze_audio_file(args.file, args.model, args.encoder, args.feature)
+    analyze_audio_file(args.file, args.model, args.encoder, args.feature,
+                       segmented=args.segmented, hop_seconds=args.hop, batch_size=args.batch_size)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# benchmark_cold_start.py
+# Measure model server cold start: process launch -> ready -> first response
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+import http.server
+import functools
+import numpy as np
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+def free_port():
+    """Ask the OS for an unused TCP port"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def serve_fixtures(directory):
+    """Serve audio fixtures over HTTP from a background thread; returns the base URL"""
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=directory)
+    handler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def write_fixture(directory):
+    """Write a 3 second 16 kHz tone-plus-noise clip to directory and return its file name"""
+    import soundfile
+    t = np.arange(3 * 16000) / 16000
+    y = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * np.random.default_rng(0).standard_normal(len(t))
+    # A syllable-rate envelope, so the clip passes the server's voice activity gate
+    y = (y * np.clip(np.sin(2 * np.pi * 4 * t), 0.05, None)).astype(np.float32)
+    soundfile.write(os.path.join(directory, 'cold_start.wav'), y, 16000, subtype='PCM_16')
+    return 'cold_start.wav'
+
+def post_json(url, payload, timeout=120):
+    """POST a JSON body and return (status, decoded JSON response)"""
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status, json.loads(response.read())
+
+def measure_once(command, port, audio_url, ready_timeout):
+    """Launch the server and time each milestone, in seconds since launch"""
+    env = dict(os.environ, BIND=f"127.0.0.1:{port}", WORKERS='1')
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    result = {}
+    try:
+        # Poll the readiness probe
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            if time.perf_counter() - start > ready_timeout:
+                raise RuntimeError("Server did not become ready in time")
+            try:
+                with urllib.request.urlopen(base + '/ready', timeout=1) as response:
+                    if response.status == 200:
+                        result['startup_phases'] = json.loads(response.read()).get('startup_seconds')
+                        break
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                pass
+            time.sleep(0.05)
+        result['ready'] = time.perf_counter() - start
+
+        status, _ = post_json(base + '/analyze', {'audio_url': audio_url})
+        result['first_response'] = time.perf_counter() - start
+        result['first_request_latency'] = result['first_response'] - result['ready']
+
+        request_start = time.perf_counter()
+        post_json(base + '/analyze', {'audio_url': audio_url})
+        result['warm_request_latency'] = time.perf_counter() - request_start
+        result['status'] = status
+        return result
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description="Model server cold-start benchmark")
+    parser.add_argument("--mode", type=str, default="dev", choices=["dev", "serve"],
+                        help="dev: python model_server.py; serve: python serve.py (default: dev)")
+    parser.add_argument("--runs", type=int, default=3, help="Number of cold starts (default: 3)")
+    parser.add_argument("--ready-timeout", type=float, default=300, help="Seconds to wait for /ready")
+    parser.add_argument("--output", type=str, default=None, help="Write results as JSON to this path")
+
+    args = parser.parse_args()
+
+    fixtures = tempfile.mkdtemp(prefix='cold_start_')
+    audio_url = f"{serve_fixtures(fixtures)}/{write_fixture(fixtures)}"
+
+    if args.mode == 'dev':
+        # The dev server always binds port 5000
+        port = 5000
+        command = [sys.executable, 'model_server.py']
+    else:
+        port = free_port()
+        command = [sys.executable, 'serve.py']
+
+    runs = []
+    for i in range(args.runs):
+        result = measure_once(command, port, audio_url, args.ready_timeout)
+        runs.append(result)
+        phases = result.get('startup_phases') or {}
+        breakdown = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in phases.items())
+        print(f"Run {i + 1}: ready {result['ready']:.2f}s, first response {result['first_response']:.2f}s "
+              f"(request {result['first_request_latency'] * 1000:.0f} ms, warm {result['warm_request_latency'] * 1000:.0f} ms)")
+        if breakdown:
+            print(f"       server phases: {breakdown}")
+
+    for key in ['ready', 'first_response', 'first_request_latency', 'warm_request_latency']:
+        values = np.array([run[key] for run in runs])
+        print(f"{key:22s} median {np.median(values):.3f}s  min {values.min():.3f}s  max {values.max():.3f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'mode': args.mode, 'runs': runs}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# benchmark_decode.py
+# Parity check and per-format benchmark: format-sniffing decode vs librosa.load
+
+import io
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import librosa
+import soundfile
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from audio_decode import load_audio_bytes, load_audio_file, sniff_format
+from audio_features import SAMPLE_RATE
+
+# (name, sample rate, channels, soundfile format, subtype)
+FORMATS = [
+    ('wav-pcm16-16k-mono', 16000, 1, 'WAV', 'PCM_16'),
+    ('wav-float32-16k-mono', 16000, 1, 'WAV', 'FLOAT'),
+    ('wav-pcm16-44k-stereo', 44100, 2, 'WAV', 'PCM_16'),
+    ('wav-float32-48k-mono', 48000, 1, 'WAV', 'FLOAT'),
+    ('wav-pcm24-16k-mono', 16000, 1, 'WAV', 'PCM_24'),
+    ('flac-44k-stereo', 44100, 2, 'FLAC', 'PCM_16'),
+    ('ogg-vorbis-44k-mono', 44100, 1, 'OGG', 'VORBIS'),
+    ('mp3-44k-mono', 44100, 1, 'MP3', 'MPEG_LAYER_III'),
+]
+
+def synthetic_speech(seconds, sr, channels, seed=0):
+    """Voiced harmonics with a syllable-rate envelope plus a little noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.3 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sr
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 20))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    y = 0.2 * voiced * envelope + 0.01 * rng.standard_normal(len(t))
+    return np.stack([y * (1 - 0.2 * c) for c in range(channels)], axis=1).astype(np.float32)
+
+def timed(function, repeats):
+    """Median seconds per call after one warm-up call"""
+    function()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+def main():
+    parser = argparse.ArgumentParser(description="Audio decode parity check and per-format benchmark")
+    parser.add_argument("--seconds", type=float, default=30, help="Length of each test recording (default: 30)")
+    parser.add_argument("--repeats", type=int, default=10, help="Timed calls per format (default: 10)")
+
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='decode_')
+    ok = True
+    try:
+        print(f"{args.seconds:g}s recordings decoded to {SAMPLE_RATE} Hz mono")
+        print(f"\n{'format':22s} {'sniffed':15s} {'KB':>6s} {'librosa ms':>11s} {'hq ms':>8s} "
+              f"{'fast ms':>8s} {'hq x':>6s} {'path hq ms':>11s} {'hq parity':>9s} {'fast |dy|':>9s}")
+        for name, sr, channels, container, subtype in FORMATS:
+            path = os.path.join(work_dir, f"{name}.{container.lower()}")
+            soundfile.write(path, synthetic_speech(args.seconds, sr, channels), sr, format=container, subtype=subtype)
+            with open(path, 'rb') as f:
+                data = f.read()
+            sniffed = sniff_format(data)
+
+            # Parity: bytes and path decoding against librosa.load
+            reference, _ = librosa.load(io.BytesIO(data), sr=SAMPLE_RATE, mono=True)
+            from_bytes = load_audio_bytes(data, SAMPLE_RATE)
+            from_path = load_audio_file(path, SAMPLE_RATE)
+            same = np.array_equal(from_bytes, reference) and np.array_equal(from_path, reference)
+            ok = ok and same
+            fast = load_audio_bytes(data, SAMPLE_RATE, quality='fast')
+            deviation = float(np.abs(fast - reference).max()) if len(fast) == len(reference) else float('inf')
+
+            slow = timed(lambda: librosa.load(io.BytesIO(data), sr=SAMPLE_RATE, mono=True), args.repeats)
+            hq = timed(lambda: load_audio_bytes(data, SAMPLE_RATE), args.repeats)
+            quick = timed(lambda: load_audio_bytes(data, SAMPLE_RATE, quality='fast'), args.repeats)
+            mapped = timed(lambda: load_audio_file(path, SAMPLE_RATE), args.repeats)
+            print(f"{name:22s} {sniffed.container + '/' + str(sniffed.codec):15s} {len(data) / 1024:6.0f} "
+                  f"{slow * 1000:11.2f} {hq * 1000:8.2f} {quick * 1000:8.2f} {slow / hq:5.1f}x "
+                  f"{mapped * 1000:11.2f} {'OK' if same else 'FAIL':>9s} {deviation:9.1e}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\nParity of quality='hq' against librosa.load: {'OK' if ok else 'FAIL'}")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
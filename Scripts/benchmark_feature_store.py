@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# benchmark_feature_store.py
+# Parity check and benchmark for the on-disk feature store
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from scipy.io import wavfile
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from analyze_audio_file import SAMPLE_RATE, load_clip_features, open_feature_store
+from feature_store import file_digest
+
+def write_clips(directory, n_clips, seconds=4.0, seed=0):
+    """Synthetic speech-like WAV clips (tone plus noise under a syllable envelope)"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    paths = []
+    for i in range(n_clips):
+        tone = np.sin(2 * np.pi * rng.uniform(100, 300) * t)
+        noise = rng.standard_normal(len(t))
+        envelope = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t), 0.05, None)
+        y = rng.uniform(0.1, 0.5) * (0.7 * tone + 0.3 * noise) * envelope
+        path = os.path.join(directory, f"clip{i:04d}.wav")
+        wavfile.write(path, SAMPLE_RATE, (y * 32767).astype(np.int16))
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Feature store parity check and benchmark")
+    parser.add_argument("files", nargs="*", help="Audio files to use (default: synthetic clips)")
+    parser.add_argument("--clips", type=int, default=64, help="Number of synthetic clips (default: 64)")
+    parser.add_argument("--feature", type=str, default="mfcc", choices=["mfcc", "melspec", "combined"],
+                        help="Feature extraction method (default: mfcc)")
+    parser.add_argument("--shard-rows", type=int, default=16,
+                        help="Clips per shard, small to exercise several shards (default: 16)")
+
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='feature_store_')
+    try:
+        paths = args.files or write_clips(work_dir, args.clips)
+        root = os.path.join(work_dir, 'store')
+
+        # Warm up librosa's imports and caches outside the timings
+        load_clip_features(paths[0], args.feature)
+
+        # Cold: decode and featurize every clip, filling the store
+        start = time.perf_counter()
+        computed = {}
+        store = open_feature_store(root, args.feature)
+        store.shard_rows = args.shard_rows
+        for path in paths:
+            features = computed[path] = load_clip_features(path, args.feature)
+            store.put(file_digest(path), features)
+        store.close()
+        cold = time.perf_counter() - start
+
+        # Warm: a fresh store object reads the index and maps the shards
+        start = time.perf_counter()
+        store = open_feature_store(root, args.feature)
+        digests = {path: file_digest(path) for path in paths}
+        hashed = time.perf_counter() - start
+        loaded = {path: store.get(digest) for path, digest in digests.items()}
+        warm = time.perf_counter() - start
+
+        print("Parity against decoding and featurizing:")
+        ok = all(loaded[path] is not None and np.array_equal(loaded[path], computed[path]) for path in paths)
+        ok = ok and all(not loaded[path].flags.writeable for path in paths)
+        # Identical files share one entry, so count distinct contents
+        rows = sum(len(features) for _, features in store.iter_shards())
+        ok = ok and rows == len(set(digests.values()))
+        print(f"  {len(paths)} clips, {store.stats()['shards']} shards {'OK' if ok else 'FAIL'}")
+
+        # Copying every shard into model input, as re-scoring the whole store does
+        start = time.perf_counter()
+        for _, features in store.iter_shards():
+            np.array(features[..., np.newaxis])
+        scan = time.perf_counter() - start
+        store.close()
+
+        n = len(paths)
+        print("\nMilliseconds per clip:")
+        print(f"  decode + features       {cold / n * 1000:8.3f}")
+        print(f"  store: hash + lookup    {warm / n * 1000:8.3f}  ({cold / warm:.0f}x)")
+        print(f"    of which hashing      {hashed / n * 1000:8.3f}")
+        print(f"  store: shard copy       {scan / n * 1000:8.3f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# benchmark_features.py
+# Parity check and throughput benchmark for the batched feature extractor
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import librosa
+from sklearn.preprocessing import StandardScaler
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from audio_features import (DURATION, HOP_LENGTH, N_FFT, N_MFCC, SAMPLE_RATE,
+                            extract_features_batch, get_extractor, prepare_waveform)
+
+def load_clips(paths, n_synthetic, seed=0):
+    """Load fixed-length clips from files, or synthesize noise/tone clips"""
+    target_length = int(SAMPLE_RATE * DURATION)
+    if paths:
+        clips = []
+        for path in paths:
+            y, _ = librosa.load(path, sr=SAMPLE_RATE, mono=True)
+            clips.append(prepare_waveform(y, 25))
+        return np.stack(clips).astype(np.float32)
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(target_length) / SAMPLE_RATE
+    clips = []
+    for i in range(n_synthetic):
+        tone = np.sin(2 * np.pi * rng.uniform(100, 800) * t)
+        noise = rng.standard_normal(target_length)
+        clips.append(rng.uniform(0.01, 0.5) * (0.7 * tone + 0.3 * noise))
+    return np.stack(clips).astype(np.float32)
+
+def reference_features(clip, feature_type):
+    """The original per-clip librosa pipeline from the server and scripts"""
+    mfccs = librosa.feature.mfcc(y=clip, sr=SAMPLE_RATE, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    if feature_type == 'mfcc':
+        return mfccs
+    if feature_type == 'mfcc_normalized':
+        return StandardScaler().fit_transform(mfccs.T).T
+    melspec = librosa.feature.melspectrogram(y=clip, sr=SAMPLE_RATE, n_mels=128)
+    return librosa.power_to_db(melspec, ref=np.max)
+
+def batched_features(clips, feature_type):
+    """The shared batched extractor"""
+    if feature_type == 'mfcc':
+        return get_extractor().mfcc(clips)
+    if feature_type == 'mfcc_normalized':
+        return extract_features_batch(clips, 'mfcc', normalize=True)
+    return extract_features_batch(clips, 'melspec')
+
+def check_parity(clips):
+    """Compare batched output with the per-clip librosa output"""
+    print("Parity against per-clip librosa:")
+    all_ok = True
+    for feature_type in ['mfcc', 'mfcc_normalized', 'melspec']:
+        batched = batched_features(clips, feature_type)
+        reference = np.stack([reference_features(clip, feature_type) for clip in clips])
+        identical = batched.shape == reference.shape and batched.tobytes() == reference.tobytes()
+        max_diff = float(np.max(np.abs(batched - reference)))
+        # StandardScaler computes its statistics in a different order, so only
+        # the raw spectral features are expected to match byte for byte
+        ok = identical if feature_type != 'mfcc_normalized' else max_diff < 1e-4
+        all_ok = all_ok and ok
+        status = "byte-identical" if identical else f"max abs diff {max_diff:.3g}"
+        print(f"  {feature_type:16s} {'OK ' if ok else 'FAIL'} {status}")
+    return all_ok
+
+def benchmark(clips, batch_sizes, repeats):
+    """Report clips/second for the per-clip and batched pipelines"""
+    print("\nThroughput (clips/second):")
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for clip in clips:
+            reference_features(clip, 'mfcc')
+    per_clip = repeats * len(clips) / (time.perf_counter() - start)
+    print(f"  per-clip librosa        {per_clip:8.1f}")
+
+    extractor = get_extractor()
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for i in range(0, len(clips), batch_size):
+                extractor.mfcc(clips[i:i + batch_size])
+        rate = repeats * len(clips) / (time.perf_counter() - start)
+        print(f"  batched (batch={batch_size:3d})   {rate:8.1f}  ({rate / per_clip:.1f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched feature extractor parity check and benchmark")
+    parser.add_argument("files", nargs="*", help="Audio files to use (default: synthetic clips)")
+    parser.add_argument("--clips", type=int, default=64, help="Number of synthetic clips (default: 64)")
+    parser.add_argument("--batch-sizes", type=str, default="1,8,32,64",
+                        help="Comma-separated batch sizes to benchmark (default: 1,8,32,64)")
+    parser.add_argument("--repeats", type=int, default=3, help="Benchmark repetitions (default: 3)")
+    parser.add_argument("--skip-benchmark", action="store_true", help="Only run the parity check")
+
+    args = parser.parse_args()
+
+    clips = load_clips(args.files, args.clips)
+    # Warm up librosa's caches and numba JIT before timing anything
+    reference_features(clips[0], 'mfcc')
+    get_extractor().mfcc(clips[:1])
+
+    ok = check_parity(clips)
+    if not args.skip_benchmark:
+        benchmark(clips, [int(b) for b in args.batch_sizes.split(',')], args.repeats)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
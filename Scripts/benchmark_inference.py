@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# benchmark_inference.py
+# Parity check and latency benchmark: compiled bucketed inference vs model.predict
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from compiled_inference import BATCH_BUCKETS, CompiledModel, configure_threads, parse_buckets
+from model_registry import latest_model
+
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'mdl', 'model')
+DEFAULT_BATCH_SIZES = '1,2,3,4,8,12,16,24,32,48,64'
+
+def timed(function, repeats):
+    """Median seconds per call after one warm-up call"""
+    function()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compiled inference parity check and benchmark")
+    parser.add_argument("--model", type=str, default=None, help="Keras .h5 model (default: newest in mdl/model)")
+    parser.add_argument("--batch-sizes", type=str, default=DEFAULT_BATCH_SIZES,
+                        help=f"Comma-separated batch sizes (default: {DEFAULT_BATCH_SIZES})")
+    parser.add_argument("--buckets", type=str, default=','.join(map(str, BATCH_BUCKETS)),
+                        help="Batch-size buckets of the compiled model (default: %(default)s)")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed calls per batch size (default: 20)")
+    parser.add_argument("--intra-op-threads", type=int, default=0, help="TensorFlow intra-op threads (default: TF's choice)")
+    parser.add_argument("--inter-op-threads", type=int, default=0, help="TensorFlow inter-op threads (default: TF's choice)")
+    parser.add_argument("--skip-predict", action="store_true", help="Leave out model.predict (slow at many repeats)")
+
+    args = parser.parse_args()
+
+    model_path = args.model
+    if model_path is None:
+        latest = latest_model(DEFAULT_MODEL_DIR)
+        if latest is None:
+            parser.error("No model found in mdl/model; pass --model")
+        model_path = latest[1]
+
+    # Thread pools must be sized before TensorFlow runs anything
+    configure_threads(args.intra_op_threads, args.inter_op_threads)
+    import tensorflow as tf
+    model = tf.keras.models.load_model(model_path)
+    compiled = CompiledModel(model, parse_buckets(args.buckets))
+
+    start = time.perf_counter()
+    compiled.warm_up()
+    print(f"Model: {model_path}")
+    print(f"Traced {len(compiled.buckets)} buckets in {time.perf_counter() - start:.2f}s")
+    print(f"Threads: intra-op {tf.config.threading.get_intra_op_parallelism_threads() or 'default'}, "
+          f"inter-op {tf.config.threading.get_inter_op_parallelism_threads() or 'default'}")
+
+    rng = np.random.default_rng(0)
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+    ok = True
+    print(f"\n{'batch':>5s} {'bucket':>6s} {'predict ms':>11s} {'call ms':>8s} {'compiled ms':>12s} "
+          f"{'vs predict':>10s} {'vs call':>8s} {'max |dp|':>9s}")
+    for batch_size in batch_sizes:
+        features = rng.standard_normal((batch_size,) + compiled.input_shape).astype(np.float32)
+
+        # Parity against model.predict
+        reference = model.predict(features, verbose=0)
+        difference = float(np.abs(compiled.predict(features) - reference).max())
+        ok = ok and difference < 1e-5
+
+        fast = timed(lambda: compiled.predict(features), args.repeats)
+        direct = timed(lambda: np.asarray(model(features, training=False)), args.repeats)
+        slow = None if args.skip_predict else timed(lambda: model.predict(features, verbose=0), args.repeats)
+        slow_text = f"{slow * 1000:11.2f}" if slow is not None else f"{'-':>11s}"
+        ratio_text = f"{slow / fast:9.1f}x" if slow is not None else f"{'-':>10s}"
+        print(f"{batch_size:5d} {compiled.bucket_for(batch_size):6d} {slow_text} {direct * 1000:8.2f} "
+              f"{fast * 1000:12.2f} {ratio_text} {direct / fast:7.1f}x {difference:9.1e}")
+
+    print(f"\nParity against model.predict: {'OK' if ok else 'FAIL'}")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
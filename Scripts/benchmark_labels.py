@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# benchmark_labels.py
+# Parity check and benchmark for the precomputed label schema and JSON serialization
+
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import numpy as np
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from label_schema import LabelSchema
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DEFAULT_ENCODER = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                               'mdl', 'model', 'label_encoder_20250421_143944.pkl')
+
+def reference_sentiment(label):
+    """The original substring checks from the scripts"""
+    if "_happy" in label or "_surprise" in label:
+        return "positive"
+    elif "_sad" in label or "_angry" in label or "_fear" in label or "_disgust" in label:
+        return "negative"
+    elif "_neutral" in label:
+        return "neutral"
+    return "unknown"
+
+def reference_format(scores, label_encoder):
+    """The original per-request response built with the label encoder"""
+    predicted_index = int(np.argmax(scores))
+    emotion = label_encoder.inverse_transform([predicted_index])[0]
+    emotion_scores = {}
+    for i, emotion_class in enumerate(label_encoder.classes_):
+        emotion_scores[emotion_class] = float(scores[i])
+    return {
+        'emotion': emotion,
+        'confidence': float(scores[predicted_index]),
+        'emotion_scores': emotion_scores
+    }
+
+def random_scores(n_rows, n_classes, seed=0):
+    """Softmax-like rows of class probabilities"""
+    return np.random.default_rng(seed).dirichlet(np.full(n_classes, 0.3), size=n_rows).astype(np.float32)
+
+def check_parity(scores, label_encoder, labels):
+    """Compare the schema's responses with the label encoder path, row by row"""
+    print("Parity against the label encoder:")
+    ok = True
+    batch = labels.format_batch(scores, top_k=3)
+    for row, result in zip(scores, batch):
+        reference = reference_format(row, label_encoder)
+        single = labels.format(row)
+        for key in reference:
+            ok = ok and result[key] == reference[key] == single[key]
+        ok = ok and result['sentiment'] == reference_sentiment(reference['emotion'])
+        ok = ok and result['top_k'][0]['emotion'] == reference['emotion']
+        # Sentiment probabilities sum the class probabilities of each sentiment
+        for sentiment, value in result['sentiment_scores'].items():
+            expected = sum(float(p) for p, name in zip(row, label_encoder.classes_)
+                           if reference_sentiment(name) == sentiment)
+            ok = ok and abs(value - expected) < 1e-5
+    print(f"  {len(scores)} rows {'OK' if ok else 'FAIL'}")
+    return ok
+
+def timed(function, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+def benchmark(scores, label_encoder, labels, repeats):
+    """Report microseconds per response for each stage"""
+    print("\nMicroseconds per response:")
+    n = len(scores)
+    reference = timed(lambda: [reference_format(row, label_encoder) for row in scores], repeats) / n * 1e6
+    single = timed(lambda: [labels.format(row) for row in scores], repeats) / n * 1e6
+    batched = timed(lambda: labels.format_batch(scores), repeats) / n * 1e6
+    print(f"  label encoder           {reference:8.1f}")
+    print(f"  schema, one row         {single:8.1f}  ({reference / single:.1f}x)")
+    print(f"  schema, batch of {n:<5d}  {batched:8.1f}  ({reference / batched:.1f}x)")
+
+    results = labels.format_batch(scores)
+    stdlib = timed(lambda: [json.dumps(result, sort_keys=True) for result in results], repeats) / n * 1e6
+    print(f"  json.dumps              {stdlib:8.1f}")
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS
+        fast = timed(lambda: [orjson.dumps(result, option=option) for result in results], repeats) / n * 1e6
+        print(f"  orjson.dumps            {fast:8.1f}  ({stdlib / fast:.1f}x)")
+    else:
+        print("  orjson not installed")
+
+def main():
+    parser = argparse.ArgumentParser(description="Label schema parity check and benchmark")
+    parser.add_argument("--encoder", type=str, default=DEFAULT_ENCODER, help="Label encoder .pkl to test with")
+    parser.add_argument("--rows", type=int, default=256, help="Number of random probability rows (default: 256)")
+    parser.add_argument("--repeats", type=int, default=5, help="Benchmark repetitions (default: 5)")
+    parser.add_argument("--skip-benchmark", action="store_true", help="Only run the parity check")
+
+    args = parser.parse_args()
+
+    with open(args.encoder, 'rb') as f:
+        label_encoder = pickle.load(f)
+    labels = LabelSchema.from_encoder(label_encoder)
+    scores = random_scores(args.rows, len(labels))
+
+    ok = check_parity(scores, label_encoder, labels)
+    if not args.skip_benchmark:
+        benchmark(scores, label_encoder, labels, args.repeats)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# benchmark_result_log.py
+# Parity check and benchmark for the columnar result log and its hourly rollups
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from result_log import ResultLog
+
+CLASSES = [f"{gender}_{emotion}" for gender in ('female', 'male')
+           for emotion in ('angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise')]
+
+def synthetic_results(n_rows, n_sources, days, seed=0):
+    """Time-ordered (times, source indices, scores) spread over days"""
+    rng = np.random.default_rng(seed)
+    start = 1_750_000_000.0
+    times = start + np.sort(rng.uniform(0, days * 86400, n_rows))
+    sources = rng.integers(0, n_sources, n_rows)
+    scores = rng.dirichlet(np.full(len(CLASSES), 0.3), n_rows).astype(np.float32)
+    return times, sources, scores
+
+def tuple_bytes_per_row(times, sources, scores, n=20000):
+    """Python memory per result kept as a tuple with a score list, as an in-memory history would"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rows = [(float(times[i]), f"user{sources[i]}", CLASSES[int(scores[i].argmax())], float(scores[i].max()),
+             scores[i].tolist()) for i in range(min(n, len(times)))]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(rows)
+
+def disk_bytes(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+def as_hours(groups, bucket_seconds):
+    """Emotion counts per (source, hour) from groups of a shorter bucket length"""
+    hours = {}
+    for group in groups:
+        key = (group['source'], group['start'] // 3600)
+        counts = np.array(list(group['emotions'].values()))
+        hours[key] = hours.get(key, 0) + counts
+    return hours
+
+def main():
+    parser = argparse.ArgumentParser(description="Result log parity check and benchmark")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="Results to log (default: 2000000)")
+    parser.add_argument("--sources", type=int, default=500, help="Distinct users or clients (default: 500)")
+    parser.add_argument("--days", type=float, default=30, help="Time span of the results (default: 30)")
+    parser.add_argument("--batch", type=int, default=64, help="Rows per append_batch call (default: 64)")
+
+    args = parser.parse_args()
+
+    times, sources, scores = synthetic_results(args.rows, args.sources, args.days)
+    work_dir = tempfile.mkdtemp(prefix='result_log_')
+    try:
+        # Append in small per-source batches, as a server logging requests would
+        log = ResultLog(work_dir, CLASSES)
+        start = time.perf_counter()
+        for i in range(0, args.rows, args.batch):
+            batch = slice(i, i + args.batch)
+            log.append_batch(f"user{sources[i]}", scores[batch], times[batch])
+        log.close()
+        append = time.perf_counter() - start
+        stats = log.stats()
+
+        # A fresh reader, as another process (or a restarted server) would open it
+        reader = ResultLog(work_dir, CLASSES)
+        start = time.perf_counter()
+        hourly = reader.aggregate()
+        rollup_query = time.perf_counter() - start
+        start = time.perf_counter()
+        half_hourly = reader.aggregate(bucket_seconds=1800)
+        scan_query = time.perf_counter() - start
+        one_user = f"user{sources[0]}"
+        start = time.perf_counter()
+        daily = reader.aggregate(source=one_user, bucket_seconds=86400)
+        user_query = time.perf_counter() - start
+        window_start = (times[0] // 3600 + 24) * 3600
+        start = time.perf_counter()
+        window = reader.aggregate(window_start, window_start + 6 * 3600, by_source=False)
+        window_query = time.perf_counter() - start
+
+        print("Parity:")
+        hours = as_hours(half_hourly, 1800)
+        rolled = {(group['source'], group['start'] // 3600): np.array(list(group['emotions'].values()))
+                  for group in hourly}
+        ok = rolled.keys() == hours.keys() and all(np.array_equal(rolled[key], hours[key]) for key in hours)
+        ok = ok and sum(group['count'] for group in hourly) == args.rows
+        emotions = scores.argmax(axis=1)
+        mask = (times >= window_start) & (times < window_start + 6 * 3600)
+        expected = np.bincount(emotions[mask], minlength=len(CLASSES))
+        window_counts = sum(np.array(list(group['emotions'].values())) for group in window)
+        ok = ok and np.array_equal(window_counts, expected)
+        print(f"  hourly rollups vs row scan, 6-hour window vs numpy: {'OK' if ok else 'FAIL'}")
+
+        print(f"\n{args.rows} results, {args.sources} sources, {args.days:g} days, {stats['segments']} segments")
+        print(f"  append               {args.rows / append:12.0f} rows/s")
+        print(f"  on disk              {disk_bytes(work_dir) / args.rows:12.1f} bytes/row "
+              f"(columns {stats['bytes_per_row']} bytes/row)")
+        print(f"  as Python tuples     {tuple_bytes_per_row(times, sources, scores):12.1f} bytes/row in memory")
+        print("\nQueries:")
+        print(f"  per source per hour (rollups)    {rollup_query * 1000:9.1f} ms  {len(hourly)} groups")
+        print(f"  per source per 30 min (scan)     {scan_query * 1000:9.1f} ms  {len(half_hourly)} groups")
+        print(f"  one source per day (rollups)     {user_query * 1000:9.1f} ms  {len(daily)} groups")
+        print(f"  all sources, 6 hours (rollups)   {window_query * 1000:9.1f} ms  {len(window)} groups")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# benchmark_streaming.py
+# Parity check and per-hop cost of the incremental streaming feature extractor
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import librosa
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from audio_features import HOP_LENGTH, SAMPLE_RATE, extract_features_batch
+from streaming import CHUNK_SIZE, RingBuffer, StreamingFeatureExtractor
+
+def load_stream(path, seconds, seed=0):
+    """Load a file, or synthesize a tone-plus-noise stream"""
+    if path:
+        y, _ = librosa.load(path, sr=SAMPLE_RATE, mono=True)
+        return y.astype(np.float32)
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    tone = 0.3 * np.sin(2 * np.pi * (200 + 100 * np.sin(t)) * t)
+    return (tone + 0.05 * rng.standard_normal(len(t))).astype(np.float32)
+
+def run(stream, feature_type, hop_samples, check):
+    """Feed the stream chunk by chunk, extracting features every hop
+
+    Returns (incremental seconds, full-window seconds, windows, max abs diff).
+    """
+    buffer = RingBuffer(10 * SAMPLE_RATE)
+    extractor = StreamingFeatureExtractor(buffer, feature_type=feature_type)
+    next_end = extractor.window_samples
+    incremental = full = 0.0
+    windows = 0
+    max_diff = 0.0
+
+    for start in range(0, len(stream), CHUNK_SIZE):
+        buffer.write(stream[start:start + CHUNK_SIZE])
+        while buffer.total_written >= next_end:
+            tick = time.perf_counter()
+            features = extractor.features_at(next_end)
+            incremental += time.perf_counter() - tick
+
+            # The previous approach: extract the whole window again
+            window_start = extractor.window_start(next_end)
+            audio = buffer.read(window_start, window_start + extractor.window_samples)
+            tick = time.perf_counter()
+            reference = extract_features_batch(audio[np.newaxis], feature_type, normalize=True)[0]
+            full += time.perf_counter() - tick
+
+            if check:
+                max_diff = max(max_diff, float(np.max(np.abs(features - reference))))
+            windows += 1
+            next_end += hop_samples
+    return incremental, full, windows, max_diff
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming feature extractor benchmark")
+    parser.add_argument("input", nargs="?", default=None, help="Audio file to stream (default: synthetic)")
+    parser.add_argument("--seconds", type=float, default=60, help="Length of the synthetic stream (default: 60)")
+    parser.add_argument("--hops", type=str, default="0.1,0.25,0.5",
+                        help="Comma-separated prediction intervals in seconds (default: 0.1,0.25,0.5)")
+    parser.add_argument("--feature", type=str, default="mfcc", choices=["mfcc", "melspec", "combined"],
+                        help="Feature type (default: mfcc)")
+
+    args = parser.parse_args()
+    stream = load_stream(args.input, args.seconds)
+    print(f"Streaming {len(stream) / SAMPLE_RATE:.1f}s of audio, feature type {args.feature}")
+
+    # Warm up the shared extractor
+    run(stream[:5 * SAMPLE_RATE], args.feature, HOP_LENGTH * 8, check=False)
+
+    all_ok = True
+    print(f"\n{'hop s':>6s} {'windows':>8s} {'incremental ms':>15s} {'full ms':>8s} {'speedup':>8s} {'max |diff|':>11s}")
+    for hop_seconds in [float(h) for h in args.hops.split(',')]:
+        hop_samples = max(1, int(round(hop_seconds * SAMPLE_RATE / HOP_LENGTH))) * HOP_LENGTH
+        incremental, full, windows, max_diff = run(stream, args.feature, hop_samples, check=True)
+        # Edge frames go through a smaller matmul, so allow float32 rounding
+        ok = max_diff < 1e-4
+        all_ok = all_ok and ok
+        print(f"{hop_samples / SAMPLE_RATE:6.3f} {windows:8d} {incremental / windows * 1000:15.2f} "
+              f"{full / windows * 1000:8.2f} {full / incremental:7.1f}x {max_diff:11.2e} {'OK' if ok else 'FAIL'}")
+
+    sys.exit(0 if all_ok else 1)
+
+if __name__ == "__main__":
+    main()
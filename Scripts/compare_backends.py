@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# compare_backends.py
+# Accuracy-parity report between the Keras model and exported runtimes
+
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import pickle
+import argparse
+import numpy as np
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from audio_decode import load_audio_file
+from audio_features import SAMPLE_RATE, get_extractor, prepare_waveform
+from inference_backends import load_backend
+
+SERVER_TRIM_TOP_DB = 25   # Trim threshold used by model_server.py
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.ogg', '.mp3')
+
+def load_held_out(clips, classes):
+    """Return [(path, label or None)] from a manifest CSV or a directory
+
+    A manifest has `path` and optional `label` columns. In a directory, a clip's
+    label is its parent folder name when that names one of the model classes.
+    """
+    if os.path.isfile(clips):
+        base = os.path.dirname(os.path.abspath(clips))
+        with open(clips, newline='') as f:
+            return [
+                (os.path.join(base, row['path']), row.get('label') or None)
+                for row in csv.DictReader(f)
+            ]
+
+    items = []
+    for path in sorted(glob.glob(os.path.join(clips, '**', '*'), recursive=True)):
+        if path.lower().endswith(AUDIO_EXTENSIONS):
+            folder = os.path.basename(os.path.dirname(path))
+            items.append((path, folder if folder in classes else None))
+    return items
+
+def compute_features(items):
+    """Server-style MFCC tensors for every clip, shape (n, time, n_mfcc)"""
+    waveforms = []
+    for path, _ in items:
+        y = load_audio_file(path, SAMPLE_RATE)
+        waveforms.append(prepare_waveform(y, SERVER_TRIM_TOP_DB))
+    return get_extractor().mfcc(np.stack(waveforms)).transpose(0, 2, 1)
+
+def run_backend(backend, features, batch_size):
+    """Predict all features in batches; return (probabilities, seconds per clip)"""
+    backend.predict(features[:1])  # warm-up
+    outputs = []
+    start = time.perf_counter()
+    for i in range(0, len(features), batch_size):
+        outputs.append(np.asarray(backend.predict(features[i:i + batch_size])))
+    elapsed = time.perf_counter() - start
+    return np.concatenate(outputs), elapsed / len(features)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare exported model backends against the Keras model")
+    parser.add_argument("model", type=str, help="Path to the reference Keras .h5 model")
+    parser.add_argument("encoder", type=str, help="Path to the label encoder .pkl")
+    parser.add_argument("clips", type=str, help="Held-out clips: a directory or a CSV manifest (path,label)")
+    parser.add_argument("--candidate", action="append", default=[], metavar="BACKEND:PATH",
+                        help="Backend to compare, e.g. tflite:mdl/model/emotion_model_X.int8.tflite (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Prediction batch size (default: 32)")
+    parser.add_argument("--report", type=str, default=None, help="Write the report as JSON to this path")
+
+    args = parser.parse_args()
+    if not args.candidate:
+        parser.error("give at least one --candidate BACKEND:PATH")
+
+    with open(args.encoder, 'rb') as f:
+        label_encoder = pickle.load(f)
+    classes = list(label_encoder.classes_)
+
+    items = load_held_out(args.clips, set(classes))
+    if not items:
+        raise SystemExit(f"No clips found in {args.clips}")
+    print(f"Extracting features for {len(items)} held-out clips...")
+    features = compute_features(items)
+
+    labels = [label for _, label in items]
+    labelled = np.array([label is not None for label in labels])
+    label_index = np.array([classes.index(label) if label is not None else -1 for label in labels])
+
+    def summarize(name, path, probabilities, latency, reference=None):
+        predicted = probabilities.argmax(axis=1)
+        entry = {
+            'backend': name,
+            'path': path,
+            'clips': len(predicted),
+            'latency_ms_per_clip': latency * 1000,
+            'model_size_kib': os.path.getsize(path) / 1024,
+        }
+        if labelled.any():
+            entry['accuracy'] = float(np.mean(predicted[labelled] == label_index[labelled]))
+            entry['labelled_clips'] = int(labelled.sum())
+        if reference is not None:
+            entry['top1_agreement'] = float(np.mean(predicted == reference.argmax(axis=1)))
+            diff = np.abs(probabilities - reference)
+            entry['mean_abs_prob_diff'] = float(diff.mean())
+            entry['max_abs_prob_diff'] = float(diff.max())
+        return entry
+
+    reference_backend = load_backend('keras', args.model)
+    reference, latency = run_backend(reference_backend, features, args.batch_size)
+    report = [summarize('keras', args.model, reference, latency)]
+
+    for candidate in args.candidate:
+        name, _, path = candidate.partition(':')
+        backend = load_backend(name, path)
+        probabilities, latency = run_backend(backend, features, args.batch_size)
+        report.append(summarize(name, path, probabilities, latency, reference))
+
+    # Print the report
+    print(f"\n{'backend':8s} {'size KiB':>9s} {'ms/clip':>8s} {'accuracy':>9s} {'agree':>7s} {'max |dp|':>9s}  path")
+    for entry in report:
+        accuracy = f"{entry['accuracy'] * 100:.1f}%" if 'accuracy' in entry else '-'
+        agreement = f"{entry['top1_agreement'] * 100:.1f}%" if 'top1_agreement' in entry else '-'
+        max_diff = f"{entry['max_abs_prob_diff']:.4f}" if 'max_abs_prob_diff' in entry else '-'
+        print(f"{entry['backend']:8s} {entry['model_size_kib']:9.0f} {entry['latency_ms_per_clip']:8.2f} "
+              f"{accuracy:>9s} {agreement:>7s} {max_diff:>9s}  {entry['path']}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.report}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# export_model.py
+# Convert a Keras .h5 emotion model to TFLite or ONNX, optionally quantized
+
+import os
+import sys
+import glob
+import argparse
+import numpy as np
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from audio_decode import load_audio_file
+from audio_features import SAMPLE_RATE, get_extractor, prepare_waveform
+from inference_backends import exported_model_path
+
+SERVER_TRIM_TOP_DB = 25   # Trim threshold used by model_server.py
+
+def load_calibration_features(calibration_dir, limit, trim_top_db):
+    """Server-style MFCC tensors for int8 calibration, shape (n, time, n_mfcc)"""
+    paths = sorted(
+        path for path in glob.glob(os.path.join(calibration_dir, '**', '*'), recursive=True)
+        if path.lower().endswith(('.wav', '.flac', '.ogg', '.mp3'))
+    )[:limit]
+    if not paths:
+        raise SystemExit(f"No audio files found in {calibration_dir}")
+    print(f"Computing calibration features from {len(paths)} files...")
+    waveforms = []
+    for path in paths:
+        y = load_audio_file(path, SAMPLE_RATE)
+        waveforms.append(prepare_waveform(y, trim_top_db))
+    return get_extractor().mfcc(np.stack(waveforms)).transpose(0, 2, 1)
+
+def export_tflite(model, output_path, quantize, calibration):
+    """Convert to TFLite with optional post-training quantization"""
+    import tensorflow as tf
+
+    # The batch dimension stays dynamic; the backend resizes it per call
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantize == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantize == 'int8':
+        # Full integer weights and activations; inputs/outputs stay float32 so
+        # callers do not need to know the quantization parameters
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        def representative_dataset():
+            for row in calibration:
+                yield [row[np.newaxis].astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    # Convert before opening the output so a failure leaves no empty file behind
+    content = converter.convert()
+    with open(output_path, 'wb') as f:
+        f.write(content)
+
+def export_onnx(model, output_path):
+    """Convert to ONNX (requires the optional tf2onnx package)"""
+    import tensorflow as tf
+    try:
+        import tf2onnx
+    except ImportError:
+        raise SystemExit("ONNX export requires tf2onnx: pip install tf2onnx onnxruntime")
+    input_shape = tuple(model.input_shape[1:])
+    spec = (tf.TensorSpec((None,) + input_shape, tf.float32, name='features'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, output_path=output_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the emotion model to a lightweight runtime format")
+    parser.add_argument("model", type=str, help="Path to the Keras .h5 model (e.g. mdl/model/emotion_model_*.h5)")
+    parser.add_argument("--format", type=str, default="tflite", choices=["tflite", "onnx"],
+                        help="Output format (default: tflite)")
+    parser.add_argument("--quantize", type=str, default="none", choices=["none", "dynamic", "float16", "int8"],
+                        help="Post-training quantization, TFLite only (default: none)")
+    parser.add_argument("--calibration-dir", type=str, default=None,
+                        help="Directory of audio clips for int8 calibration")
+    parser.add_argument("--calibration-size", type=int, default=200,
+                        help="Maximum number of calibration clips (default: 200)")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Output path (default: next to the model, e.g. emotion_model_X.int8.tflite)")
+
+    args = parser.parse_args()
+
+    if args.format == 'onnx' and args.quantize != 'none':
+        parser.error("--quantize is only supported for --format tflite")
+    if args.quantize == 'int8' and not args.calibration_dir:
+        parser.error("--quantize int8 needs --calibration-dir with representative audio")
+
+    import tensorflow as tf
+    print(f"Loading model: {args.model}")
+    model = tf.keras.models.load_model(args.model)
+
+    output_path = args.output or exported_model_path(args.model, args.format, args.quantize)
+    if args.format == 'tflite':
+        calibration = None
+        if args.quantize == 'int8':
+            calibration = load_calibration_features(args.calibration_dir, args.calibration_size, SERVER_TRIM_TOP_DB)
+        export_tflite(model, output_path, args.quantize, calibration)
+    else:
+        export_onnx(model, output_path)
+
+    source_size = os.path.getsize(args.model) / 1024
+    output_size = os.path.getsize(output_path) / 1024
+    print(f"Exported {args.format} model to {output_path}")
+    print(f"Size: {source_size:.0f} KiB -> {output_size:.0f} KiB")
+
+if __name__ == "__main__":
+    main()
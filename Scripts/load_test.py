@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+# load_test.py
+# Replay a request log against the model server and report latency per stage
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import functools
+import http.server
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Stages reported by the server in the Server-Timing header, in pipeline order
+STAGES = ['admission', 'download', 'upload', 'cache', 'decode', 'trim', 'features', 'inference', 'segments', 'labels', 'serialize']
+PERCENTILES = [50, 90, 99]
+
+def serve_fixtures(directory):
+    """Serve audio fixtures over HTTP from a background thread; returns the base URL
+
+    Responses carry an ETag derived from size and mtime, like a typical static
+    file server or object store, so the server's URL cache can be exercised.
+    """
+    class FixtureHandler(http.server.SimpleHTTPRequestHandler):
+        def end_headers(self):
+            path = self.translate_path(self.path)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                self.send_header('ETag', f'"{stat.st_size:x}-{int(stat.st_mtime):x}"')
+            super().end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    handler = functools.partial(FixtureHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def write_synthetic_fixtures(directory, count=8, seconds=3.0, sr=16000, seed=0):
+    """Write tone-plus-noise WAV clips for runs without real recordings"""
+    import soundfile
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    names = []
+    for i in range(count):
+        y = 0.3 * np.sin(2 * np.pi * rng.uniform(100, 600) * t) + 0.05 * rng.standard_normal(len(t))
+        # A syllable-rate envelope, so the clips pass the server's voice activity gate
+        y *= np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t), 0.05, None)
+        name = f"synthetic_{i}.wav"
+        soundfile.write(os.path.join(directory, name), y.astype(np.float32), sr, subtype='PCM_16')
+        names.append(name)
+    return names
+
+def load_request_log(path, fixtures, base_url):
+    """Read /analyze request bodies from a JSONL log
+
+    Each line is a JSON object. Lines with an `audio_url` are replayed with the
+    URL's file name served from the fixture directory; a `fixture` key names a
+    fixture directly. Other keys (e.g. `segmented`) are sent unchanged. Lines
+    that are not /analyze requests are skipped.
+    """
+    bodies = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            name = entry.pop('fixture', None)
+            if name is None and 'audio_url' in entry:
+                name = os.path.basename(urllib.parse.urlparse(entry['audio_url']).path)
+            if name is None:
+                continue
+            if name not in fixtures:
+                # Unknown files are mapped onto the fixtures deterministically
+                name = fixtures[sum(map(ord, name)) % len(fixtures)]
+            entry['audio_url'] = f"{base_url}/{urllib.parse.quote(name)}"
+            bodies.append(entry)
+    return bodies
+
+def as_uploads(bodies, fixtures_dir):
+    """Turn URL requests into direct uploads of the same fixture files
+
+    The audio is sent as the request body and the other keys become query
+    parameters, which is how /analyze takes options for uploads.
+    """
+    contents = {}
+    uploads = []
+    for body in bodies:
+        name = urllib.parse.unquote(os.path.basename(urllib.parse.urlparse(body['audio_url']).path))
+        if name not in contents:
+            with open(os.path.join(fixtures_dir, name), 'rb') as f:
+                contents[name] = f.read()
+        params = {key: value for key, value in body.items() if key != 'audio_url'}
+        uploads.append({'upload': contents[name], 'params': params})
+    return uploads
+
+def parse_server_timing(header):
+    """Parse 'name;dur=12.3, ...' into {name: milliseconds}"""
+    timings = {}
+    for metric in (header or '').split(','):
+        parts = [part.strip() for part in metric.split(';')]
+        for part in parts[1:]:
+            if part.startswith('dur='):
+                timings[parts[0]] = float(part[4:])
+    return timings
+
+def summarize(values):
+    """Percentiles, mean and max of a list of milliseconds"""
+    if not values:
+        return None
+    values = np.asarray(values)
+    summary = {f'p{p}': float(np.percentile(values, p)) for p in PERCENTILES}
+    summary['mean'] = float(values.mean())
+    summary['max'] = float(values.max())
+    summary['count'] = int(len(values))
+    return summary
+
+def run_load(server, bodies, total, concurrency, rate, timeout, seed, headers=None):
+    """Send total requests, closed-loop (concurrency) or open-loop (rate per second)
+
+    In open-loop mode latency is measured from each request's scheduled send
+    time, so a server that falls behind is charged for the queueing delay.
+    headers (e.g. X-Priority) are added to every request.
+    """
+    import requests
+
+    local = threading.local()
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    results = []
+    lock = threading.Lock()
+
+    def send(body, scheduled):
+        start = time.perf_counter()
+        record = {'status': None, 'timings': {}}
+        try:
+            if 'upload' in body:
+                response = session().post(f"{server}/analyze", data=body['upload'], params=body['params'],
+                                          headers={'Content-Type': 'application/octet-stream', **(headers or {})},
+                                          timeout=timeout)
+            else:
+                response = session().post(f"{server}/analyze", json=body, headers=headers, timeout=timeout)
+            record['status'] = response.status_code
+            record['timings'] = parse_server_timing(response.headers.get('Server-Timing'))
+        except Exception as e:
+            record['error'] = str(e)
+        end = time.perf_counter()
+        record['latency'] = (end - (scheduled if scheduled is not None else start)) * 1000
+        with lock:
+            results.append(record)
+
+    schedule = [bodies[i % len(bodies)] for i in range(total)]
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    if rate:
+        # Open loop: Poisson arrivals at the target rate, independent of responses
+        with ThreadPoolExecutor(max_workers=max(concurrency, 64)) as executor:
+            next_send = started
+            for body in schedule:
+                next_send += rng.expovariate(rate)
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(send, body, next_send)
+    else:
+        # Closed loop: concurrency clients, each sending its next request on a response
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for body in schedule:
+                executor.submit(send, body, None)
+    elapsed = time.perf_counter() - started
+    return results, elapsed
+
+def build_report(results, elapsed, args):
+    ok = [r for r in results if r['status'] == 200]
+    report = {
+        'config': {
+            'server': args.server,
+            'requests': len(results),
+            'concurrency': args.concurrency,
+            'rate': args.rate,
+            'upload': args.upload,
+            'priority': args.priority,
+            'deadline_ms': args.deadline_ms,
+        },
+        'throughput_rps': len(ok) / elapsed if elapsed > 0 else 0.0,
+        'errors': len(results) - len(ok),
+        'latency_ms': summarize([r['latency'] for r in ok]),
+        'stages_ms': {},
+    }
+    for stage in STAGES:
+        summary = summarize([r['timings'][stage] for r in ok if stage in r['timings']])
+        if summary is not None:
+            report['stages_ms'][stage] = summary
+    statuses = {}
+    for r in results:
+        key = str(r['status']) if r['status'] is not None else 'failed'
+        statuses[key] = statuses.get(key, 0) + 1
+    report['status_counts'] = statuses
+    return report
+
+def print_report(report):
+    print(f"\nThroughput: {report['throughput_rps']:.1f} req/s, errors: {report['errors']} "
+          f"(status counts: {report['status_counts']})")
+    header = f"{'':12s}" + "".join(f"{f'p{p}':>9s}" for p in PERCENTILES) + f"{'mean':>9s}{'max':>9s}{'count':>7s}"
+    print(header + "   (ms)")
+    rows = [('total', report['latency_ms'])] + list(report['stages_ms'].items())
+    for name, summary in rows:
+        if summary is None:
+            continue
+        print(f"{name:12s}" + "".join(f"{summary[f'p{p}']:9.1f}" for p in PERCENTILES)
+              + f"{summary['mean']:9.1f}{summary['max']:9.1f}{summary['count']:7d}")
+
+def compare_to_baseline(report, baseline, tolerance):
+    """List regressions of more than tolerance against a saved baseline"""
+    regressions = []
+    # In open-loop mode throughput is set by the arrival rate, not the server
+    closed_loop = not report['config']['rate'] and not baseline['config'].get('rate')
+    if closed_loop and report['throughput_rps'] < baseline['throughput_rps'] * (1 - tolerance):
+        regressions.append(f"throughput {report['throughput_rps']:.1f} req/s < baseline {baseline['throughput_rps']:.1f}")
+
+    def check(name, current, previous):
+        if not current or not previous:
+            return
+        for key in ['p50', 'p99']:
+            # Ignore sub-millisecond noise on very fast stages
+            if current[key] > previous[key] * (1 + tolerance) and current[key] - previous[key] > 1.0:
+                regressions.append(f"{name} {key} {current[key]:.1f} ms > baseline {previous[key]:.1f} ms")
+
+    check('total', report['latency_ms'], baseline.get('latency_ms'))
+    for stage, summary in report['stages_ms'].items():
+        check(stage, summary, baseline.get('stages_ms', {}).get(stage))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Model server replay and load test")
+    parser.add_argument("--server", type=str, default="http://127.0.0.1:5000", help="Server base URL")
+    parser.add_argument("--log", type=str, default=None,
+                        help="JSONL request log to replay (default: one request per fixture)")
+    parser.add_argument("--fixtures", type=str, default=None,
+                        help="Directory of audio fixtures to serve (default: synthetic clips)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests to send; the log is cycled (default: 200)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Closed-loop concurrent clients (default: 8)")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Open-loop arrival rate in requests/second (overrides closed-loop mode)")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests sent first (default: 10)")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds")
+    parser.add_argument("--upload", action="store_true",
+                        help="Send the audio in the request body instead of as an audio_url")
+    parser.add_argument("--priority", type=str, default=None, choices=["interactive", "bulk"],
+                        help="Send this X-Priority header (default: none, the server treats /analyze as interactive)")
+    parser.add_argument("--deadline-ms", type=float, default=None,
+                        help="Send X-Request-Timeout-Ms so the server drops requests it cannot serve in time")
+    parser.add_argument("--shuffle", action="store_true", help="Shuffle the replayed requests")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for shuffling and arrivals")
+    parser.add_argument("--output", type=str, default=None, help="Write this run's report as JSON")
+    parser.add_argument("--save-baseline", type=str, default=None, help="Save this run as a baseline JSON file")
+    parser.add_argument("--baseline", type=str, default=None, help="Compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Allowed relative regression against the baseline (default: 0.10)")
+
+    args = parser.parse_args()
+
+    fixtures_dir = args.fixtures
+    if fixtures_dir is None:
+        fixtures_dir = tempfile.mkdtemp(prefix='load_test_')
+        write_synthetic_fixtures(fixtures_dir)
+    fixtures = sorted(
+        name for name in os.listdir(fixtures_dir)
+        if name.lower().endswith(('.wav', '.flac', '.ogg', '.mp3', '.m4a'))
+    )
+    if not fixtures:
+        raise SystemExit(f"No audio fixtures in {fixtures_dir}")
+    base_url = serve_fixtures(fixtures_dir)
+
+    if args.log:
+        bodies = load_request_log(args.log, fixtures, base_url)
+        if not bodies:
+            raise SystemExit(f"No /analyze requests in {args.log}")
+    else:
+        bodies = [{'audio_url': f"{base_url}/{urllib.parse.quote(name)}"} for name in fixtures]
+    if args.upload:
+        bodies = as_uploads(bodies, fixtures_dir)
+    if args.shuffle:
+        random.Random(args.seed).shuffle(bodies)
+    print(f"Replaying {len(bodies)} distinct requests from {len(fixtures)} fixtures against {args.server}")
+
+    headers = {}
+    if args.priority:
+        headers['X-Priority'] = args.priority
+    if args.deadline_ms:
+        headers['X-Request-Timeout-Ms'] = f"{args.deadline_ms:g}"
+
+    if args.warmup:
+        run_load(args.server, bodies, args.warmup, min(args.concurrency, args.warmup), None, args.timeout, args.seed,
+                 headers)
+
+    mode = f"open loop at {args.rate:g} req/s" if args.rate else f"closed loop with {args.concurrency} clients"
+    print(f"Sending {args.requests} requests, {mode}...")
+    results, elapsed = run_load(args.server, bodies, args.requests, args.concurrency, args.rate, args.timeout, args.seed,
+                                headers)
+    report = build_report(results, elapsed, args)
+    print_report(report)
+
+    for path in [args.output, args.save_baseline]:
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Report written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key in ['concurrency', 'rate', 'upload']:
+            if baseline['config'].get(key) != report['config'][key]:
+                print(f"\nWarning: baseline was recorded with {key}={baseline['config'].get(key)}, "
+                      f"this run used {key}={report['config'][key]}")
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -3,164 +3,372 @@
 # This script performs real-time sentiment analysis on voice input
 
 import os
+import sys
 import numpy as np
-import librosa
-import tensorflow as tf
 from tensorflow.keras.models import load_model
-from sklearn.preprocessing import StandardScaler
-import pyaudio
-import wave
 import time
-import threading
 import pickle
+import queue
 import argparse
 import datetime
+import threading
+from collections import deque
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from audio_features import HOP_LENGTH, extract_features_batch
+from compiled_inference import CompiledModel
+from label_schema import LabelSchema
+from model_registry import latest_model
+from result_log import ResultLog
+from streaming import (BufferOverrun, MicrophoneSource, StreamingFeatureExtractor,
+                       StreamRecorder, WavFileSource)
+from vad import VAD_ENERGY_DB, VAD_MIN_FLUX_DB, VoiceActivityDetector
 
 # Define constants
 SAMPLE_RATE = 16000       # 16kHz sampling rate for speech
 DURATION = 3.0            # 3 seconds per sample
 CHUNK_SIZE = 1024         # Audio chunks for processing
 N_MFCC = 40               # Number of MFCC coefficients
+HOP_SECONDS = 0.25        # Default interval between predictions
+BUFFER_SECONDS = 10.0     # Audio kept in the ring buffer
+QUEUE_SIZE = 4            # Windows waiting between two pipeline stages
+MAX_BATCH = 8             # Waiting windows scored together by the inference stage
+HISTORY_SIZE = 50         # Most recent sentiment changes shown in the summary
 MODELS_DIR = "models"     # Directory where models are stored
 
-class VoiceRecorder:
-    """Class to handle real-time audio recording and processing"""
-    def __init__(self, sample_rate=SAMPLE_RATE, chunk_size=CHUNK_SIZE, channels=1, 
-                 format=pyaudio.paFloat32, duration=DURATION):
+class VoiceRecorder(StreamRecorder):
+    """Class to handle real-time audio recording and processing
+
+    Audio from the source is written into a preallocated ring buffer, so
+    recording never reallocates and the analysis loop reads without a lock.
+    """
+    def __init__(self, source=None, sample_rate=SAMPLE_RATE, chunk_size=CHUNK_SIZE,
+                 duration=DURATION, capacity_seconds=BUFFER_SECONDS):
+        if source is None:
+            source = MicrophoneSource(sample_rate=sample_rate, chunk_size=chunk_size)
+        super().__init__(source, capacity_seconds=max(capacity_seconds, 2 * duration))
         self.sample_rate = sample_rate
-        self.chunk_size = chunk_size
-        self.channels = channels
-        self.format = format
         self.duration = duration
-        self.frames_per_buffer = int(self.sample_rate * self.duration)
-        self.audio = pyaudio.PyAudio()
-        self.stream = None
-        self.is_recording = False
-        self.audio_data = np.array([])
-        
+
     def start_recording(self):
-        """Start audio stream for recording"""
-        if self.stream is not None:
-            self.stop_recording()
-        
-        self.stream = self.audio.open(
-            format=self.format,
-            channels=self.channels,
-            rate=self.sample_rate,
-            input=True,
-            frames_per_buffer=self.chunk_size
-        )
-        
-        self.is_recording = True
-        self.audio_data = np.array([])
-        
-        # Start a thread to continuously record audio
-        threading.Thread(target=self._record_audio).start()
-        
+        """Start capturing audio into the ring buffer"""
+        self.start()
         print("Recording started... Speak now")
-    
-    def _record_audio(self):
-        """Record audio in the background"""
-        while self.is_recording:
-            try:
-                data = self.stream.read(self.chunk_size)
-                audio_chunk = np.frombuffer(data, dtype=np.float32)
-                
-                if len(self.audio_data) == 0:
-                    self.audio_data = audio_chunk
-                else:
-                    self.audio_data = np.append(self.audio_data, audio_chunk)
-                
-                # Keep only the most recent frames to maintain real-time processing
-                if len(self.audio_data) > self.frames_per_buffer:
-                    self.audio_data = self.audio_data[-self.frames_per_buffer:]
-            except Exception as e:
-                print(f"Error recording audio: {e}")
-                break
-    
+
     def stop_recording(self):
         """Stop audio recording"""
-        if self.stream:
-            self.is_recording = False
-            self.stream.stop_stream()
-            self.stream.close()
-            self.stream = None
-            print("Recording stopped")
-    
+        self.stop()
+        print("Recording stopped")
+
     def get_last_audio(self):
         """Get the last recorded audio segment"""
+        n = int(self.sample_rate * self.duration)
         # Ensure we have enough audio data
-        if len(self.audio_data) < self.sample_rate * self.duration:
+        if self.buffer.total_written < n:
             return None
-        
-        # Return the last N seconds of audio
-        return self.audio_data[-int(self.sample_rate * self.duration):]
-    
+        return self.buffer.latest(n)
+
     def save_audio(self, filename="recorded_audio.wav"):
-        """Save the recorded audio to a WAV file"""
-        if len(self.audio_data) == 0:
+        """Save the buffered audio to a WAV file"""
+        audio_to_save = self.buffer.latest(self.buffer.capacity)
+        if len(audio_to_save) == 0:
             print("No audio data to save")
             return
-        
-        # Ensure audio is float32 for saving
-        audio_to_save = np.copy(self.audio_data).astype(np.float32)
-        
+
         # Normalize to -1.0 to 1.0 range if needed
         max_val = np.max(np.abs(audio_to_save))
         if max_val > 1.0:
             audio_to_save = audio_to_save / max_val
-        
+
         # Save using scipy.io.wavfile to handle float32
         from scipy.io import wavfile
         wavfile.write(filename, self.sample_rate, audio_to_save)
         print(f"Audio saved to {filename}")
-    
+
     def close(self):
-        """Close the PyAudio instance"""
-        self.stop_recording()
-        self.audio.terminate()
+        """Stop recording and release the audio source"""
+        self.stop()
 
 def extract_features_from_audio(audio, feature_type='mfcc', sr=SAMPLE_RATE, n_mfcc=N_MFCC):
     """Extract features from an audio array"""
-    if feature_type == 'mfcc':
-        # Extract Mel-Frequency Cepstral Coefficients
-        mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=n_mfcc)
-        
-        # Normalize the MFCCs
-        mfccs = StandardScaler().fit_transform(mfccs.T).T
-        return mfccs
-        
-    elif feature_type == 'melspec':
-        # Extract Mel spectrogram
-        melspec = librosa.feature.melspectrogram(y=audio, sr=sr, n_mels=128)
-        
-        # Convert to decibels
-        melspec_db = librosa.power_to_db(melspec, ref=np.max)
-        return melspec_db
-        
-    elif feature_type == 'combined':
-        # Extract both MFCCs and Mel spectrogram
-        mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=n_mfcc)
-        mfccs = StandardScaler().fit_transform(mfccs.T).T
-        
-        melspec = librosa.feature.melspectrogram(y=audio, sr=sr, n_mels=128)
-        melspec_db = librosa.power_to_db(melspec, ref=np.max)
-        
-        # Combine features
-        combined = np.concatenate([mfccs, melspec_db[:n_mfcc]])
-        return combined
-    
-    else:
-        raise ValueError(f"Unknown feature type: {feature_type}")
+    # Shared batched extractor; these models were trained on standardized MFCCs
+    return extract_features_batch(audio[np.newaxis], feature_type, normalize=True, sr=sr, n_mfcc=n_mfcc)[0]
+
+def hop_samples_for(hop_seconds, sr=SAMPLE_RATE):
+    """Prediction interval in samples, rounded to whole STFT hops"""
+    return max(1, int(round(hop_seconds * sr / HOP_LENGTH))) * HOP_LENGTH
+
+# Marks the end of the stream as it passes through the pipeline queues
+END_OF_STREAM = None
+
+class Window:
+    """One analysis window on its way through the pipeline
+
+    times holds a perf_counter() timestamp for each stage the window has
+    finished, starting with 'arrived' (its last sample was captured).
+    """
+    __slots__ = ('start', 'end', 'speech', 'features', 'scores', 'audio', 'times')
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.speech = True
+        self.features = None
+        self.scores = None
+        self.audio = None
+        self.times = {'arrived': time.perf_counter()}
+
+class LatencyTracker:
+    """Latency of each stage, and from audio arrival to the displayed result"""
+    STAGES = ('features', 'inference', 'display')
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in self.STAGES + ('end_to_end',)}
+
+    def record(self, window):
+        previous = window.times['arrived']
+        for stage in self.STAGES:
+            if stage in window.times:
+                # Includes the time spent waiting in the stage's input queue
+                self.samples[stage].append(window.times[stage] - previous)
+                previous = window.times[stage]
+        self.samples['end_to_end'].append(previous - window.times['arrived'])
+
+    def summary(self):
+        """Lines of p50 / p95 / max milliseconds per stage"""
+        lines = []
+        for stage, values in self.samples.items():
+            if values:
+                p50, p95 = np.percentile(values, [50, 95]) * 1000
+                lines.append(f"  {stage:11s} p50 {p50:7.1f} ms   p95 {p95:7.1f} ms   max {max(values) * 1000:7.1f} ms")
+        return lines
+
+class ClipWriter:
+    """Write WAV clips on a background thread so disk I/O never delays updates
+
+    At most max_pending clips wait to be written; further clips are dropped
+    (and counted) until the disk catches up.
+    """
+    def __init__(self, sample_rate=SAMPLE_RATE, max_pending=8):
+        self.sample_rate = sample_rate
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def save(self, filename, audio):
+        """Queue a clip; returns False when it had to be dropped"""
+        try:
+            self._queue.put_nowait((filename, audio))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        from scipy.io import wavfile
+        while True:
+            item = self._queue.get()
+            if item is END_OF_STREAM:
+                return
+            filename, audio = item
+            try:
+                wavfile.write(filename, self.sample_rate, audio)
+                self.written += 1
+            except OSError as e:
+                print(f"\nError saving clip {filename}: {e}")
+
+    def close(self):
+        """Write the clips still queued, then stop"""
+        self._queue.put(END_OF_STREAM)
+        self._thread.join()
+
+class AnalysisPipeline:
+    """Capture -> features -> inference, each on its own thread, feeding results
+
+    The capture stage waits for every hop of new audio in the recorder's ring
+    buffer and emits a window; the features stage applies the voice activity
+    gate and computes features incrementally; the inference stage scores all
+    windows waiting for it in one call of model (a CompiledModel). Finished windows (scores None
+    for windows without speech) arrive in order on the results queue, where
+    the caller displays them.
+
+    Stages are joined by queues of queue_size windows, so a slow stage never
+    holds up the ones before it. With a live source, a full queue drops its
+    oldest window to keep results current (counted in dropped); with a file
+    read as fast as possible, a full queue blocks instead, so every window is
+    analyzed.
+    """
+    def __init__(self, recorder, extractor, model, hop_samples, detector=None,
+                 keep_audio=False, queue_size=QUEUE_SIZE, max_batch=MAX_BATCH):
+        self.recorder = recorder
+        self.extractor = extractor
+        self.model = model
+        self.hop_samples = hop_samples
+        self.detector = detector
+        self.keep_audio = keep_audio
+        self.max_batch = max(1, max_batch)
+        self.lossless = not recorder.source.live
+        self.results = queue.Queue(maxsize=queue_size)
+        self._to_features = queue.Queue(maxsize=queue_size)
+        self._to_inference = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._capture, daemon=True),
+            threading.Thread(target=self._featurize, daemon=True),
+            threading.Thread(target=self._infer, daemon=True),
+        ]
+
+        # Statistics
+        self.skipped_hops = 0
+        self.dropped = {'features': 0, 'inference': 0, 'display': 0}
+        self.batches = 0
+        self.predictions = 0
+
+    def start(self):
+        # Trace the model's graphs for every batch size the inference stage can form
+        self.model.warm_up(self.max_batch)
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+
+    def _put(self, q, item, stage):
+        """Hand an item to the next stage, applying the queue policy"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1) if self.lossless or item is END_OF_STREAM else q.put_nowait(item)
+                return
+            except queue.Full:
+                if self.lossless or item is END_OF_STREAM:
+                    continue
+                # Make room by dropping the oldest window
+                try:
+                    q.get_nowait()
+                    self.dropped[stage] += 1
+                except queue.Empty:
+                    pass
+
+    def _get(self, q):
+        """Next item from a stage's input queue, or END_OF_STREAM once stopped"""
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return END_OF_STREAM
+
+    def _capture(self):
+        window_samples = self.extractor.window_samples
+        next_end = window_samples
+        while not self._stop.is_set():
+            # Wait for the next hop of audio
+            if not self.recorder.wait_for(next_end, timeout=1.0):
+                if self.recorder.finished:
+                    break
+                continue
+
+            # If capture is ahead of this window already, skip straight to the newest hop
+            behind = (self.recorder.buffer.total_written - next_end) // self.hop_samples
+            if behind > 0 and not self.lossless:
+                self.skipped_hops += behind
+                next_end += behind * self.hop_samples
+
+            self._put(self._to_features, Window(next_end - window_samples, next_end), 'features')
+            next_end += self.hop_samples
+        self._put(self._to_features, END_OF_STREAM, 'features')
+
+    def _featurize(self):
+        buffer = self.recorder.buffer
+        while True:
+            window = self._get(self._to_features)
+            if window is END_OF_STREAM:
+                break
+            try:
+                if self.detector is not None or self.keep_audio:
+                    audio = buffer.read(window.start, window.end)
+                    window.audio = audio if self.keep_audio else None
+                    # Silence and steady background noise skip features and inference
+                    if self.detector is not None:
+                        window.speech = bool(self.detector.gate(audio)[0])
+                if window.speech:
+                    # Only the frames for newly arrived hops go through the STFT
+                    window.features = self.extractor.features_at(window.end)
+            except BufferOverrun:
+                # The window was overwritten before this stage reached it
+                self.dropped['features'] += 1
+                continue
+            window.times['features'] = time.perf_counter()
+            self._put(self._to_inference, window, 'inference')
+        self._put(self._to_inference, END_OF_STREAM, 'inference')
+
+    def _infer(self):
+        finished = False
+        while not finished:
+            window = self._get(self._to_inference)
+            if window is END_OF_STREAM:
+                break
+            # Score every window already waiting in one call
+            windows = [window]
+            while len(windows) < self.max_batch:
+                try:
+                    window = self._to_inference.get_nowait()
+                except queue.Empty:
+                    break
+                if window is END_OF_STREAM:
+                    finished = True
+                    break
+                windows.append(window)
+
+            speech = [window for window in windows if window.speech]
+            if speech:
+                # Add the batch and channel dimensions
+                features = np.stack([window.features for window in speech])[..., np.newaxis]
+                scores = self.model.predict(features)
+                for window, row in zip(speech, scores):
+                    window.scores = row
+                    window.features = None
+                self.batches += 1
+                self.predictions += len(speech)
+            now = time.perf_counter()
+            for window in windows:
+                window.times['inference'] = now
+                self._put(self.results, window, 'display')
+        self._put(self.results, END_OF_STREAM, 'display')
 
 def run_realtime_analysis(model_path=None, encoder_path=None, feature_type='mfcc', 
-                          save_clips=False, clips_dir=None, duration=None):
-    """Run real-time voice sentiment analysis"""
+                          save_clips=False, clips_dir=None, duration=None,
+                          hop_seconds=HOP_SECONDS, input_path=None, realtime=True,
+                          vad=True, vad_energy_db=VAD_ENERGY_DB, vad_min_flux_db=VAD_MIN_FLUX_DB,
+                          queue_size=QUEUE_SIZE, result_log_dir=None, source_id=None):
+    """Run real-time voice sentiment analysis
+
+    A prediction is made every hop_seconds of audio over the most recent
+    DURATION seconds. With input_path a WAV file replaces the microphone; with
+    realtime=False the file is analyzed as fast as possible (for benchmarks).
+    With vad, windows without speech skip feature extraction and the model.
+    Capture, features and inference run as an AnalysisPipeline; this thread
+    only displays results and hands clips to a background writer. With
+    result_log_dir every prediction is appended to a ResultLog under
+    source_id (default: the input file name, else "microphone").
+    """
     print("Starting real-time voice sentiment analysis...")
     
     # Load the model and label encoder
+    if model_path is None and encoder_path is None:
+        # Prefer the newest versioned emotion_model_<version>.h5 / label_encoder pair
+        latest = latest_model(MODELS_DIR)
+        if latest is not None:
+            _, model_path, encoder_path = latest
+            print(f"Using model: {model_path}")
+    
     if model_path is None:
-        # Find the most recent model
+        # Otherwise fall back to the most recent .h5
         model_files = [f for f in os.listdir(MODELS_DIR) if f.endswith('.h5')]
         if model_files:
             model_file = max(model_files, key=lambda x: os.path.getmtime(os.path.join(MODELS_DIR, x)))
@@ -181,101 +389,154 @@ def run_realtime_analysis(model_path=None, encoder_path=None, feature_type='mfcc
     
     # Load model
     print("Loading model...")
-    model = load_model(model_path)
+    model = CompiledModel(load_model(model_path))
     
     # Load label encoder
     print("Loading label encoder...")
     with open(encoder_path, 'rb') as f:
         label_encoder = pickle.load(f)
+    labels = LabelSchema.from_encoder(label_encoder)
     
     # Create clips directory if saving clips
     if save_clips and clips_dir:
         os.makedirs(clips_dir, exist_ok=True)
     
-    # Initialize voice recorder
+    # Initialize voice recorder; the ring buffer also covers windows waiting in the pipeline queues
+    hop_samples = hop_samples_for(hop_seconds)
+    source = None
+    if input_path:
+        print(f"Reading audio from {input_path}")
+        source = WavFileSource(input_path, sample_rate=SAMPLE_RATE, chunk_size=CHUNK_SIZE, realtime=realtime)
     recorder = VoiceRecorder(
+        source=source,
         sample_rate=SAMPLE_RATE,
         chunk_size=CHUNK_SIZE,
-        duration=DURATION
+        duration=DURATION,
+        capacity_seconds=max(BUFFER_SECONDS, DURATION + (queue_size + 2) * hop_samples / SAMPLE_RATE)
     )
+    extractor = StreamingFeatureExtractor(recorder.buffer, feature_type=feature_type, sr=SAMPLE_RATE, duration=DURATION)
+    detector = None
+    if vad:
+        detector = VoiceActivityDetector(sr=SAMPLE_RATE, energy_db=vad_energy_db, min_flux_db=vad_min_flux_db)
+    pipeline = AnalysisPipeline(recorder, extractor, model, hop_samples, detector=detector,
+                                keep_audio=save_clips, queue_size=queue_size)
+    clip_writer = ClipWriter(SAMPLE_RATE) if save_clips else None
+    latency = LatencyTracker()
+    result_log = None
+    if result_log_dir:
+        result_log = ResultLog(result_log_dir, labels.classes)
+        source_id = source_id or (os.path.basename(input_path) if input_path else 'microphone')
+        print(f"Logging results to {result_log.directory} as {source_id!r}")
     
     # Start recording
     recorder.start_recording()
+    pipeline.start()
     
     try:
         # Track time for duration limit
         start_time = time.time()
         last_save_time = time.time()
         current_sentiment = None
-        sentiment_history = []
+        sentiment_history = deque(maxlen=HISTORY_SIZE)
+        sentiment_changes = 0
         
         print("Press Ctrl+C to stop")
         
+        # Display, history and clips run here, on results delivered by the pipeline
         while True:
-            # Check if duration limit reached
-            if duration and (time.time() - start_time) > duration:
+            try:
+                window = pipeline.results.get(timeout=1.0)
+            except queue.Empty:
+                window = None
+            else:
+                if window is END_OF_STREAM:
+                    print("\nEnd of audio stream.")
+                    break
+            
+            # Check if duration limit reached (stream time for files read faster than real time)
+            elapsed = time.time() - start_time if recorder.source.live else recorder.buffer.total_written / SAMPLE_RATE
+            if duration and elapsed > duration:
                 print(f"\nReached time limit of {duration} seconds.")
                 break
-                
-            # Get the last audio segment
-            audio_data = recorder.get_last_audio()
+            if window is None:
+                continue
+            
+            if window.scores is None:
+                print(f"\rNo speech detected{' ' * 60}", end="")
+                window.times['display'] = time.perf_counter()
+                latency.record(window)
+                continue
+            
+            # Get label and sentiment category
+            predicted_label, sentiment, confidence = labels.labels(window.scores[np.newaxis])[0]
+            confidence *= 100
             
-            if audio_data is not None and len(audio_data) >= SAMPLE_RATE * DURATION:
-                # Extract features
-                features = extract_features_from_audio(audio_data, feature_type)
-                
-                # Reshape for model input (add batch and channel dimensions)
-                features = features[np.newaxis, ..., np.newaxis]
-                
-                # Make prediction
-                prediction = model.predict(features, verbose=0)
-                predicted_class = np.argmax(prediction, axis=1)[0]
-                
-                # Get label
-                predicted_label = label_encoder.inverse_transform([predicted_class])[0]
-                confidence = np.max(prediction) * 100
-                
-                # Determine sentiment category
-                sentiment = "unknown"
-                if "_happy" in predicted_label or "_surprise" in predicted_label:
-                    sentiment = "positive"
-                elif "_sad" in predicted_label or "_angry" in predicted_label or "_fear" in predicted_label or "_disgust" in predicted_label:
-                    sentiment = "negative"
-                elif "_neutral" in predicted_label:
-                    sentiment = "neutral"
-                
-                # Save sentiment to history
-                if sentiment != current_sentiment:
-                    current_sentiment = sentiment
-                    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-                    sentiment_history.append((timestamp, predicted_label, sentiment, confidence))
-                
-                # Save audio clip if enabled and sentiment changed or it's been a while
-                if save_clips and (sentiment != current_sentiment or time.time() - last_save_time > 10):
-                    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                    clip_filename = os.path.join(clips_dir, f"sentiment_{sentiment}_{timestamp}.wav")
-                    from scipy.io import wavfile
-                    wavfile.write(clip_filename, SAMPLE_RATE, audio_data)
-                    last_save_time = time.time()
-                
-                # Display result
-                print(f"\rVoice detected: {predicted_label} (Sentiment: {sentiment}) - Confidence: {confidence:.1f}%", end="")
+            # Display result
+            print(f"\rVoice detected: {predicted_label} (Sentiment: {sentiment}) - Confidence: {confidence:.1f}%", end="")
+            window.times['display'] = time.perf_counter()
+            latency.record(window)
+            if result_log is not None:
+                result_log.append(source_id, window.scores)
             
-            # Sleep to reduce CPU usage
-            time.sleep(0.1)
+            # Save sentiment to history; the full record is in the result log
+            changed = sentiment != current_sentiment
+            if changed:
+                current_sentiment = sentiment
+                sentiment_changes += 1
+                timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+                sentiment_history.append((timestamp, predicted_label, sentiment, confidence))
+            
+            # Save audio clip if enabled and sentiment changed or it's been a while; written in the background
+            if clip_writer is not None and (changed or time.time() - last_save_time > 10):
+                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+                clip_filename = os.path.join(clips_dir, f"sentiment_{sentiment}_{timestamp}.wav")
+                clip_writer.save(clip_filename, window.audio)
+                last_save_time = time.time()
     
     except KeyboardInterrupt:
         print("\n\nStopping real-time analysis...")
     
     finally:
         # Clean up and display summary
+        pipeline.stop()
         recorder.stop_recording()
         recorder.close()
+        if clip_writer is not None:
+            clip_writer.close()
+        if result_log is not None:
+            result_log.close()
         
         print("\nAnalysis Summary:")
         print("----------------")
+        if sentiment_changes > len(sentiment_history):
+            print(f"(last {len(sentiment_history)} of {sentiment_changes} sentiment changes)")
+        first = sentiment_changes - len(sentiment_history)
         for i, (timestamp, emotion, sentiment, confidence) in enumerate(sentiment_history):
-            print(f"{i+1}. {timestamp} - {emotion} ({sentiment}) - Confidence: {confidence:.1f}%")
+            print(f"{first+i+1}. {timestamp} - {emotion} ({sentiment}) - Confidence: {confidence:.1f}%")
+        
+        if pipeline.predictions:
+            audio_seconds = recorder.buffer.total_written / SAMPLE_RATE
+            wall_seconds = time.time() - start_time
+            dropped = ', '.join(f"{count} before {stage}" for stage, count in pipeline.dropped.items() if count)
+            print(f"\nPredictions: {pipeline.predictions} every {hop_samples / SAMPLE_RATE:.3f}s in "
+                  f"{pipeline.batches} model calls ({pipeline.skipped_hops} hops skipped while behind"
+                  f"{'; windows dropped: ' + dropped if dropped else ''})")
+            print(f"Features: {extractor.frames_computed / max(1, extractor.windows):.1f} STFT frames per window")
+            print(f"Processed {audio_seconds:.1f}s of audio in {wall_seconds:.1f}s "
+                  f"({audio_seconds / max(wall_seconds, 1e-9):.1f}x real time)")
+            print("Latency from audio arrival (each stage includes its queue wait):")
+            for line in latency.summary():
+                print(line)
+        if detector is not None and detector.windows_checked:
+            stats = detector.stats()
+            print(f"Voice activity gate: {stats['windows_skipped']} of {stats['windows_checked']} windows had no speech "
+                  f"({stats['skip_ratio'] * 100:.0f}% of inference skipped, "
+                  f"{stats['vad_seconds'] / stats['windows_checked'] * 1000:.2f} ms per check)")
+        if result_log is not None:
+            print(f"Results: {result_log.rows_appended} predictions logged to {result_log.directory}")
+        if clip_writer is not None:
+            print(f"Clips: {clip_writer.written} written to {clips_dir}"
+                  f"{f', {clip_writer.dropped} dropped while the disk was busy' if clip_writer.dropped else ''}")
 
 def main():
     # Parse command line arguments
@@ -292,6 +553,24 @@ def main():
                       help="Directory to save audio clips (default: voice_clips/)")
     parser.add_argument("--duration", type=int, default=None, 
                       help="Duration in seconds to run analysis (default: unlimited)")
+    parser.add_argument("--hop", type=float, default=HOP_SECONDS,
+                      help=f"Seconds of new audio between predictions (default: {HOP_SECONDS})")
+    parser.add_argument("--input", type=str, default=None,
+                      help="Analyze a WAV file instead of the microphone")
+    parser.add_argument("--no-realtime", action="store_true",
+                      help="With --input, read the file as fast as possible instead of at real-time pace")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                      help=f"Windows that may wait between pipeline stages (default: {QUEUE_SIZE})")
+    parser.add_argument("--result-log", type=str, default=None,
+                      help="Append every prediction to a result log in this directory")
+    parser.add_argument("--source-id", type=str, default=None,
+                      help="Source recorded with each logged result (default: input file name or 'microphone')")
+    parser.add_argument("--no-vad", action="store_true",
+                      help="Run the model on every window, including silence")
+    parser.add_argument("--vad-energy-db", type=float, default=VAD_ENERGY_DB,
+                      help=f"Frame level (dBFS) counted as sound by the voice activity gate (default: {VAD_ENERGY_DB})")
+    parser.add_argument("--vad-min-flux", type=float, default=VAD_MIN_FLUX_DB,
+                      help=f"Spectral change (dB) the gate needs to count sound as speech (default: {VAD_MIN_FLUX_DB})")
     
     args = parser.parse_args()
     
@@ -302,7 +581,16 @@ def main():
         feature_type=args.feature,
         save_clips=args.save_clips,
         clips_dir=args.clips_dir,
-        duration=args.duration
+        duration=args.duration,
+        hop_seconds=args.hop,
+        input_path=args.input,
+        realtime=not args.no_realtime,
+        vad=not args.no_vad,
+        vad_energy_db=args.vad_energy_db,
+        vad_min_flux_db=args.vad_min_flux,
+        queue_size=args.queue_size,
+        result_log_dir=args.result_log,
+        source_id=args.source_id
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,263 @@
+# admission.py
+# Admission control: priority classes, bounded wait queues, per-client limits and deadlines
+
+import math
+import threading
+import time
+from collections import deque
+
+# Priority classes, most urgent first
+PRIORITIES = ('interactive', 'bulk')
+
+class Rejected(Exception):
+    """A request turned away at admission
+
+    status is the HTTP code to report (429 for a client over its own limit,
+    503 when the server is saturated), retry_after the suggested wait in
+    seconds and reason a short label for metrics.
+    """
+    def __init__(self, message, status=503, retry_after=1, reason='queue_full'):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+class DeadlineExceeded(Exception):
+    """The client's deadline passed before its work was done"""
+
+def deadline_after(seconds):
+    """Monotonic deadline seconds from now, or None for no deadline"""
+    if seconds is None:
+        return None
+    return time.monotonic() + seconds
+
+def check_deadline(deadline):
+    """Raise DeadlineExceeded if a monotonic deadline has passed"""
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded('Request deadline exceeded')
+
+class _Waiter:
+    """A request waiting in a priority queue for a work slot"""
+    __slots__ = ('priority', 'event', 'granted')
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.event = threading.Event()
+        self.granted = False
+
+class Ticket:
+    """A granted work slot; release() it (or use it as a context manager) when done"""
+    def __init__(self, controller, priority, client):
+        self.controller = controller
+        self.priority = priority
+        self.client = client
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        """Free the slot; later calls do nothing"""
+        if not self._released:
+            self._released = True
+            self.controller._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+class AdmissionController:
+    """Bound the work in progress and decide which request runs next
+
+    At most max_active requests hold a work slot at once, of which bulk
+    requests may take bulk_max_active, so a burst of background jobs always
+    leaves slots for interactive users. Requests that find no free slot wait
+    in a FIFO queue per priority class; when a slot frees up, waiting
+    interactive requests go first. A full queue, a client already holding
+    client_limit slots or queue places, or a wait longer than max_queue_wait
+    seconds rejects the request right away with a Retry-After estimate,
+    instead of letting work pile up behind the model. A request whose
+    deadline passes while it waits is dropped with DeadlineExceeded.
+
+    Every admitted or queued request, and every open live stream
+    (acquire_stream), holds one server thread. With max_threads set, a
+    request or stream that would take the last of them is rejected, so
+    long-lived streams cannot leave /analyze queued behind a thread pool
+    that no longer has room for it.
+    """
+    def __init__(self, max_active=8, bulk_max_active=None, max_queued=None,
+                 client_limit=0, max_queue_wait=5.0, max_threads=0):
+        self.max_active = max(1, int(max_active))
+        if bulk_max_active is None:
+            bulk_max_active = max(1, self.max_active // 2)
+        self.bulk_max_active = max(1, min(int(bulk_max_active), self.max_active))
+        self.max_queued = {priority: 2 * self.max_active for priority in PRIORITIES}
+        self.max_queued.update(max_queued or {})
+        self.client_limit = max(0, int(client_limit))
+        self.max_queue_wait = max(0.0, float(max_queue_wait))
+        self.max_threads = max(0, int(max_threads))
+
+        self._lock = threading.Lock()
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._active = {priority: 0 for priority in PRIORITIES}
+        self._clients = {}   # client -> slots held plus queue places
+        self._streams = 0
+        self._mean_service = None
+
+        # Metrics
+        self.admitted = {priority: 0 for priority in PRIORITIES}
+        self.rejected = {}
+        self.max_queue_depth = 0
+
+    def acquire(self, priority='interactive', client=None, deadline=None):
+        """Wait for a work slot and return its Ticket
+
+        Raises Rejected when the request should be turned away and
+        DeadlineExceeded when the monotonic deadline passes first.
+        """
+        if priority not in self._queues:
+            raise ValueError(f"priority must be one of: {', '.join(PRIORITIES)}")
+        check_deadline(deadline)
+
+        with self._lock:
+            if self.client_limit and client is not None and self._clients.get(client, 0) >= self.client_limit:
+                self._reject('client_limit')
+                raise Rejected(f'Too many concurrent requests from this client (at most {self.client_limit})',
+                               status=429, retry_after=self._retry_after(priority, 0), reason='client_limit')
+            if not self._thread_free():
+                self._reject('threads')
+                raise Rejected('Server busy: every request thread is taken',
+                               retry_after=self._retry_after(priority, len(self._queues[priority])), reason='threads')
+            if self._can_start(priority) and not self._waiting_ahead(priority):
+                return self._grant(priority, client)
+            queue = self._queues[priority]
+            if len(queue) >= self.max_queued[priority]:
+                self._reject('queue_full')
+                raise Rejected(f'Server busy: {priority} queue is full',
+                               retry_after=self._retry_after(priority, len(queue)), reason='queue_full')
+            waiter = _Waiter(priority)
+            queue.append(waiter)
+            self._hold(client, 1)
+            self.max_queue_depth = max(self.max_queue_depth, sum(len(q) for q in self._queues.values()))
+
+        timeout = self.max_queue_wait
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        waiter.event.wait(max(0.0, timeout))
+
+        with self._lock:
+            if waiter.granted:
+                # _dispatch reserved the slot; the queue place becomes the client's slot
+                self.admitted[priority] += 1
+                return Ticket(self, priority, client)
+            self._queues[priority].remove(waiter)
+            self._hold(client, -1)
+            if deadline is not None and time.monotonic() >= deadline:
+                self._reject('deadline')
+                raise DeadlineExceeded('Request deadline exceeded while queued')
+            self._reject('queue_timeout')
+            raise Rejected(f'Server busy: no {priority} slot within {self.max_queue_wait:g}s',
+                           retry_after=self._retry_after(priority, len(self._queues[priority])),
+                           reason='queue_timeout')
+
+    def acquire_stream(self, client=None):
+        """Count an open live stream against the thread budget and return its Ticket
+
+        Streams need no work slot (their windows are batched with everyone
+        else's), but each holds a thread for as long as it is open. Raises
+        Rejected when no thread is left.
+        """
+        with self._lock:
+            if not self._thread_free():
+                self._reject('threads')
+                raise Rejected('Server busy: every request thread is taken', reason='threads')
+            self._streams += 1
+            return Ticket(self, 'stream', client)
+
+    def stats(self):
+        """Return a snapshot of slots, queues and admission decisions"""
+        with self._lock:
+            return {
+                'max_active': self.max_active,
+                'bulk_max_active': self.bulk_max_active,
+                'active': dict(self._active),
+                'queued': {priority: len(queue) for priority, queue in self._queues.items()},
+                'max_queued': dict(self.max_queued),
+                'max_queue_depth': self.max_queue_depth,
+                'streams': self._streams,
+                'max_threads': self.max_threads,
+                'clients': len(self._clients),
+                'admitted': dict(self.admitted),
+                'rejected': dict(sorted(self.rejected.items())),
+                'mean_service_seconds': self._mean_service or 0.0,
+            }
+
+    def _can_start(self, priority):
+        if sum(self._active.values()) >= self.max_active:
+            return False
+        return priority != 'bulk' or self._active['bulk'] < self.bulk_max_active
+
+    def _thread_free(self):
+        if not self.max_threads:
+            return True
+        held = sum(self._active.values()) + sum(len(queue) for queue in self._queues.values()) + self._streams
+        return held < self.max_threads
+
+    def _waiting_ahead(self, priority):
+        """Requests already queued that would run before a new one of this priority"""
+        for other in PRIORITIES:
+            if self._queues[other]:
+                return True
+            if other == priority:
+                return False
+        return False
+
+    def _grant(self, priority, client):
+        self._active[priority] += 1
+        self._hold(client, 1)
+        self.admitted[priority] += 1
+        return Ticket(self, priority, client)
+
+    def _hold(self, client, delta):
+        if client is None:
+            return
+        count = self._clients.get(client, 0) + delta
+        if count > 0:
+            self._clients[client] = count
+        else:
+            self._clients.pop(client, None)
+
+    def _reject(self, reason):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def _retry_after(self, priority, ahead):
+        """Whole seconds until a slot is likely free, from the mean time a slot is held"""
+        slots = self.bulk_max_active if priority == 'bulk' else self.max_active
+        service = self._mean_service or 1.0
+        return min(60, max(1, math.ceil((ahead + 1) * service / slots)))
+
+    def _release(self, ticket):
+        elapsed = time.monotonic() - ticket.started
+        with self._lock:
+            if ticket.priority == 'stream':
+                self._streams -= 1
+                return
+            self._active[ticket.priority] -= 1
+            self._hold(ticket.client, -1)
+            # Exponential moving average of how long a slot is held
+            if self._mean_service is None:
+                self._mean_service = elapsed
+            else:
+                self._mean_service += 0.1 * (elapsed - self._mean_service)
+            self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to waiting requests, interactive first (lock held)"""
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self._can_start(priority):
+                waiter = queue.popleft()
+                waiter.granted = True
+                # Reserve the slot now; the waiter's thread turns it into a Ticket
+                self._active[priority] += 1
+                waiter.event.set()
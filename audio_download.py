@@ -0,0 +1,137 @@
+# audio_download.py
+# Pooled, size- and time-limited audio downloads into memory
+
+import os
+import threading
+import time
+from collections import namedtuple
+
+# Downloaded audio payload plus the response metadata callers may key caches on
+DownloadedAudio = namedtuple('DownloadedAudio', ['data', 'etag', 'content_type'])
+
+class DownloadError(Exception):
+    """Raised when an audio download fails or exceeds its limits"""
+
+class AudioDownloader:
+    """Download audio over a shared keep-alive connection pool
+
+    Every download is bounded by a connect timeout, a per-read timeout, a total
+    wall-clock budget and a maximum payload size. The body is accumulated in
+    memory, so nothing is written to disk.
+    """
+    def __init__(self, pool_size=16, connect_timeout=5.0, read_timeout=15.0,
+                 total_timeout=30.0, max_bytes=50 * 1024 * 1024, chunk_size=64 * 1024):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+    @property
+    def session(self):
+        """Shared requests session, recreated in forked child processes"""
+        with self._lock:
+            # Pooled sockets must not be shared between pre-forked workers
+            if self._session is None or self._pid != os.getpid():
+                # Imported on first use to keep module import (and server startup) fast
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+                self._pid = os.getpid()
+            return self._session
+
+    def _time_left(self, end, url):
+        """Seconds until the monotonic end of a download's budget; DownloadError once it has passed"""
+        left = end - time.monotonic()
+        if left <= 0:
+            raise DownloadError(f"Download of {url} exceeded its time limit")
+        return left
+
+    def _end(self, deadline):
+        """End of the time budget of a download starting now: total_timeout, or the deadline if sooner"""
+        end = time.monotonic() + self.total_timeout
+        return end if deadline is None else min(end, deadline)
+
+    def head(self, url, deadline=None):
+        """Return the response headers for url without downloading the body"""
+        import requests
+        end = self._end(deadline)
+        try:
+            response = self.session.head(
+                url,
+                timeout=(min(self.connect_timeout, self._time_left(end, url)),
+                         min(self.read_timeout, self._time_left(end, url))),
+                allow_redirects=True
+            )
+            response.raise_for_status()
+            return response.headers
+        except requests.RequestException as e:
+            raise DownloadError(f"HEAD {url} failed: {e}") from e
+
+    def download(self, url, deadline=None):
+        """Download url into memory and return a DownloadedAudio
+
+        The whole download must finish within total_timeout seconds, and
+        before the monotonic deadline when one is given. Each socket read
+        waits at most for the time left (or read_timeout if that is shorter).
+        The body is read one network read at a time, so a server that
+        trickles bytes cannot keep a read going past the budget.
+        """
+        import requests
+        end = self._end(deadline)
+        try:
+            with self.session.get(url, stream=True,
+                                  timeout=(min(self.connect_timeout, self._time_left(end, url)),
+                                           min(self.read_timeout, self._time_left(end, url)))) as response:
+                response.raise_for_status()
+
+                # Reject oversized bodies up front when the server tells us the size
+                content_length = response.headers.get('Content-Length')
+                if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+                    raise DownloadError(f"Audio file too large: {content_length} bytes (limit {self.max_bytes})")
+
+                buffer = bytearray()
+                for chunk in self._chunks(response, end, url):
+                    buffer.extend(chunk)
+                    if len(buffer) > self.max_bytes:
+                        raise DownloadError(f"Audio file too large: more than {self.max_bytes} bytes")
+
+                return DownloadedAudio(
+                    bytes(buffer),
+                    response.headers.get('ETag'),
+                    response.headers.get('Content-Type')
+                )
+        except requests.RequestException as e:
+            raise DownloadError(f"Download of {url} failed: {e}") from e
+
+    def _chunks(self, response, end, url):
+        """Body chunks of a streamed response, checking the time budget before every read"""
+        raw = response.raw
+        if not hasattr(raw, 'read1'):
+            # urllib3 1.x: iter_content fills whole chunks, so the check is per chunk
+            for chunk in response.iter_content(chunk_size=self.chunk_size):
+                self._time_left(end, url)
+                yield chunk
+            return
+
+        from urllib3.exceptions import HTTPError
+        sock = getattr(getattr(raw, 'connection', None), 'sock', None)
+        while True:
+            left = self._time_left(end, url)
+            if sock is not None:
+                sock.settimeout(min(self.read_timeout, left))
+            try:
+                chunk = raw.read1(self.chunk_size, decode_content=True)
+            except HTTPError as e:
+                raise DownloadError(f"Download of {url} failed: {e}") from e
+            if not chunk:
+                return
+            yield chunk
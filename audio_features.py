@@ -0,0 +1,173 @@
+# audio_features.py
+# Batched MFCC / mel spectrogram extraction shared by the server and scripts
+
+import functools
+
+import numpy as np
+
+# librosa and scipy.signal take about a second to import, so they are imported
+# on first use; the server does that during its warm-up phase
+
+# Defaults shared by the model server and the scripts
+SAMPLE_RATE = 16000
+DURATION = 3.0     # seconds
+N_MFCC = 40
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+TOP_DB = 80.0      # dynamic range kept by power_to_db
+
+# Clips are framed in chunks to bound the size of the (batch, frames, n_fft) buffer
+MAX_CHUNK_CLIPS = 8
+
+def prepare_waveform(y, trim_top_db, sr=SAMPLE_RATE, duration=DURATION):
+    """Trim leading/trailing silence and pad or truncate to a fixed length"""
+    import librosa
+    y, _ = librosa.effects.trim(y, top_db=trim_top_db)
+    target_length = int(sr * duration)
+    if len(y) > target_length:
+        return y[:target_length]
+    return np.pad(y, (0, target_length - len(y)), 'constant')
+
+def standardize(features):
+    """Zero-mean, unit-variance scaling of each coefficient over time
+
+    Equivalent to StandardScaler().fit_transform(f.T).T for every clip in a
+    (batch, n_features, n_frames) stack.
+    """
+    mean = features.mean(axis=-1, keepdims=True)
+    std = features.std(axis=-1, keepdims=True)
+    std[std == 0] = 1.0
+    return (features - mean) / std
+
+class FeatureExtractor:
+    """Compute STFT -> mel -> dB -> DCT for a stack of equal-length waveforms
+
+    The analysis window and mel filterbank are built once per parameter set;
+    each call frames the whole batch and runs a handful of batched NumPy/SciPy
+    operations instead of one librosa pipeline per clip. The operations mirror
+    librosa's own (float64 windowing, complex64 spectrum, the same matmul
+    layout and scipy.fftpack DCT), so the output is bit-identical to
+    librosa.feature.mfcc / melspectrogram with the same parameters.
+    """
+    def __init__(self, sr=SAMPLE_RATE, n_fft=N_FFT, hop_length=HOP_LENGTH,
+                 n_mels=N_MELS, n_mfcc=N_MFCC, top_db=TOP_DB):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mels = n_mels
+        self.n_mfcc = n_mfcc
+        self.top_db = top_db
+
+        import librosa
+        import scipy.fftpack
+        import scipy.signal
+
+        # librosa applies a float64 window, so keep it float64 for parity
+        self.window = scipy.signal.get_window('hann', n_fft, fftbins=True)
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+        self._dct = scipy.fftpack.dct
+
+    def n_frames(self, n_samples):
+        """Number of STFT frames produced for a clip of n_samples"""
+        return 1 + n_samples // self.hop_length
+
+    def power_spectrogram(self, waveforms, center=True):
+        """Return |STFT|^2 with shape (batch, 1 + n_fft // 2, n_frames)
+
+        With center=False the waveforms are not zero-padded, so frame i starts
+        at sample i * hop_length; streaming callers use this to compute frames
+        of a longer signal piece by piece.
+        """
+        waveforms = np.asarray(waveforms, dtype=np.float32)
+        if center:
+            pad = self.n_fft // 2
+            waveforms = np.pad(waveforms, ((0, 0), (pad, pad)), mode='constant')
+        frames = np.lib.stride_tricks.sliding_window_view(waveforms, self.n_fft, axis=-1)[:, ::self.hop_length]
+        spectrum = np.fft.rfft(frames * self.window, axis=-1).astype(np.complex64)
+        return (np.abs(spectrum) ** 2).transpose(0, 2, 1)
+
+    def mel_power(self, waveforms, center=True):
+        """Return the mel power spectrogram with shape (batch, n_mels, n_frames)"""
+        return np.matmul(self.mel_basis, self.power_spectrogram(waveforms, center=center))
+
+    def power_to_db(self, mel, ref_max=False):
+        """Per-clip power_to_db, clamped to top_db below each clip's peak"""
+        log_spec = 10.0 * np.log10(np.maximum(1e-10, mel))
+        if ref_max:
+            # ref=np.max: measure relative to the loudest bin of each clip
+            ref = np.maximum(1e-10, mel.max(axis=(1, 2), keepdims=True))
+            log_spec -= 10.0 * np.log10(ref)
+        if self.top_db is not None:
+            log_spec = np.maximum(log_spec, log_spec.max(axis=(1, 2), keepdims=True) - self.top_db)
+        return log_spec
+
+    def _chunked(self, fn, waveforms):
+        waveforms = np.asarray(waveforms, dtype=np.float32)
+        if len(waveforms) <= MAX_CHUNK_CLIPS:
+            return fn(waveforms)
+        return np.concatenate([
+            fn(waveforms[start:start + MAX_CHUNK_CLIPS])
+            for start in range(0, len(waveforms), MAX_CHUNK_CLIPS)
+        ])
+
+    def mfcc_from_mel(self, mel):
+        """MFCCs from a (batch, n_mels, n_frames) mel power spectrogram"""
+        return self._dct(self.power_to_db(mel), axis=-2, type=2, norm='ortho')[:, :self.n_mfcc]
+
+    def melspectrogram_db_from_mel(self, mel):
+        """Peak-referenced dB mel spectrogram from a mel power spectrogram"""
+        return self.power_to_db(mel, ref_max=True)
+
+    def mfcc(self, waveforms):
+        """MFCCs with shape (batch, n_mfcc, n_frames), as librosa.feature.mfcc"""
+        return self._chunked(lambda chunk: self.mfcc_from_mel(self.mel_power(chunk)), waveforms)
+
+    def melspectrogram_db(self, waveforms):
+        """Mel spectrogram in dB relative to each clip's peak, shape (batch, n_mels, n_frames)"""
+        return self._chunked(lambda chunk: self.melspectrogram_db_from_mel(self.mel_power(chunk)), waveforms)
+
+@functools.lru_cache(maxsize=8)
+def get_extractor(sr=SAMPLE_RATE, n_fft=N_FFT, hop_length=HOP_LENGTH, n_mels=N_MELS, n_mfcc=N_MFCC):
+    """Shared FeatureExtractor for a parameter set, built on first use"""
+    return FeatureExtractor(sr=sr, n_fft=n_fft, hop_length=hop_length, n_mels=n_mels, n_mfcc=n_mfcc)
+
+def features_from_mel(mel, feature_type='mfcc', normalize=False, extractor=None):
+    """Model features from a (batch, n_mels, n_frames) mel power spectrogram
+
+    The feature_type / normalize handling of extract_features_batch, for
+    callers that already hold mel power (e.g. the streaming extractor).
+    """
+    extractor = extractor or get_extractor()
+
+    if feature_type == 'mfcc':
+        mfccs = extractor.mfcc_from_mel(mel)
+        return standardize(mfccs) if normalize else mfccs
+
+    elif feature_type == 'melspec':
+        return extractor.melspectrogram_db_from_mel(mel)
+
+    elif feature_type == 'combined':
+        mfccs = extractor.mfcc_from_mel(mel)
+        if normalize:
+            mfccs = standardize(mfccs)
+        melspec_db = extractor.melspectrogram_db_from_mel(mel)
+        return np.concatenate([mfccs, melspec_db[:, :extractor.n_mfcc]], axis=1)
+
+    else:
+        raise ValueError(f"Unknown feature type: {feature_type}")
+
+def extract_features_batch(waveforms, feature_type='mfcc', normalize=False,
+                           sr=SAMPLE_RATE, n_mfcc=N_MFCC):
+    """Extract features for a stack of equal-length waveforms
+
+    feature_type is 'mfcc', 'melspec' or 'combined', as in the scripts. With
+    normalize=True the MFCCs are standardized per clip, which is what the
+    script-trained models expect; the server model uses raw MFCCs.
+    Returns an array of shape (batch, n_features, n_frames).
+    """
+    extractor = get_extractor(sr=sr, n_mfcc=n_mfcc)
+    return extractor._chunked(
+        lambda chunk: features_from_mel(extractor.mel_power(chunk), feature_type, normalize, extractor),
+        waveforms
+    )
@@ -0,0 +1,129 @@
+# compiled_inference.py
+# Graph-compiled, fixed-shape forward passes for Keras models
+
+import threading
+
+import numpy as np
+
+# Batch sizes with their own traced graph; other sizes are padded up to the next one
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+def parse_buckets(text):
+    """Parse "1,2,4,8" into a sorted tuple of batch sizes"""
+    buckets = sorted({int(part) for part in str(text).split(',') if part.strip()})
+    if not buckets or buckets[0] < 1:
+        raise ValueError(f"Invalid batch buckets: {text!r}")
+    return tuple(buckets)
+
+def configure_threads(intra_op=None, inter_op=None):
+    """Size TensorFlow's CPU thread pools (None or 0 keeps TensorFlow's default)
+
+    Only possible before TensorFlow runs its first operation, so call this
+    before loading a model. Returns False if the pools could not be changed.
+    """
+    import tensorflow as tf
+    try:
+        if intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(int(intra_op))
+        if inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(int(inter_op))
+    except RuntimeError as e:
+        print(f"Could not configure TensorFlow thread pools: {e}")
+        return False
+    return True
+
+class CompiledModel:
+    """Call a Keras model through one traced graph per batch-size bucket
+
+    model.predict() builds a data adapter and runs Keras's generic batching
+    loop on every call, and calling the model eagerly dispatches each layer
+    from Python; both cost far more than the forward pass of a small CNN. Here
+    each bucket in buckets gets a tf.function with a fixed input signature,
+    traced once (warm_up() traces them all up front), and a batch of n rows is
+    copied into a preallocated buffer of the smallest bucket that holds it.
+    Rows are independent at inference time, so the padding rows (left over
+    from earlier calls) do not affect the results, which are cut back to n.
+    Batches larger than the largest bucket are split.
+
+    Input buffers are per thread, so concurrent callers never share one.
+    """
+    def __init__(self, model, buckets=BATCH_BUCKETS, jit_compile=False):
+        self.model = model
+        self.buckets = tuple(sorted(set(int(bucket) for bucket in buckets)))
+        self.jit_compile = jit_compile
+        self.input_shape = tuple(model.input_shape[1:])
+        self.output_shape = tuple(model.output_shape[1:])
+        self._functions = {}   # bucket -> concrete function
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.calls = 0
+        self.rows = 0
+        self.padded_rows = 0
+
+    def bucket_for(self, n):
+        """Smallest bucket holding n rows (the largest bucket for bigger batches)"""
+        for bucket in self.buckets:
+            if bucket >= n:
+                return bucket
+        return self.buckets[-1]
+
+    def _forward(self, features):
+        return self.model(features, training=False)
+
+    def _function(self, bucket):
+        function = self._functions.get(bucket)
+        if function is None:
+            import tensorflow as tf
+            with self._lock:
+                function = self._functions.get(bucket)
+                if function is None:
+                    spec = tf.TensorSpec((bucket,) + self.input_shape, tf.float32)
+                    function = tf.function(self._forward, input_signature=[spec], autograph=False,
+                                           jit_compile=self.jit_compile).get_concrete_function()
+                    self._functions[bucket] = function
+        return function
+
+    def _buffer(self, bucket):
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buffer = buffers.get(bucket)
+        if buffer is None:
+            buffer = buffers[bucket] = np.zeros((bucket,) + self.input_shape, dtype=np.float32)
+        return buffer
+
+    def warm_up(self, max_rows=None):
+        """Trace the graphs of every bucket up to the one holding max_rows (all by default)"""
+        largest = self.bucket_for(max_rows) if max_rows else self.buckets[-1]
+        for bucket in self.buckets:
+            if bucket <= largest:
+                self._function(bucket)(self._buffer(bucket))
+
+    def predict(self, features):
+        """Class probabilities for a (batch, ...) array, like model.predict"""
+        features = np.asarray(features, dtype=np.float32)
+        n = len(features)
+        if n == 0:
+            return np.zeros((0,) + self.output_shape, dtype=np.float32)
+        largest = self.buckets[-1]
+        if n > largest:
+            return np.concatenate([self.predict(features[i:i + largest]) for i in range(0, n, largest)])
+
+        bucket = self.bucket_for(n)
+        buffer = self._buffer(bucket)
+        buffer[:n] = features
+        outputs = self._function(bucket)(buffer)
+        with self._lock:
+            self.calls += 1
+            self.rows += n
+            self.padded_rows += bucket - n
+        return outputs.numpy()[:n]
+
+    def stats(self):
+        return {
+            'buckets': list(self.buckets),
+            'traced': sorted(self._functions),
+            'calls': self.calls,
+            'rows': self.rows,
+            'padded_rows': self.padded_rows,
+        }
@@ -0,0 +1,184 @@
+# feature_store.py
+# Persistent, content-addressed store of clip features in memory-mapped shards
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from audio_features import DURATION, HOP_LENGTH, N_FFT, N_MELS, N_MFCC, SAMPLE_RATE
+from result_cache import audio_hasher
+
+# Bump when the layout or the feature computation changes, so old stores are not reused
+STORE_FORMAT = 1
+SHARD_ROWS = 1024   # rows buffered in memory before a shard is written
+
+def file_digest(path, chunk_size=1 << 20):
+    """Content hash of a file, read in chunks (the same hash as result_cache.audio_digest)"""
+    hasher = audio_hasher()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def feature_config(feature_type='mfcc', sr=SAMPLE_RATE, n_mfcc=N_MFCC, n_fft=N_FFT,
+                   hop_length=HOP_LENGTH, n_mels=N_MELS, duration=DURATION,
+                   trim_top_db=None, normalize=False):
+    """Every parameter the features of a clip depend on, besides its content"""
+    return {
+        'format': STORE_FORMAT,
+        'feature_type': feature_type,
+        'sr': sr,
+        'n_mfcc': n_mfcc,
+        'n_fft': n_fft,
+        'hop_length': hop_length,
+        'n_mels': n_mels,
+        'duration': duration,
+        'trim_top_db': trim_top_db,
+        'normalize': bool(normalize),
+    }
+
+class FeatureStore:
+    """Features of whole clips keyed by file content hash, for one parameter set
+
+    Each parameter set (see feature_config) gets its own directory under root,
+    named after a hash of the parameters, so features computed with other
+    settings are never returned. Rows are buffered and written as .npy shards
+    of up to shard_rows clips; index.tsv maps each content hash to a shard and
+    row and is appended only after the shard is on disk, so an interrupted run
+    leaves a consistent store. Shards are opened with mmap_mode='r': get()
+    returns a read-only view into the page cache, without decoding or copying.
+
+    One process should write to a store at a time; any number can read.
+    """
+    def __init__(self, root, shard_rows=SHARD_ROWS, **params):
+        self.config = feature_config(**params)
+        config_id = hashlib.sha256(json.dumps(self.config, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        self.directory = os.path.join(root, f"{self.config['feature_type']}-{config_id}")
+        self.shard_rows = max(1, int(shard_rows))
+        os.makedirs(self.directory, exist_ok=True)
+
+        config_path = os.path.join(self.directory, 'config.json')
+        if not os.path.exists(config_path):
+            with open(config_path, 'w') as f:
+                json.dump(self.config, f, indent=2, sort_keys=True)
+
+        self._index = {}     # digest -> (shard, row)
+        self._shards = {}    # shard -> memory-mapped array
+        self._buffer = {}    # digest -> features not yet written
+        self._next_shard = 0
+        self.hits = 0
+        self.misses = 0
+
+        index_path = os.path.join(self.directory, 'index.tsv')
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                for line in f:
+                    fields = line.split()
+                    # A line cut off by an interrupted write is ignored
+                    if len(fields) == 3:
+                        self._index[fields[0]] = (int(fields[1]), int(fields[2]))
+        if self._index:
+            self._next_shard = max(shard for shard, _ in self._index.values()) + 1
+
+    def _shard_path(self, shard):
+        return os.path.join(self.directory, f"shard-{shard:05d}.npy")
+
+    def _shard(self, shard):
+        array = self._shards.get(shard)
+        if array is None:
+            array = self._shards[shard] = np.load(self._shard_path(shard), mmap_mode='r')
+        return array
+
+    def __len__(self):
+        return len(self._index) + len(self._buffer)
+
+    def __contains__(self, digest):
+        return digest in self._index or digest in self._buffer
+
+    def get(self, digest):
+        """Features stored for a content hash (a read-only memory-mapped view), or None"""
+        location = self._index.get(digest)
+        if location is not None:
+            self.hits += 1
+            shard, row = location
+            return self._shard(shard)[row]
+        features = self._buffer.get(digest)
+        if features is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return features
+
+    def put(self, digest, features):
+        """Add the features of a clip; written to disk with the next full shard or flush()"""
+        if digest in self:
+            return
+        self._buffer[digest] = np.asarray(features)
+        if len(self._buffer) >= self.shard_rows:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows as a new shard, then record them in the index"""
+        if not self._buffer:
+            return
+        digests = list(self._buffer)
+        rows = np.stack([self._buffer[digest] for digest in digests])
+        shard = self._next_shard
+        path = self._shard_path(shard)
+
+        # Write to a temporary file first so readers never see a partial shard
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, rows)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        with open(os.path.join(self.directory, 'index.tsv'), 'a') as f:
+            f.writelines(f"{digest}\t{shard}\t{row}\n" for row, digest in enumerate(digests))
+        for row, digest in enumerate(digests):
+            self._index[digest] = (shard, row)
+        self._next_shard += 1
+        self._buffer.clear()
+
+    def iter_shards(self):
+        """Yield (digests, features) per shard, features being the whole memory-mapped shard
+
+        Suits scoring or training over everything in the store: slices of a
+        shard go to the model without gathering rows one by one.
+        """
+        by_shard = {}
+        for digest, (shard, row) in self._index.items():
+            by_shard.setdefault(shard, []).append((row, digest))
+        for shard in sorted(by_shard):
+            rows, digests = zip(*sorted(by_shard[shard]))
+            features = self._shard(shard)
+            if rows != tuple(range(len(features))):
+                # Only part of the shard made it into the index: gather those rows
+                features = features[list(rows)]
+            yield list(digests), features
+
+    def stats(self):
+        return {
+            'clips': len(self),
+            'shards': self._next_shard,
+            'hits': self.hits,
+            'misses': self.misses,
+            'directory': self.directory,
+        }
+
+    def close(self):
+        self.flush()
+        self._shards.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
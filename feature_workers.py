@@ -0,0 +1,134 @@
+# feature_workers.py
+# Process pool for CPU-bound audio decoding and feature extraction
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# This module is imported by the worker processes, so it must not pull in
+# TensorFlow (directly or through model_server); the model stays in the parent
+from audio_decode import load_audio_bytes
+from audio_features import get_extractor, prepare_waveform
+from vad import VoiceActivityDetector
+
+# Per-process voice activity detector, built from the pool's settings
+_detector = None
+
+def _init_worker(params):
+    """Build the feature extractor (and voice activity detector) once per worker process"""
+    global _detector
+    get_extractor(sr=params['sr'], n_fft=params['n_fft'],
+                  hop_length=params['hop_length'], n_mfcc=params['n_mfcc'])
+    if params['vad'] is not None and _detector is None:
+        _detector = VoiceActivityDetector(**params['vad'])
+
+def _featurize(data, params):
+    """Worker: decode audio bytes and leave the MFCC tensor in shared memory
+
+    Returns None instead when the voice activity gate finds no speech.
+    """
+    y = load_audio_bytes(data, params['sr'], quality=params['resample_quality'])
+    y = prepare_waveform(y, params['trim_top_db'], sr=params['sr'], duration=params['duration'])
+    if _detector is not None and not _detector.is_speech(y[np.newaxis])[0]:
+        return None
+    mfccs = get_extractor(
+        sr=params['sr'],
+        n_fft=params['n_fft'],
+        hop_length=params['hop_length'],
+        n_mfcc=params['n_mfcc']
+    ).mfcc(y[np.newaxis]).transpose(0, 2, 1)
+
+    shm = shared_memory.SharedMemory(create=True, size=mfccs.nbytes)
+    try:
+        np.ndarray(mfccs.shape, dtype=mfccs.dtype, buffer=shm.buf)[...] = mfccs
+        # The parent unlinks the block once it has read it; stop this process's
+        # resource tracker from treating it as leaked
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm.name, mfccs.shape, mfccs.dtype.str
+    finally:
+        shm.close()
+
+def _collect(name, shape, dtype):
+    """Parent: copy a feature tensor out of shared memory and free the block"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+class FeatureWorkerPool:
+    """Run decode -> trim -> MFCC in separate processes
+
+    Audio bytes are sent to a worker, which returns the name of a shared memory
+    block holding the (1, time, n_mfcc) feature tensor rather than a pickled
+    array. Workers are started with 'spawn'/'forkserver' so they never inherit
+    the parent's TensorFlow runtime or threads, and the pool is created lazily
+    so that each pre-forked server process gets its own.
+    """
+    def __init__(self, processes, sr, duration, trim_top_db, n_mfcc, n_fft, hop_length, vad=None,
+                 resample_quality='hq'):
+        self.processes = processes
+        self.params = {
+            'sr': sr,
+            'duration': duration,
+            'trim_top_db': trim_top_db,
+            'n_mfcc': n_mfcc,
+            'n_fft': n_fft,
+            'hop_length': hop_length,
+            # VoiceActivityDetector.settings(), or None to featurize everything
+            'vad': vad,
+            'resample_quality': resample_quality,
+        }
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context(method),
+                    initializer=_init_worker,
+                    initargs=(self.params,)
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def start(self):
+        """Spawn the worker processes now instead of on the first request"""
+        executor = self._get_executor()
+        futures = [executor.submit(_init_worker, self.params) for _ in range(self.processes)]
+        for future in futures:
+            future.result()
+
+    def submit(self, data):
+        """Queue audio bytes for featurization; returns a Future of the features (None without speech)"""
+        result = Future()
+        worker_future = self._get_executor().submit(_featurize, data, self.params)
+
+        def done(f):
+            try:
+                collected = f.result()
+                result.set_result(None if collected is None else _collect(*collected))
+            except Exception as e:
+                result.set_exception(e)
+
+        worker_future.add_done_callback(done)
+        return result
+
+    def extract(self, data):
+        """Blocking helper: featurize audio bytes in a worker process"""
+        return self.submit(data).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=True)
+            self._executor = None
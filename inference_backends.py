@@ -0,0 +1,137 @@
+# inference_backends.py
+# Interchangeable runtimes for the emotion CNN: Keras, TFLite and ONNX Runtime
+
+import os
+import threading
+
+import numpy as np
+
+from compiled_inference import BATCH_BUCKETS, CompiledModel, configure_threads
+
+class KerasBackend:
+    """Full TensorFlow/Keras model loaded from the .h5 file
+
+    By default forward passes go through a CompiledModel (one traced graph per
+    batch-size bucket); compiled=False uses model.predict instead.
+    """
+    name = 'keras'
+
+    def __init__(self, model_path, num_threads=None, inter_op_threads=None,
+                 compiled=True, buckets=BATCH_BUCKETS):
+        import tensorflow as tf
+        # Thread pools can only be sized before TensorFlow's first operation
+        if num_threads or inter_op_threads:
+            configure_threads(num_threads, inter_op_threads)
+        self.model_path = model_path
+        self.model = tf.keras.models.load_model(model_path)
+        self.compiled = CompiledModel(self.model, buckets) if compiled else None
+
+    @property
+    def input_shape(self):
+        return tuple(self.model.input_shape[1:])
+
+    def warm_up(self, max_rows=None):
+        """Trace the graphs for batches of up to max_rows"""
+        if self.compiled is not None:
+            self.compiled.warm_up(max_rows)
+        else:
+            self.predict(np.zeros((1,) + self.input_shape, dtype=np.float32))
+
+    def predict(self, features):
+        if self.compiled is not None:
+            return self.compiled.predict(features)
+        return self.model.predict(features, verbose=0)
+
+class TFLiteBackend:
+    """TFLite interpreter; uses the standalone tflite_runtime wheel when installed"""
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self.model_path = model_path
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # The interpreter is stateful and not thread-safe
+        self._lock = threading.Lock()
+
+    @property
+    def input_shape(self):
+        return tuple(int(d) for d in self._input['shape'][1:])
+
+    def warm_up(self, max_rows=None):
+        """Allocate the tensors for a batch of max_rows"""
+        self.predict(np.zeros((max_rows or 1,) + self.input_shape, dtype=self._input['dtype']))
+
+    def predict(self, features):
+        features = np.ascontiguousarray(features, dtype=self._input['dtype'])
+        with self._lock:
+            # Resizing reallocates tensors, so only do it when the batch size changes
+            if len(features) != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input['index'], features.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(features)
+            self.interpreter.set_tensor(self._input['index'], features)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output['index']).copy()
+
+class ONNXBackend:
+    """ONNX Runtime session on the CPU execution provider"""
+    name = 'onnx'
+
+    def __init__(self, model_path, num_threads=None, inter_op_threads=None):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+        self.model_path = model_path
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=['CPUExecutionProvider'])
+        self._input = self.session.get_inputs()[0]
+
+    @property
+    def input_shape(self):
+        return tuple(self._input.shape[1:])
+
+    def warm_up(self, max_rows=None):
+        self.predict(np.zeros((max_rows or 1,) + tuple(self.input_shape), dtype=np.float32))
+
+    def predict(self, features):
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        return self.session.run(None, {self._input.name: features})[0]
+
+BACKENDS = {
+    'keras': (KerasBackend, '.h5'),
+    'tflite': (TFLiteBackend, '.tflite'),
+    'onnx': (ONNXBackend, '.onnx'),
+}
+
+def exported_model_path(model_path, backend, quantization=None):
+    """Conventional path of an exported model next to its .h5 source
+
+    e.g. emotion_model_X.h5 -> emotion_model_X.float16.tflite
+    """
+    base = os.path.splitext(model_path)[0]
+    extension = BACKENDS[backend][1]
+    if quantization and quantization != 'none':
+        return f"{base}.{quantization}{extension}"
+    return base + extension
+
+def load_backend(backend, model_path, **kwargs):
+    """Instantiate the named backend for model_path
+
+    Every backend takes num_threads (intra-op threads); Keras and ONNX also
+    take inter_op_threads, and Keras takes compiled and buckets.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend} (choose from {', '.join(BACKENDS)})")
+    cls = BACKENDS[backend][0]
+    return cls(model_path, **kwargs)
@@ -0,0 +1,185 @@
+# inference_batcher.py
+# Dynamic micro-batching of model inference across concurrent requests
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from admission import DeadlineExceeded, check_deadline
+
+class _PendingItem:
+    """Feature rows waiting for a batched forward pass"""
+    __slots__ = ('features', 'future', 'enqueued_at', 'deadline')
+
+    def __init__(self, features, deadline=None):
+        self.features = features
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.deadline = deadline
+
+class InferenceBatcher:
+    """Collect feature tensors from in-flight requests and run them as one batch
+
+    Requests call submit() with an array of shape (n, ...) and get back a Future
+    that resolves to the n prediction rows for that request. A background thread
+    waits until either max_batch_size rows are queued or the oldest item has
+    waited max_wait_ms, then runs a single predict_fn call over the stacked rows
+    and fans the results back out.
+
+    Items may carry a monotonic deadline: one that has passed by the time its
+    batch is formed fails with DeadlineExceeded instead of taking up rows of
+    the forward pass.
+    """
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._pending_rows = 0
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+        # Metrics
+        self.batch_size_histogram = {}
+        self.batches_run = 0
+        self.rows_processed = 0
+        self.max_queue_depth = 0
+        self.expired = 0
+
+    def submit(self, features, deadline=None):
+        """Queue feature rows and return a Future resolving to their predictions"""
+        check_deadline(deadline)
+        features = np.asarray(features)
+        item = _PendingItem(features, deadline)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Inference batcher is closed")
+            self._ensure_worker()
+            self._pending.append(item)
+            self._pending_rows += len(features)
+            self.max_queue_depth = max(self.max_queue_depth, self._pending_rows)
+            self._cond.notify()
+        return item.future
+
+    def predict(self, features, timeout=None, deadline=None):
+        """Blocking helper: submit features and wait for their predictions"""
+        return self.submit(features, deadline).result(timeout)
+
+    def stats(self):
+        """Return a snapshot of queue depth and batch size metrics"""
+        with self._cond:
+            return {
+                'queue_depth': self._pending_rows,
+                'max_queue_depth': self.max_queue_depth,
+                'batches_run': self.batches_run,
+                'rows_processed': self.rows_processed,
+                'expired': self.expired,
+                'mean_batch_size': (self.rows_processed / self.batches_run) if self.batches_run else 0.0,
+                'batch_size_histogram': dict(sorted(self.batch_size_histogram.items())),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+            }
+
+    def close(self):
+        """Stop the worker thread once the queue has drained"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _ensure_worker(self):
+        """Start the worker thread, restarting it in forked child processes"""
+        # Threads do not survive fork(), so a pre-forked worker needs its own
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        """Wait for a full batch or the oldest item's deadline, then dequeue it"""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+
+            # Give concurrent requests a chance to join the batch
+            deadline = self._pending[0].enqueued_at + self.max_wait
+            while self._pending_rows < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            # Take whole items up to max_batch_size rows; rows of one item are never split
+            batch = [self._pending.popleft()]
+            rows = len(batch[0].features)
+            shape = batch[0].features.shape[1:]
+            skipped = []
+            while self._pending and rows < self.max_batch_size:
+                item = self._pending[0]
+                if rows + len(item.features) > self.max_batch_size:
+                    break
+                self._pending.popleft()
+                if item.features.shape[1:] != shape:
+                    # Different input shape: leave it for a later batch
+                    skipped.append(item)
+                    continue
+                batch.append(item)
+                rows += len(item.features)
+            self._pending.extendleft(reversed(skipped))
+            self._pending_rows -= rows
+            return batch
+
+    def _run(self):
+        """Worker loop: run batched forward passes and resolve futures"""
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            # Drop requests whose callers already gave up
+            batch = [item for item in batch if item.future.set_running_or_notify_cancel()]
+            # ...and those whose deadline passed while they were queued
+            now = time.monotonic()
+            expired = [item for item in batch if item.deadline is not None and now >= item.deadline]
+            if expired:
+                batch = [item for item in batch if item.deadline is None or now < item.deadline]
+                with self._cond:
+                    self.expired += len(expired)
+                for item in expired:
+                    item.future.set_exception(DeadlineExceeded('Request deadline exceeded before inference'))
+            if not batch:
+                continue
+
+            try:
+                if len(batch) == 1:
+                    stacked = batch[0].features
+                else:
+                    stacked = np.concatenate([item.features for item in batch], axis=0)
+                predictions = np.asarray(self.predict_fn(stacked))
+            except Exception as e:
+                for item in batch:
+                    item.future.set_exception(e)
+                continue
+
+            size = len(stacked)
+            with self._cond:
+                self.batches_run += 1
+                self.rows_processed += size
+                self.batch_size_histogram[size] = self.batch_size_histogram.get(size, 0) + 1
+
+            # Fan the per-row results back to each waiting request
+            offset = 0
+            for item in batch:
+                n = len(item.features)
+                item.future.set_result(predictions[offset:offset + n])
+                offset += n
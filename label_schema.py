@@ -0,0 +1,114 @@
+# label_schema.py
+# Class index -> emotion / sentiment lookup tables shared by the server and scripts
+
+import numpy as np
+
+# Sentiment of each emotion; labels are "<speaker>_<emotion>", e.g. "female_happy"
+EMOTION_SENTIMENTS = {
+    'happy': 'positive',
+    'surprise': 'positive',
+    'sad': 'negative',
+    'angry': 'negative',
+    'fear': 'negative',
+    'disgust': 'negative',
+    'neutral': 'neutral',
+}
+SENTIMENTS = ('positive', 'negative', 'neutral', 'unknown')
+
+# Emotion reported for audio the voice activity gate found no speech in
+NO_SPEECH = 'no_speech'
+
+def sentiment_for(label):
+    """Map an emotion label to a sentiment category"""
+    return EMOTION_SENTIMENTS.get(str(label).rpartition('_')[2], 'unknown')
+
+class LabelSchema:
+    """Lookup tables for one model's classes, built once when the model loads
+
+    Turning a row of class probabilities into a response then needs no label
+    encoder calls or string matching: names come from tuples indexed by the
+    argmax, and per-sentiment probabilities are one matrix product (each class
+    contributes its probability to its sentiment's column).
+    """
+    def __init__(self, classes):
+        self.classes = tuple(str(name) for name in classes)
+        self.sentiments = tuple(sentiment_for(name) for name in self.classes)
+        # Only the sentiments this model can produce, in SENTIMENTS order
+        self.sentiment_names = tuple(name for name in SENTIMENTS if name in self.sentiments)
+        self.sentiment_matrix = np.zeros((len(self.classes), len(self.sentiment_names)), dtype=np.float32)
+        for index, sentiment in enumerate(self.sentiments):
+            self.sentiment_matrix[index, self.sentiment_names.index(sentiment)] = 1.0
+
+    @classmethod
+    def from_encoder(cls, label_encoder):
+        return cls(label_encoder.classes_)
+
+    def __len__(self):
+        return len(self.classes)
+
+    def emotion(self, index):
+        return self.classes[index]
+
+    def sentiment(self, index):
+        return self.sentiments[index]
+
+    def sentiment_scores(self, scores):
+        """Sum class probabilities per sentiment: (..., n_classes) -> (..., n_sentiments)"""
+        return np.asarray(scores, dtype=np.float32) @ self.sentiment_matrix
+
+    def top_k(self, scores, k):
+        """Indices of the k most probable classes of each row, most probable first"""
+        scores = np.asarray(scores)
+        k = min(k, scores.shape[-1])
+        indices = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+        order = np.argsort(-np.take_along_axis(scores, indices, axis=-1), axis=-1, kind='stable')
+        return np.take_along_axis(indices, order, axis=-1)
+
+    def format(self, scores, top_k=None):
+        """Convert one row of class probabilities into the API response"""
+        return self.format_batch(np.asarray(scores)[np.newaxis], top_k)[0]
+
+    def format_batch(self, scores, top_k=None):
+        """Convert a (batch, n_classes) array of probabilities into one response per row"""
+        scores = np.asarray(scores, dtype=np.float32)
+        indices = scores.argmax(axis=1).tolist()
+        confidences = scores.max(axis=1).tolist()
+        rows = scores.tolist()
+        sentiment_rows = self.sentiment_scores(scores).tolist()
+        top_rows = self.top_k(scores, top_k).tolist() if top_k else None
+        results = []
+        for i, (index, row) in enumerate(zip(indices, rows)):
+            result = {
+                'emotion': self.classes[index],
+                'sentiment': self.sentiments[index],
+                'confidence': confidences[i],
+                'emotion_scores': dict(zip(self.classes, row)),
+                'sentiment_scores': dict(zip(self.sentiment_names, sentiment_rows[i])),
+            }
+            if top_rows is not None:
+                result['top_k'] = [
+                    {'emotion': self.classes[j], 'sentiment': self.sentiments[j], 'score': row[j]}
+                    for j in top_rows[i]
+                ]
+            results.append(result)
+        return results
+
+    def no_speech(self, top_k=None):
+        """The response for audio without speech, which never reaches the model"""
+        result = {
+            'emotion': NO_SPEECH,
+            'sentiment': 'unknown',
+            'confidence': 0.0,
+            'emotion_scores': {},
+            'sentiment_scores': {},
+        }
+        if top_k:
+            result['top_k'] = []
+        return result
+
+    def labels(self, scores):
+        """(emotion, sentiment, confidence) for each row of a (batch, n_classes) array"""
+        scores = np.asarray(scores)
+        indices = scores.argmax(axis=1).tolist()
+        confidences = scores.max(axis=1).tolist()
+        return [(self.classes[i], self.sentiments[i], c) for i, c in zip(indices, confidences)]
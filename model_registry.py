@@ -0,0 +1,554 @@
+# model_registry.py
+# Discover model versions on disk and hot-swap them in a running server
+
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from label_schema import LabelSchema
+
+try:
+    import fcntl
+except ImportError:  # Windows: waitress serves from a single process
+    fcntl = None
+
+# emotion_model_<version>.h5 pairs with label_encoder_<version>.pkl (or a shared label_encoder.pkl)
+MODEL_FILE_PATTERN = re.compile(r'^emotion_model_(?P<version>.+)\.h5$')
+SHARED_ENCODER = 'label_encoder.pkl'
+
+def scan_models(directory):
+    """Map version -> (model path, label encoder path) for every complete pair in directory"""
+    if not os.path.isdir(directory):
+        return {}
+    names = set(os.listdir(directory))
+    models = {}
+    for name in names:
+        match = MODEL_FILE_PATTERN.match(name)
+        if match is None:
+            continue
+        version = match.group('version')
+        encoder = f'label_encoder_{version}.pkl'
+        if encoder not in names:
+            encoder = SHARED_ENCODER if SHARED_ENCODER in names else None
+        if encoder is not None:
+            models[version] = (os.path.join(directory, name), os.path.join(directory, encoder))
+    return models
+
+def latest_model(directory):
+    """(version, model path, encoder path) of the newest pair in directory, or None
+
+    Versions are the training timestamps (YYYYMMDD_HHMMSS), so the newest is
+    the largest version string.
+    """
+    models = scan_models(directory)
+    if not models:
+        return None
+    version = max(models)
+    return (version,) + models[version]
+
+def read_routing(path):
+    """The routing file as {'default', 'split', 'standby'}, or None when it is missing or malformed"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        default = data.get('default')
+        split = {str(version): float(weight) for version, weight in (data.get('split') or {}).items()}
+        standby = sorted(str(version) for version in data.get('standby') or [])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        print(f"Ignoring routing file {path}: {e}")
+        return None
+    if default is not None and not isinstance(default, str):
+        print(f"Ignoring routing file {path}: default must be a version string")
+        return None
+    return {'default': default, 'split': split, 'standby': standby}
+
+def write_routing(path, routing):
+    """Replace the routing file in one rename, so readers never see a partial write"""
+    fd, temp_path = tempfile.mkstemp(prefix='.routing-', suffix='.json', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(routing, f, indent=2, sort_keys=True)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+class UnknownVersion(KeyError):
+    """A request named a model version that is not loaded"""
+
+class ModelVersion:
+    """One loaded model version and the inference batchers that serve it
+
+    Requests lease the version for as long as they use it. A version that is
+    no longer routed to is retired: it stops receiving new requests and its
+    batchers are closed when the last lease is released, so in-flight
+    requests finish on the model they started with.
+    """
+    def __init__(self, version, model_path, encoder_path, model, label_encoder, batchers=None, digest=None):
+        self.version = version
+        self.model_path = model_path
+        # Content hash of the model file, when known
+        self.digest = digest
+        self.encoder_path = encoder_path
+        self.model = model
+        self.label_encoder = label_encoder
+        # Index -> emotion / sentiment tables, built once per version
+        self.labels = LabelSchema.from_encoder(label_encoder)
+        self.batchers = batchers or {}
+        self.loaded_at = time.time()
+        self.load_seconds = None
+        self.warm_up_seconds = None
+        self._lock = threading.Lock()
+        self._leases = 0
+        self._retired = False
+        self.closed = False
+
+    @property
+    def cache_key(self):
+        """Identifies the results of this version: its name plus the model file's digest"""
+        if self.digest is None:
+            return self.version
+        return f"{self.version}@{self.digest[:16]}"
+
+    @property
+    def leases(self):
+        return self._leases
+
+    def acquire(self):
+        with self._lock:
+            self._leases += 1
+
+    def release(self):
+        with self._lock:
+            self._leases -= 1
+            close = self._retired and self._leases == 0
+        if close:
+            self.close()
+
+    def retire(self):
+        """Stop routing to this version and close it once it is idle"""
+        with self._lock:
+            self._retired = True
+            close = self._leases == 0
+        if close:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for batcher in self.batchers.values():
+            batcher.close()
+        print(f"Model version {self.version} unloaded")
+
+    def status(self):
+        return {
+            'model_path': self.model_path,
+            'digest': self.digest,
+            'encoder_path': self.encoder_path,
+            'loaded_at': self.loaded_at,
+            'load_seconds': self.load_seconds,
+            'warm_up_seconds': self.warm_up_seconds,
+            'in_flight': self._leases,
+            'batchers': {name: batcher.stats() for name, batcher in self.batchers.items()},
+        }
+
+class ModelRegistry:
+    """Loaded model versions, the default version and an optional traffic split
+
+    load_fn(version, model_path, encoder_path) returns a ModelVersion and
+    warm_fn(model_version) exercises it; both run before a version can receive
+    traffic, on a background thread when loading with load_async() or poll().
+    Routing changes (activate, set_split) swap plain references under a lock,
+    so requests never wait for a load.
+
+    With a routing_path, routing changes go through a JSON file that every
+    process serving from the directory follows (one registry per gunicorn
+    worker): publish() rewrites it, and each registry applies a changed file
+    from a background thread, checked at most once a second by acquire() and
+    on every poll().
+    """
+    def __init__(self, directory, load_fn, warm_fn=None, auto_activate=True, settle_seconds=5.0, routing_path=None):
+        self.directory = directory
+        self.load_fn = load_fn
+        self.warm_fn = warm_fn
+        self.auto_activate = auto_activate
+        self.settle_seconds = settle_seconds
+        self.routing_path = routing_path
+
+        self._lock = threading.Lock()
+        self._loaded = {}
+        self._default = None
+        self._split = {}
+        self._draining = []
+        self._loading = set()
+        self._failed = {}           # version -> model file mtime of the failed attempt
+        # Versions already on disk at startup are loaded explicitly, not by poll()
+        self._newest_seen = max(scan_models(directory), default=None)
+        self._watcher = None
+
+        self._publish_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._routing = None        # last routing published or read from the file
+        self._routing_applied = False
+        self._routing_mtime = None
+        self._routing_checked = 0.0
+
+    @property
+    def default(self):
+        """The ModelVersion that receives traffic not covered by the split"""
+        return self._default
+
+    def versions(self):
+        """Loaded ModelVersions by version"""
+        with self._lock:
+            return dict(self._loaded)
+
+    def load(self, version, activate=False):
+        """Load and warm up a version from the model directory (blocking)"""
+        models = scan_models(self.directory)
+        if version not in models:
+            raise UnknownVersion(f"No model/encoder pair for version {version} in {self.directory}")
+        with self._lock:
+            if version in self._loaded:
+                model_version = self._loaded[version]
+                if activate:
+                    self._activate_locked(model_version)
+                return model_version
+            if version in self._loading:
+                raise RuntimeError(f"Model version {version} is already being loaded")
+            self._loading.add(version)
+
+        model_path, encoder_path = models[version]
+        try:
+            start = time.perf_counter()
+            model_version = self.load_fn(version, model_path, encoder_path)
+            model_version.load_seconds = time.perf_counter() - start
+            if self.warm_fn is not None:
+                start = time.perf_counter()
+                self.warm_fn(model_version)
+                model_version.warm_up_seconds = time.perf_counter() - start
+        except Exception:
+            with self._lock:
+                self._loading.discard(version)
+                self._failed[version] = os.path.getmtime(model_path)
+            raise
+
+        with self._lock:
+            self._loading.discard(version)
+            self._failed.pop(version, None)
+            self._loaded[version] = model_version
+            if self._newest_seen is None or version > self._newest_seen:
+                self._newest_seen = version
+            if activate or self._default is None:
+                self._activate_locked(model_version)
+        print(f"Model version {version} loaded in {model_version.load_seconds:.2f}s"
+              + (f" (warm-up {model_version.warm_up_seconds:.2f}s)" if model_version.warm_up_seconds is not None else ""))
+        return model_version
+
+    def load_async(self, version, activate=False):
+        """Load a version on a background thread; returns the thread"""
+        def run():
+            try:
+                self.load(version, activate)
+            except Exception as e:
+                print(f"Error loading model version {version}: {e}")
+        thread = threading.Thread(target=run, name=f'load-model-{version}', daemon=True)
+        thread.start()
+        return thread
+
+    def activate(self, version):
+        """Make a version the default; the previous one drains and unloads
+
+        A version that is not loaded yet is loaded first, on a background
+        thread; the current default keeps serving until then.
+        """
+        self._check_known([version])
+        self.publish(default=version)
+
+    def _activate_locked(self, model_version):
+        previous = self._default
+        self._default = model_version
+        if previous is not None and previous is not model_version:
+            print(f"Model version {model_version.version} active (was {previous.version})")
+            self._retire_unrouted_locked([previous.version])
+
+    def set_split(self, weights):
+        """Route traffic by weight, e.g. {'20250421_143944': 90, '20250601_120000': 10}
+
+        Weights are relative; versions that are not loaded yet are loaded
+        first and the new split applies once all of them are. An empty mapping
+        sends all traffic to the default version again.
+        """
+        weights = {version: float(weight) for version, weight in weights.items() if float(weight) > 0}
+        self._check_known(weights)
+        self.publish(split=weights)
+
+    def _check_known(self, versions):
+        available = scan_models(self.directory)
+        with self._lock:
+            missing = [version for version in versions if version not in self._loaded and version not in available]
+        if missing:
+            raise UnknownVersion(f"No model/encoder pair for versions {', '.join(map(str, missing))} in {self.directory}")
+
+    def publish(self, default=None, split=None, standby=()):
+        """Change the default and/or the split, and keep the standby versions loaded
+
+        With a routing_path the change is written to the routing file for
+        every process to follow. This process applies it right away, or on a
+        background thread when it has versions to load first. Returns the new
+        routing.
+        """
+        with self._publish_lock, self._routing_file_lock():
+            routing = None
+            if self.routing_path is not None:
+                routing = read_routing(self.routing_path)
+            if routing is None:
+                routing = self._current_routing()
+            if default is not None:
+                routing['default'] = default
+            if split is not None:
+                routing['split'] = dict(split)
+            # Standby versions stay loaded until they are routed to; once a
+            # routed version is replaced it unloads everywhere
+            routed = {routing['default'], *routing['split']}
+            routing['standby'] = sorted(version for version in set(routing['standby']) | set(standby)
+                                        if version not in routed)
+            if self.routing_path is not None:
+                write_routing(self.routing_path, routing)
+        with self._lock:
+            pending = [version for version in self._wanted(routing) if version not in self._loaded]
+        if pending:
+            threading.Thread(target=self.apply, args=(routing,), name='model-routing', daemon=True).start()
+        else:
+            self.apply(routing)
+        return routing
+
+    @contextmanager
+    def _routing_file_lock(self):
+        """Serialize read-modify-write of the routing file across processes"""
+        if self.routing_path is None or fcntl is None:
+            yield
+            return
+        with open(self.routing_path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _current_routing(self):
+        if self._routing is not None:
+            return {'default': self._routing['default'], 'split': dict(self._routing['split']),
+                    'standby': list(self._routing['standby'])}
+        with self._lock:
+            return {
+                'default': self._default.version if self._default is not None else None,
+                'split': dict(self._split),
+                'standby': [],
+            }
+
+    @staticmethod
+    def _wanted(routing):
+        versions = [routing['default']] + sorted(routing['split']) + routing['standby']
+        return list(dict.fromkeys(version for version in versions if version is not None))
+
+    def sync(self):
+        """Apply the routing file if it changed since this process last applied it (blocking)"""
+        if self.routing_path is None:
+            return
+        try:
+            mtime = os.path.getmtime(self.routing_path)
+        except OSError:
+            return
+        routing = read_routing(self.routing_path)
+        if routing is not None:
+            self.apply(routing)
+        self._routing_mtime = mtime
+
+    def _check_routing(self):
+        """Start a background sync() when the routing file changed; stats it at most once a second"""
+        now = time.monotonic()
+        if self.routing_path is None or now - self._routing_checked < 1.0:
+            return
+        self._routing_checked = now
+        try:
+            mtime = os.path.getmtime(self.routing_path)
+        except OSError:
+            return
+        if mtime != self._routing_mtime and not self._sync_lock.locked():
+            threading.Thread(target=self.sync, name='model-routing', daemon=True).start()
+
+    def apply(self, routing):
+        """Load what a routing needs, then switch the default and the split in one step
+
+        Applies to this process only; publish() is the shared form. A routing
+        whose versions could not all be loaded is retried on the next sync();
+        meanwhile the loaded part of it applies.
+        """
+        with self._sync_lock:
+            if routing == self._routing and self._routing_applied:
+                return
+            complete = True
+            for version in self._wanted(routing):
+                with self._lock:
+                    if version in self._loaded:
+                        continue
+                try:
+                    self.load(version)
+                except Exception as e:
+                    complete = False
+                    print(f"Error loading model version {version}: {e}")
+            with self._lock:
+                previous = list(self._split)
+                if self._default is not None:
+                    previous.append(self._default.version)
+                default = self._loaded.get(routing['default'])
+                if default is not None and default is not self._default:
+                    if self._default is not None:
+                        print(f"Model version {default.version} active (was {self._default.version})")
+                    self._default = default
+                self._split = {version: weight for version, weight in routing['split'].items() if version in self._loaded}
+                self._retire_unrouted_locked(previous)
+            self._routing = routing
+            self._routing_applied = complete
+
+    def _retire_unrouted_locked(self, candidates):
+        """Retire the candidate versions that are now neither the default nor in the split
+
+        Versions that were loaded but never routed to stay loaded, ready to be
+        activated or added to the split.
+        """
+        for version in candidates:
+            model_version = self._loaded.get(version)
+            if model_version is None or model_version is self._default or version in self._split:
+                continue
+            del self._loaded[version]
+            self._draining.append(model_version)
+            model_version.retire()
+        self._draining = [model_version for model_version in self._draining if not model_version.closed]
+
+    def _select_locked(self, requested=None, key=None):
+        if requested is not None:
+            if requested not in self._loaded:
+                raise UnknownVersion(f"Model version {requested} is not loaded")
+            return self._loaded[requested]
+        if not self._split:
+            return self._default
+        total = sum(self._split.values())
+        if key is not None:
+            # The same client key always lands in the same bucket
+            point = zlib.crc32(key.encode('utf-8')) / 2**32 * total
+        else:
+            point = random.random() * total
+        for version, weight in sorted(self._split.items()):
+            point -= weight
+            if point < 0:
+                return self._loaded[version]
+        return self._loaded[max(self._split)]
+
+    def acquire(self, requested=None, key=None):
+        """Pick a version for one request (explicit, split or default) and lease it
+
+        The caller must call release() on the returned ModelVersion.
+        """
+        self._check_routing()
+        with self._lock:
+            if self._default is None:
+                raise RuntimeError("No model version loaded")
+            model_version = self._select_locked(requested, key)
+            model_version.acquire()
+        return model_version
+
+    @contextmanager
+    def lease(self, requested=None, key=None):
+        """Context manager form of acquire()"""
+        model_version = self.acquire(requested, key)
+        try:
+            yield model_version
+        finally:
+            model_version.release()
+
+    def poll(self):
+        """Load (and with auto_activate, switch to) versions newer than any seen so far
+
+        Files modified in the last settle_seconds are skipped, so a model that
+        is still being copied into the directory is picked up on a later poll.
+        A version that failed to load is retried only after its file changes.
+        With a routing file, an auto-activated version is published there so
+        every process switches to it, and a changed routing file is applied.
+        """
+        self.sync()
+        now = time.time()
+        for version, (model_path, encoder_path) in sorted(scan_models(self.directory).items()):
+            with self._lock:
+                if (version in self._loaded or version in self._loading
+                        or (self._newest_seen is not None and version <= self._newest_seen)):
+                    continue
+            try:
+                mtime = max(os.path.getmtime(model_path), os.path.getmtime(encoder_path))
+            except OSError:
+                continue
+            if now - mtime < self.settle_seconds or self._failed.get(version) == os.path.getmtime(model_path):
+                continue
+            try:
+                if self.routing_path is not None and self.auto_activate:
+                    self.load(version)
+                    self.publish(default=version)
+                else:
+                    self.load(version, activate=self.auto_activate)
+            except Exception as e:
+                print(f"Error loading model version {version}: {e}")
+
+    def watch(self, interval):
+        """Call poll() every interval seconds on a daemon thread"""
+        if self._watcher is not None or interval <= 0:
+            return
+        def run():
+            while True:
+                time.sleep(interval)
+                self.poll()
+        self._watcher = threading.Thread(target=run, name='model-watcher', daemon=True)
+        self._watcher.start()
+
+    def status(self):
+        """Routing and per-version state for /models"""
+        self._check_routing()
+        available = sorted(scan_models(self.directory))
+        with self._lock:
+            loaded = dict(self._loaded)
+            draining = [model_version for model_version in self._draining if not model_version.closed]
+            return {
+                'directory': self.directory,
+                'default': self._default.version if self._default is not None else None,
+                'split': dict(self._split),
+                'loading': sorted(self._loading),
+                'available': available,
+                'loaded': {version: model_version.status() for version, model_version in sorted(loaded.items())},
+                'draining': {model_version.version: model_version.leases for model_version in draining},
+                'auto_activate': self.auto_activate,
+                'routing_file': self.routing_path,
+                'standby': list(self._routing['standby']) if self._routing is not None else [],
+                'pid': os.getpid(),
+            }
+
+    def close(self):
+        """Close every loaded and draining version"""
+        with self._lock:
+            versions = list(self._loaded.values()) + self._draining
+            self._loaded = {}
+            self._draining = []
+            self._default = None
+        for model_version in versions:
+            model_version.close()
@@ -1,19 +1,106 @@
 import os
+import io
+import json
+import time
+import datetime
 import numpy as np
-import tensorflow as tf
-import librosa
 import pickle
-import tempfile
-import requests
-from flask import Flask, request, jsonify
+import threading
+import functools
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from flask import Flask, Response, g, has_request_context, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+from admission import PRIORITIES, AdmissionController, DeadlineExceeded, Rejected, check_deadline, deadline_after
+from audio_decode import iter_audio_blocks, iter_stream_blocks, load_audio_bytes, soxr_quality
+from audio_download import AudioDownloader, DownloadError
+from audio_features import get_extractor, prepare_waveform
+from compiled_inference import BATCH_BUCKETS, parse_buckets
+from feature_store import file_digest
+from feature_workers import FeatureWorkerPool
+from inference_backends import exported_model_path, load_backend
+from inference_batcher import InferenceBatcher
+from label_schema import NO_SPEECH
+from metrics import Registry
+from model_registry import ModelRegistry, ModelVersion, UnknownVersion, latest_model, read_routing
+from profiler import SamplingProfiler
+from result_cache import ResultCache, audio_digest, audio_hasher
+from result_log import ResultLog
+from segments import iter_segment_batches, summarize_segments
+from streaming import PCM_ENCODINGS, StreamSession
+from vad import VoiceActivityDetector
+
+# WebSocket support for /stream is optional; the chunked-HTTP form always works
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+# orjson is optional; responses fall back to the standard json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (keeps Flask's key sorting and default conversions)"""
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+def to_json(item):
+    """Serialize one streamed message (NDJSON line or WebSocket frame)"""
+    if orjson is not None:
+        return orjson.dumps(item).decode()
+    return json.dumps(item)
 
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 CORS(app)  # Enable CORS for all routes
 
-# Load the CNN model
-MODEL_PATH = 'mdl/model/emotion_model_20250421_143944.h5'
-LABEL_ENCODER_PATH = 'mdl/model/label_encoder_20250421_143944.pkl'
+# CNN model versions: emotion_model_<version>.h5 + label_encoder_<version>.pkl pairs
+# in MODEL_DIR. MODEL_VERSION pins the version served at startup (default: newest)
+MODEL_DIR = os.environ.get('MODEL_DIR', 'mdl/model')
+MODEL_VERSION = os.environ.get('MODEL_VERSION') or None
+
+# Check MODEL_DIR for new versions every MODEL_WATCH_SECONDS (0 disables); with
+# MODEL_AUTO_ACTIVATE they take over once warmed up (default unless pinned)
+MODEL_WATCH_SECONDS = float(os.environ.get('MODEL_WATCH_SECONDS', 60))
+MODEL_AUTO_ACTIVATE = os.environ.get('MODEL_AUTO_ACTIVATE', '0' if MODEL_VERSION else '1') == '1'
+
+# Initial traffic split for A/B tests, e.g. "20250421_143944=90,20250601_120000=10"
+MODEL_TRAFFIC_SPLIT = os.environ.get('MODEL_TRAFFIC_SPLIT', '')
+
+# Routing (default version, traffic split, versions kept loaded) set through the
+# /models admin endpoints is written here and followed by every worker; empty
+# keeps it per process
+MODEL_ROUTING_FILE = os.environ.get('MODEL_ROUTING_FILE', os.path.join(MODEL_DIR, 'routing.json')) or None
+
+# Token required by the /models admin endpoints; they are disabled when unset
+MODEL_ADMIN_TOKEN = os.environ.get('MODEL_ADMIN_TOKEN') or None
+
+# Inference runtime: keras (the .h5 files), tflite or onnx (exported with
+# Scripts/export_model.py next to each .h5). BACKEND_MODEL_PATH overrides the
+# exported file for the version loaded at startup
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'keras')
+BACKEND_QUANTIZATION = os.environ.get('BACKEND_QUANTIZATION')
+BACKEND_MODEL_PATH = os.environ.get('BACKEND_MODEL_PATH') or None
+
+# Keras forward passes run through one traced graph per batch-size bucket
+# (batches are padded up to the next bucket); COMPILED_INFERENCE=0 uses model.predict
+COMPILED_INFERENCE = os.environ.get('COMPILED_INFERENCE', '1') == '1'
+INFERENCE_BUCKETS = parse_buckets(os.environ.get('INFERENCE_BUCKETS', ','.join(map(str, BATCH_BUCKETS))))
+
+# Runtime thread pools (0 keeps the runtime's default, usually one thread per core)
+INTRA_OP_THREADS = int(os.environ.get('INTRA_OP_THREADS', 0))
+INTER_OP_THREADS = int(os.environ.get('INTER_OP_THREADS', 0))
 
 # Audio parameters
 SAMPLE_RATE = 16000
@@ -21,149 +108,1641 @@ DURATION = 3  # seconds
 N_MFCC = 40
 HOP_LENGTH = 512
 N_FFT = 2048
+TRIM_TOP_DB = 25
+
+# Inference batching parameters
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 16))
+MAX_BATCH_WAIT_MS = float(os.environ.get('MAX_BATCH_WAIT_MS', 5))
+
+# Download limits
+DOWNLOAD_POOL_SIZE = int(os.environ.get('DOWNLOAD_POOL_SIZE', 16))
+DOWNLOAD_CONNECT_TIMEOUT = float(os.environ.get('DOWNLOAD_CONNECT_TIMEOUT', 5))
+DOWNLOAD_TIMEOUT = float(os.environ.get('DOWNLOAD_TIMEOUT', 30))
+MAX_DOWNLOAD_MB = float(os.environ.get('MAX_DOWNLOAD_MB', 50))
+
+# Direct uploads to /analyze: size limit and read size
+MAX_UPLOAD_MB = float(os.environ.get('MAX_UPLOAD_MB', MAX_DOWNLOAD_MB))
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+# Result cache: memory tier size (0 disables caching) and optional disk tier
+RESULT_CACHE_MB = float(os.environ.get('RESULT_CACHE_MB', 64))
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR') or None
+RESULT_CACHE_DISK_MB = float(os.environ.get('RESULT_CACHE_DISK_MB', 1024))
+
+# Result log: every result with speech is appended (per client) to a columnar log
+# under RESULT_LOG_DIR (disabled when unset), written to disk at the latest every
+# RESULT_LOG_FLUSH_SECONDS. RESULT_LOG_TOKEN enables the /results query endpoint
+RESULT_LOG_DIR = os.environ.get('RESULT_LOG_DIR') or None
+RESULT_LOG_FLUSH_SECONDS = float(os.environ.get('RESULT_LOG_FLUSH_SECONDS', 60))
+RESULT_LOG_TOKEN = os.environ.get('RESULT_LOG_TOKEN') or None
+
+# Resampler for audio not already at SAMPLE_RATE: 'hq' matches librosa.load and
+# training, 'fast' is cheaper on CPU at some cost in fidelity
+RESAMPLE_QUALITY = os.environ.get('RESAMPLE_QUALITY', 'hq')
+soxr_quality(RESAMPLE_QUALITY)   # fail at startup on an unknown name
+
+# Worker processes for decoding and feature extraction (0 runs them in-thread)
+FEATURE_WORKERS = int(os.environ.get('FEATURE_WORKERS', 0))
+
+# Segmented (sliding-window) analysis of long recordings
+SEGMENT_HOP_SECONDS = float(os.environ.get('SEGMENT_HOP_SECONDS', 1.5))
+SEGMENT_BATCH_SIZE = int(os.environ.get('SEGMENT_BATCH_SIZE', 32))
+
+# Voice activity gate: windows without speech get a "no_speech" result and skip
+# the model. A window needs VAD_MIN_SPEECH_MS of frames above VAD_ENERGY_DB
+# (dBFS) whose spectrum changes by VAD_MIN_FLUX_DB on average; VAD_ENABLED=0
+# sends everything to the model
+VAD_ENABLED = os.environ.get('VAD_ENABLED', '1') == '1'
+VAD_ENERGY_DB = float(os.environ.get('VAD_ENERGY_DB', -50))
+VAD_MIN_FLUX_DB = float(os.environ.get('VAD_MIN_FLUX_DB', 1.5))
+VAD_MIN_SPEECH_MS = float(os.environ.get('VAD_MIN_SPEECH_MS', 200))
+
+# Batch endpoint parameters. Multipart batches are held in memory, so each file
+# is limited to MAX_UPLOAD_MB and the whole body to MAX_BATCH_UPLOAD_MB
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 8))
+MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', 64))
+MAX_BATCH_UPLOAD_MB = float(os.environ.get('MAX_BATCH_UPLOAD_MB', 200))
+
+# Admission control for /analyze and /analyze/batch: at most ADMISSION_MAX_ACTIVE
+# requests work at once (bulk ones at most ADMISSION_BULK_MAX_ACTIVE); others wait
+# up to ADMISSION_MAX_QUEUE_WAIT seconds in a bounded queue per priority class, and
+# each client (X-Client-Id, else address) may hold ADMISSION_CLIENT_LIMIT slots or
+# queue places (0: no limit). Rejected requests get 429/503 with Retry-After
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') == '1'
+ADMISSION_MAX_ACTIVE = int(os.environ.get('ADMISSION_MAX_ACTIVE', 8))
+ADMISSION_BULK_MAX_ACTIVE = int(os.environ.get('ADMISSION_BULK_MAX_ACTIVE', max(1, ADMISSION_MAX_ACTIVE // 2)))
+ADMISSION_MAX_QUEUED = int(os.environ.get('ADMISSION_MAX_QUEUED', 16))
+ADMISSION_MAX_QUEUED_BULK = int(os.environ.get('ADMISSION_MAX_QUEUED_BULK', 4))
+ADMISSION_MAX_QUEUE_WAIT = float(os.environ.get('ADMISSION_MAX_QUEUE_WAIT', 5))
+ADMISSION_CLIENT_LIMIT = int(os.environ.get('ADMISSION_CLIENT_LIMIT', 4))
+
+# Server-side deadline in seconds of every /analyze and /analyze/batch request,
+# counted from admission; X-Request-Timeout-Ms can only shorten it (0: none).
+# Downloads, queueing and inference past the deadline fail with 504
+REQUEST_TIMEOUT = float(os.environ.get('REQUEST_TIMEOUT', 60))
+BATCH_REQUEST_TIMEOUT = float(os.environ.get('BATCH_REQUEST_TIMEOUT', 300))
+
+# Request threads per server process (serve.py reads the same THREADS). Every
+# admitted or queued request and every open stream holds one; admission control
+# keeps SPARE_THREADS of them free for /health, /ready and /metrics
+SERVER_THREADS = int(os.environ.get('THREADS', 32))
+SPARE_THREADS = 2
+
+# Live streams (/stream): update interval, shared batching, and per-connection limits.
+# A stream holds its request thread until it ends, so at most SERVER_THREADS -
+# STREAM_RESERVED_THREADS streams are open at once, even if MAX_STREAMS is higher;
+# the reserved threads stay free for /analyze and the other short routes
+STREAM_HOP_SECONDS = float(os.environ.get('STREAM_HOP_SECONDS', 1.0))
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 64))
+STREAM_BATCH_WAIT_MS = float(os.environ.get('STREAM_BATCH_WAIT_MS', 20))
+MAX_STREAMS = int(os.environ.get('MAX_STREAMS', 256))
+STREAM_RESERVED_THREADS = int(os.environ.get('STREAM_RESERVED_THREADS', 16))
+STREAM_CAPACITY = max(0, min(MAX_STREAMS, SERVER_THREADS - STREAM_RESERVED_THREADS))
+STREAM_MAX_PENDING = int(os.environ.get('STREAM_MAX_PENDING', 4))
+STREAM_MAX_BACKLOG_KB = float(os.environ.get('STREAM_MAX_BACKLOG_KB', 512))
+STREAM_IDLE_TIMEOUT = float(os.environ.get('STREAM_IDLE_TIMEOUT', 30))
+STREAM_READ_BYTES = 4096
+
+# Token required by /debug/profile; the endpoint is disabled when unset
+PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN') or None
+MAX_PROFILE_SECONDS = 60
+
+# Loaded model versions (each an inference backend, label encoder and batchers)
+registry = None
+
+# Set once startup() has loaded and warmed up the model; drives the readiness probe
+model_ready = threading.Event()
+startup_lock = threading.Lock()
+startup_timings = {}
+
+# Shared keep-alive connection pool for audio downloads
+downloader = AudioDownloader(
+    pool_size=DOWNLOAD_POOL_SIZE,
+    connect_timeout=DOWNLOAD_CONNECT_TIMEOUT,
+    read_timeout=DOWNLOAD_TIMEOUT,
+    total_timeout=DOWNLOAD_TIMEOUT,
+    max_bytes=int(MAX_DOWNLOAD_MB * 1024 * 1024)
+)
 
-# Global variables for model and label encoder
-model = None
-label_encoder = None
+# Cache of results keyed by URL + ETag and by audio content hash, within the model
+# version and a digest of the backend file it was loaded from (ModelVersion.cache_key)
+result_cache = None
+if RESULT_CACHE_MB > 0:
+    # Results decoded with another resampler are kept apart; 'hq' keeps the old keys
+    result_cache = ResultCache(
+        INFERENCE_BACKEND if RESAMPLE_QUALITY == 'hq' else f"{INFERENCE_BACKEND}/resample-{RESAMPLE_QUALITY}",
+        max_memory_bytes=int(RESULT_CACHE_MB * 1024 * 1024),
+        disk_dir=RESULT_CACHE_DIR,
+        max_disk_bytes=int(RESULT_CACHE_DISK_MB * 1024 * 1024) if RESULT_CACHE_DISK_MB > 0 else None
+    )
 
-def load_model_and_encoder():
-    """Load the trained model and label encoder"""
-    global model, label_encoder
+# Result logs by label set, opened when a model with those classes first logs a result
+result_logs = {}
+result_logs_lock = threading.Lock()
+
+# Voice activity detector shared by every analysis path (None when disabled)
+voice_detector = None
+if VAD_ENABLED:
+    voice_detector = VoiceActivityDetector(
+        sr=SAMPLE_RATE,
+        energy_db=VAD_ENERGY_DB,
+        min_flux_db=VAD_MIN_FLUX_DB,
+        min_speech_seconds=VAD_MIN_SPEECH_MS / 1000
+    )
+
+# Work slots and priority queues shared by the analysis endpoints (None when disabled)
+admission = None
+if ADMISSION_ENABLED:
+    admission = AdmissionController(
+        max_active=ADMISSION_MAX_ACTIVE,
+        bulk_max_active=ADMISSION_BULK_MAX_ACTIVE,
+        max_queued={'interactive': ADMISSION_MAX_QUEUED, 'bulk': ADMISSION_MAX_QUEUED_BULK},
+        client_limit=ADMISSION_CLIENT_LIMIT,
+        max_queue_wait=ADMISSION_MAX_QUEUE_WAIT,
+        max_threads=SERVER_THREADS - SPARE_THREADS
+    )
+
+# Process pool for CPU-bound decode and feature work; the model stays here
+feature_pool = None
+if FEATURE_WORKERS > 0:
+    feature_pool = FeatureWorkerPool(
+        FEATURE_WORKERS,
+        sr=SAMPLE_RATE,
+        duration=DURATION,
+        trim_top_db=TRIM_TOP_DB,
+        n_mfcc=N_MFCC,
+        n_fft=N_FFT,
+        hop_length=HOP_LENGTH,
+        vad=voice_detector.settings() if voice_detector is not None else None,
+        resample_quality=RESAMPLE_QUALITY
+    )
+
+# Audio ready for inference; scores is set when it was served from the cache, and
+# both features and scores are None when the voice activity gate found no speech
+PreparedAudio = namedtuple('PreparedAudio', ['url', 'etag', 'digest', 'features', 'scores'])
+
+# Thread pool for concurrent download and feature extraction in /analyze/batch
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='batch')
+
+# Prometheus metrics served by /metrics (per process; each gunicorn worker has its own)
+metrics = Registry()
+REQUEST_COUNT = metrics.counter('emotion_requests_total', 'HTTP requests by endpoint and status', ['endpoint', 'status'])
+REQUEST_LATENCY = metrics.histogram('emotion_request_seconds', 'HTTP request latency', ['endpoint'])
+REQUESTS_IN_FLIGHT = metrics.gauge('emotion_requests_in_flight', 'Requests currently being handled', ['endpoint'])
+STAGE_LATENCY = metrics.histogram('emotion_stage_seconds', 'Time spent in each pipeline stage', ['stage'])
+STAGE_ERRORS = metrics.counter('emotion_stage_errors_total', 'Exceptions raised by pipeline stages', ['stage', 'error'])
+MODEL_BATCH_LATENCY = metrics.histogram('emotion_model_batch_seconds', 'Duration of one batched forward pass', ['version'])
+MODEL_BATCH_SIZE = metrics.histogram('emotion_model_batch_rows', 'Rows per batched forward pass',
+                                     buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+
+ADMISSION_DECISIONS = metrics.counter('emotion_admission_total', 'Admission decisions by priority and outcome', ['priority', 'outcome'])
+STREAM_WINDOWS = metrics.counter('emotion_stream_windows_total', 'Live stream windows analyzed, skipped under backpressure or without speech', ['result'])
+
+# Open /stream sessions, bounded by STREAM_CAPACITY
+stream_lock = threading.Lock()
+open_streams = 0
+
+# Sampling profiler, switched on per request by /debug/profile
+profiler = SamplingProfiler()
+
+def backend_options():
+    """Thread pool and compilation settings for INFERENCE_BACKEND"""
+    options = {'num_threads': INTRA_OP_THREADS or None}
+    if INFERENCE_BACKEND in ('keras', 'onnx'):
+        options['inter_op_threads'] = INTER_OP_THREADS or None
+    if INFERENCE_BACKEND == 'keras':
+        options.update(compiled=COMPILED_INFERENCE, buckets=INFERENCE_BUCKETS)
+    return options
+
+def load_model_version(version, model_path, encoder_path):
+    """Load one model version: the inference backend, label encoder and batchers"""
+    backend_path = exported_model_path(model_path, INFERENCE_BACKEND, BACKEND_QUANTIZATION)
+    if BACKEND_MODEL_PATH and registry.default is None:
+        backend_path = BACKEND_MODEL_PATH
     try:
-        model = tf.keras.models.load_model(MODEL_PATH)
-        with open(LABEL_ENCODER_PATH, 'rb') as f:
+        # Backends import their runtime lazily, so feature worker processes
+        # (which re-import this module) never load TensorFlow
+        model = load_backend(INFERENCE_BACKEND, backend_path, **backend_options())
+        # Cached results are only valid for this exact file (quantization, re-export, ...)
+        digest = file_digest(backend_path) if os.path.isfile(backend_path) else None
+        with open(encoder_path, 'rb') as f:
             label_encoder = pickle.load(f)
-        print(f"Model loaded successfully from {MODEL_PATH}")
-        print(f"Label encoder loaded successfully from {LABEL_ENCODER_PATH}")
+        predict = functools.partial(predict_batch, model, version)
+        batchers = {
+            'analyze': InferenceBatcher(
+                predict,
+                max_batch_size=MAX_BATCH_SIZE,
+                max_wait_ms=MAX_BATCH_WAIT_MS
+            ),
+            # Live streams tolerate a longer wait, so all open sessions share each forward pass
+            'stream': InferenceBatcher(
+                predict,
+                max_batch_size=STREAM_BATCH_SIZE,
+                max_wait_ms=STREAM_BATCH_WAIT_MS
+            )
+        }
+        print(f"Model loaded successfully from {backend_path} ({INFERENCE_BACKEND} backend)")
+        print(f"Label encoder loaded successfully from {encoder_path}")
         print(f"Available classes: {label_encoder.classes_}")
     except Exception as e:
         print(f"Error loading model or encoder: {e}")
         raise
+    return ModelVersion(version, backend_path, encoder_path, model, label_encoder, batchers, digest)
 
-def download_audio_file(url):
-    """Download audio file from URL"""
-    try:
-        # Create a temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-        temp_file.close()
+def parse_traffic_split(text):
+    """Parse "version=weight,version=weight" into a dict"""
+    weights = {}
+    for part in text.split(','):
+        if part.strip():
+            version, _, weight = part.partition('=')
+            weights[version.strip()] = float(weight)
+    return weights
+
+def synthetic_wav_bytes(seconds=DURATION, sr=44100):
+    """A short tone-plus-noise WAV clip used to exercise the audio pipeline"""
+    import soundfile
+    t = np.arange(int(seconds * sr)) / sr
+    y = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * np.random.default_rng(0).standard_normal(len(t))
+    # A syllable-rate envelope, so the clip passes the voice activity gate
+    y *= np.clip(np.sin(2 * np.pi * 4 * t), 0.05, None)
+    buffer = io.BytesIO()
+    soundfile.write(buffer, y.astype(np.float32), sr, format='WAV', subtype='PCM_16')
+    return buffer.getvalue()
+
+def warm_up():
+    """Run the audio pipeline once on synthetic audio
+
+    Pays for librosa's lazy imports and JIT compilation and resampler setup
+    before the server reports ready.
+    """
+    # A non-native sample rate also warms up the resampler
+    data = synthetic_wav_bytes()
+    extract_features(decode_audio(data))
+    if feature_pool is not None:
+        feature_pool.extract(data)
+
+def warm_up_model(model_version):
+    """Trace a model version's graphs and first calls before it gets traffic"""
+    model_version.model.warm_up(max(MAX_BATCH_SIZE, STREAM_BATCH_SIZE, SEGMENT_BATCH_SIZE))
+    features = extract_features(decode_audio(synthetic_wav_bytes()))
+    model_version.batchers['analyze'].predict(features)
+    predict_batch(model_version.model, model_version.version, np.repeat(features, MAX_BATCH_SIZE, axis=0))
+
+def startup():
+    """Load everything exactly once, warm it up, then mark the server ready
+
+    Safe to call from several threads: the first caller does the work while the
+    others wait on the lock. Prints and returns a per-phase timing breakdown.
+    """
+    with startup_lock:
+        if model_ready.is_set():
+            return startup_timings
+        
+        total_start = time.perf_counter()
+        phase_start = total_start
+        def phase_done(name):
+            nonlocal phase_start
+            now = time.perf_counter()
+            startup_timings[name] = now - phase_start
+            phase_start = now
         
-        # Download the file
-        response = requests.get(url, stream=True)
-        with open(temp_file.name, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=1024):
-                if chunk:
-                    f.write(chunk)
+        # Heavy audio libraries are imported lazily by the modules that need them
+        import librosa
+        import scipy.fftpack
+        import scipy.signal
+        import soundfile
+        get_extractor(sr=SAMPLE_RATE, n_fft=N_FFT, hop_length=HOP_LENGTH, n_mfcc=N_MFCC)
+        phase_done('imports')
         
-        return temp_file.name
+        # The model phase includes tracing the model's first calls
+        load_models()
+        phase_done('model')
+        
+        if feature_pool is not None:
+            feature_pool.start()
+            phase_done('feature_workers')
+        
+        warm_up()
+        phase_done('warm_up')
+        
+        startup_timings['total'] = time.perf_counter() - total_start
+        model_ready.set()
+        print("Startup: " + " | ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_timings.items()))
+        return startup_timings
+
+def load_models():
+    """Create the model registry and load the startup version (and any in the traffic split)
+
+    Without MODEL_VERSION an existing routing file wins over the newest
+    version and MODEL_TRAFFIC_SPLIT, so a restarted worker serves what its
+    siblings serve. An explicit MODEL_VERSION wins over the file, which is
+    rewritten with the pinned routing so the other workers follow it too.
+    """
+    global registry
+    registry = ModelRegistry(MODEL_DIR, load_model_version, warm_up_model, auto_activate=MODEL_AUTO_ACTIVATE,
+                             routing_path=MODEL_ROUTING_FILE)
+    if MODEL_VERSION is None:
+        registry.sync()
+        if registry.default is not None:
+            print(f"Model routing from {MODEL_ROUTING_FILE}: default {registry.default.version}")
+            registry.watch(MODEL_WATCH_SECONDS)
+            return
+    version = MODEL_VERSION
+    if version is None:
+        latest = latest_model(MODEL_DIR)
+        if latest is None:
+            raise FileNotFoundError(f"No emotion_model_<version>.h5 / label_encoder pair in {MODEL_DIR}")
+        version = latest[0]
+    registry.load(version, activate=True)
+    
+    split = parse_traffic_split(MODEL_TRAFFIC_SPLIT)
+    for other in split:
+        registry.load(other)
+    if split:
+        # Every worker starts from the same settings, so this stays out of the routing file
+        registry.apply({'default': version, 'split': split, 'standby': []})
+    if MODEL_VERSION is not None and MODEL_ROUTING_FILE is not None:
+        routing = read_routing(MODEL_ROUTING_FILE)
+        if routing is not None and (routing['default'], routing['split']) != (version, split):
+            print(f"Warning: MODEL_VERSION={version} overrides {MODEL_ROUTING_FILE} "
+                  f"(default {routing['default']}, split {routing['split']}); rewriting it")
+            registry.publish(default=version, split=split)
+    registry.watch(MODEL_WATCH_SECONDS)
+
+@contextmanager
+def timed_stage(name):
+    """Time a pipeline stage and attribute it to the current request
+
+    Every stage is recorded in the emotion_stage_seconds histogram. Inside a
+    request, durations are also summed per request and returned in the
+    Server-Timing response header.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.inc(stage=name, error=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(elapsed, stage=name)
+        if has_request_context():
+            timings = g.setdefault('stage_timings', {})
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+def endpoint_label():
+    """Route pattern of the current request, for low-cardinality metric labels"""
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def track_request_start():
+    g.request_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc(endpoint=endpoint_label())
+
+@app.teardown_request
+def track_request_end(exc):
+    if 'request_start' in g:
+        REQUESTS_IN_FLIGHT.dec(endpoint=endpoint_label())
+
+@app.after_request
+def add_server_timing(response):
+    """Record request metrics and report per-stage durations in Server-Timing (ms)"""
+    endpoint = endpoint_label()
+    REQUEST_COUNT.inc(endpoint=endpoint, status=str(response.status_code))
+    if 'request_start' in g:
+        # Streaming responses are measured up to the first byte
+        REQUEST_LATENCY.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    
+    if 'model_version' in g:
+        response.headers['X-Model-Version'] = g.model_version
+    
+    timings = g.get('stage_timings')
+    if timings:
+        response.headers['Server-Timing'] = ', '.join(
+            f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items()
+        )
+    return response
+
+def download_audio(url, deadline=None):
+    """Download audio file from URL into memory, within the monotonic deadline"""
+    try:
+        return downloader.download(url, deadline)
     except Exception as e:
         print(f"Error downloading file: {e}")
+        if isinstance(e, DownloadError):
+            # A download cut short by the request deadline is a timeout, not a bad URL
+            check_deadline(deadline)
         raise
 
-def extract_features(file_path):
-    """Extract MFCC features from audio file"""
+def decode_audio(data):
+    """Decode audio bytes into a mono waveform at SAMPLE_RATE"""
+    return load_audio_bytes(data, SAMPLE_RATE, quality=RESAMPLE_QUALITY)
+
+def extract_features(y):
+    """Extract MFCC features from a mono waveform at SAMPLE_RATE
+
+    Returns None when the voice activity gate finds no speech in the clip.
+    """
     try:
-        # Load audio file
-        y, sr = librosa.load(file_path, sr=SAMPLE_RATE, mono=True)
-        
-        # Trim silent parts
-        y, _ = librosa.effects.trim(y, top_db=25)
-        
-        # Make sure audio is exactly DURATION seconds long
-        if len(y) > SAMPLE_RATE * DURATION:
-            y = y[:SAMPLE_RATE * DURATION]
-        else:
-            y = np.pad(y, (0, max(0, SAMPLE_RATE * DURATION - len(y))), 'constant')
-        
-        # Extract MFCCs
-        mfccs = librosa.feature.mfcc(
-            y=y, 
-            sr=SAMPLE_RATE, 
-            n_mfcc=N_MFCC, 
-            n_fft=N_FFT, 
-            hop_length=HOP_LENGTH
-        )
-        
-        # Transpose to get time steps as the first dimension
-        mfccs = mfccs.T
+        # Trim silent parts and make sure audio is exactly DURATION seconds long
+        with timed_stage('trim'):
+            y = prepare_waveform(y, TRIM_TOP_DB, sr=SAMPLE_RATE, duration=DURATION)
         
-        # Reshape for model input (add batch dimension)
-        mfccs = np.expand_dims(mfccs, axis=0)
+        # Silent or near-silent clips never reach the feature extractor or the model
+        if voice_detector is not None:
+            with timed_stage('vad'):
+                if not voice_detector.gate(y)[0]:
+                    return None
         
-        return mfccs
+        # Extract MFCCs (adds the batch dimension)
+        with timed_stage('features'):
+            return extract_features_batch(y[np.newaxis])
     except Exception as e:
         print(f"Error extracting features: {e}")
         raise
 
-def predict_emotion(audio_features):
-    """Predict emotion using loaded model"""
-    # Make prediction
-    predictions = model.predict(audio_features)
+def extract_features_batch(waveforms):
+    """Extract MFCCs for a stack of prepared DURATION-second waveforms"""
+    mfccs = get_extractor(
+        sr=SAMPLE_RATE,
+        n_fft=N_FFT,
+        hop_length=HOP_LENGTH,
+        n_mfcc=N_MFCC
+    ).mfcc(waveforms)
     
-    # Get the index of the highest probability
-    predicted_index = np.argmax(predictions, axis=1)[0]
+    # Transpose to get time steps as the first dimension: (batch, time, N_MFCC)
+    return mfccs.transpose(0, 2, 1)
+
+def prepare_url(url, model_version, deadline=None):
+    """Download and featurize an audio URL, short-circuiting on cache hits"""
+    etag = None
+    if result_cache is not None:
+        # A HEAD request is much cheaper than downloading and analyzing again
+        try:
+            with timed_stage('download'):
+                etag = downloader.head(url, deadline).get('ETag')
+        except DownloadError:
+            etag = None
+        if etag:
+            scores = result_cache.get_url(model_version.cache_key, url, etag)
+            if scores is not None:
+                return PreparedAudio(url, etag, None, None, scores)
     
-    # Get the emotion label
-    emotion = label_encoder.inverse_transform([predicted_index])[0]
+    with timed_stage('download'):
+        download = download_audio(url, deadline)
+    return prepare_bytes(download.data, model_version, url=url, etag=download.etag or etag)
+
+def prepare_bytes(data, model_version, url=None, etag=None):
+    """Featurize audio held in memory, reusing cached features for known audio"""
+    digest = None
+    if result_cache is not None:
+        with timed_stage('cache'):
+            digest = audio_digest(data)
+            cached = result_cache.get_audio(model_version.cache_key, digest)
+        if cached is not None:
+            features, scores = cached
+            return PreparedAudio(url, etag, digest, features, scores)
     
-    # Get the confidence
-    confidence = float(predictions[0][predicted_index])
+    if feature_pool is not None:
+        # Decoding happens in the worker too, so it is counted as features
+        with timed_stage('features'):
+            features = feature_pool.extract(data)
+        if voice_detector is not None:
+            voice_detector.record([features is not None], DURATION)
+    else:
+        with timed_stage('decode'):
+            y = decode_audio(data)
+        features = extract_features(y)
+    return PreparedAudio(url, etag, digest, features, None)
+
+def result_log_for(labels):
+    """Result log for a model's label set, or None when logging is disabled"""
+    if RESULT_LOG_DIR is None:
+        return None
+    log = result_logs.get(labels.classes)
+    if log is None:
+        with result_logs_lock:
+            log = result_logs.get(labels.classes)
+            if log is None:
+                log = result_logs[labels.classes] = ResultLog(RESULT_LOG_DIR, labels.classes,
+                                                              flush_seconds=RESULT_LOG_FLUSH_SECONDS)
+    return log
+
+def log_results(labels, source, scores):
+    """Append rows of class probabilities from one client to the result log"""
+    log = result_log_for(labels)
+    if log is None:
+        return
+    try:
+        log.append_batch(source, scores)
+    except OSError as e:
+        # A full or read-only disk must not fail the analysis itself
+        print(f"Error writing result log: {e}")
+
+def remember_result(prepared, scores, model_version):
+    """Store freshly computed scores in both cache levels"""
+    if result_cache is None:
+        return
+    if prepared.digest is not None and prepared.scores is None:
+        result_cache.put_audio(model_version.cache_key, prepared.digest, prepared.features, scores)
+    if prepared.url is not None and prepared.etag:
+        result_cache.put_url(model_version.cache_key, prepared.url, prepared.etag, scores)
+
+class UploadTooLarge(Exception):
+    """The request body exceeds MAX_UPLOAD_MB"""
+
+class InvalidAudio(Exception):
+    """The request's audio is empty, missing from the form or cannot be decoded"""
+
+def is_audio_upload():
+    """True for a raw audio body or a multipart form, as opposed to a JSON request"""
+    mimetype = request.mimetype
+    return mimetype in ('application/octet-stream', 'multipart/form-data') or mimetype.startswith('audio/')
+
+def read_request_body(max_mb):
+    """Yield the request body as it is received, raising UploadTooLarge past max_mb
+
+    Reads the input stream directly, so chunked transfer encoding works and
+    nothing is spooled to a temporary file. An empty body is InvalidAudio.
+    """
+    max_bytes = int(max_mb * 1024 * 1024)
+    if request.content_length is not None and request.content_length > max_bytes:
+        raise UploadTooLarge(f'Upload exceeds {max_mb:g} MB')
+    received = 0
+    while True:
+        chunk = request.stream.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            if received == 0:
+                raise InvalidAudio('Empty upload: the request body is empty')
+            return
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadTooLarge(f'Upload exceeds {max_mb:g} MB')
+        yield chunk
+
+def multipart_decoder():
+    boundary = request.mimetype_params.get('boundary')
+    if not boundary:
+        raise InvalidAudio('Multipart upload without a boundary')
+    return MultipartDecoder(boundary.encode())
+
+def iter_upload_chunks():
+    """Yield the uploaded audio bytes as they are received
+
+    Raw bodies are passed through; multipart forms are parsed incrementally
+    and the first file part is yielded.
+    """
+    if request.mimetype != 'multipart/form-data':
+        yield from read_request_body(MAX_UPLOAD_MB)
+        return
     
-    # Get all emotion scores
-    emotion_scores = {}
-    for i, emotion_class in enumerate(label_encoder.classes_):
-        emotion_scores[emotion_class] = float(predictions[0][i])
+    decoder = multipart_decoder()
+    body = read_request_body(MAX_UPLOAD_MB)
+    in_file = False
+    file_bytes = 0
+    while True:
+        event = decoder.next_event()
+        if isinstance(event, NeedData):
+            decoder.receive_data(next(body, None))
+        elif isinstance(event, File) and not in_file:
+            in_file = True
+        elif isinstance(event, Data) and in_file:
+            if event.data:
+                file_bytes += len(event.data)
+                yield event.data
+            if not event.more_data:
+                if file_bytes == 0:
+                    raise InvalidAudio('Empty upload: the file part is empty')
+                # Only the first file is analyzed; drain the rest of the body
+                for _ in body:
+                    pass
+                return
+        elif isinstance(event, Epilogue):
+            raise InvalidAudio('Multipart upload without a file part')
+
+def read_batch_form():
+    """Parse a multipart /analyze/batch body incrementally into (fields, files)
+
+    files is a list of (filename or field name, bytes). File parts are counted
+    and sized as they arrive, so a form with more than MAX_BATCH_ITEMS files, a
+    file over MAX_UPLOAD_MB or a body over MAX_BATCH_UPLOAD_MB raises
+    UploadTooLarge without the rest of the body being read.
+    """
+    decoder = multipart_decoder()
+    body = read_request_body(MAX_BATCH_UPLOAD_MB)
+    max_item_bytes = int(MAX_UPLOAD_MB * 1024 * 1024)
+    fields = {}
+    files = []
+    part = None
+    while True:
+        event = decoder.next_event()
+        if isinstance(event, NeedData):
+            decoder.receive_data(next(body, None))
+        elif isinstance(event, (Field, File)):
+            if isinstance(event, File) and len(files) == MAX_BATCH_ITEMS:
+                raise UploadTooLarge(f'Too many items: at most {MAX_BATCH_ITEMS} per request')
+            part = event
+            size = 0
+            chunks = []
+        elif isinstance(event, Data) and part is not None:
+            size += len(event.data)
+            if isinstance(part, File) and size > max_item_bytes:
+                raise UploadTooLarge(f'Item {part.filename or part.name} exceeds {MAX_UPLOAD_MB:g} MB')
+            chunks.append(event.data)
+            if not event.more_data:
+                if isinstance(part, File):
+                    files.append((part.filename or part.name, b''.join(chunks)))
+                else:
+                    fields[part.name] = b''.join(chunks).decode('utf-8', 'replace')
+                part = None
+        elif isinstance(event, Epilogue):
+            return fields, files
+
+def decode_upload(chunks):
+    """Decode upload chunks into blocks at SAMPLE_RATE, reporting undecodable audio as InvalidAudio"""
+    try:
+        yield from iter_stream_blocks(chunks, SAMPLE_RATE, RESAMPLE_QUALITY)
+    except (InvalidAudio, UploadTooLarge, DeadlineExceeded):
+        raise
+    except Exception as e:
+        # Decoder errors (audioread, libsndfile, EOFError) often carry no message
+        raise InvalidAudio(f'Unsupported or undecodable audio ({str(e) or type(e).__name__})') from e
+
+def hashed_chunks(chunks, hasher):
+    """Pass chunks through while feeding them to a hash"""
+    for chunk in chunks:
+        hasher.update(chunk)
+        yield chunk
+
+def prepare_upload(chunks, model_version):
+    """Decode and featurize an uploaded body while it is being received
+
+    The content hash is computed on the fly, so an upload of audio that was
+    analyzed before is answered from the cache once the body is complete.
+    """
+    hasher = audio_hasher()
+    with timed_stage('upload'):
+        blocks = list(decode_upload(hashed_chunks(chunks, hasher)))
+    if not blocks:
+        raise InvalidAudio('Unsupported or undecodable audio (no samples decoded)')
+    digest = hasher.hexdigest()
     
-    return {
-        'emotion': emotion,
-        'confidence': confidence,
-        'emotion_scores': emotion_scores
-    }
+    if result_cache is not None:
+        with timed_stage('cache'):
+            cached = result_cache.get_audio(model_version.cache_key, digest)
+        if cached is not None:
+            features, scores = cached
+            return PreparedAudio(None, None, digest, features, scores)
+    
+    features = extract_features(np.concatenate(blocks))
+    return PreparedAudio(None, None, digest, features, None)
+
+def predict_batch(model, version, audio_features):
+    """Run one forward pass of a model version over a stacked batch of feature tensors"""
+    start = time.perf_counter()
+    predictions = model.predict(audio_features)
+    MODEL_BATCH_LATENCY.observe(time.perf_counter() - start, version=version)
+    MODEL_BATCH_SIZE.observe(len(audio_features))
+    return predictions
+
+def predict_emotion(audio_features, model_version):
+    """Predict emotion using loaded model"""
+    # Make prediction (batched with other in-flight requests)
+    predictions = model_version.batchers['analyze'].predict(audio_features)
+    return model_version.labels.format(predictions[0])
+
+def parse_top_k(data):
+    """Read the optional top_k option (number of ranked emotions to return)"""
+    top_k = data.get('top_k') if isinstance(data, dict) else None
+    if top_k is None or top_k == '':
+        return None
+    try:
+        top_k = int(top_k)
+    except (TypeError, ValueError):
+        raise ValueError('top_k must be an integer')
+    if top_k < 1:
+        raise ValueError('top_k must be at least 1')
+    return top_k
+
+def analyze_segments(blocks, model_version, hop_seconds=SEGMENT_HOP_SECONDS, top_k=None):
+    """Analyze a whole recording as overlapping DURATION-second windows
+
+    blocks are decoded waveform blocks at SAMPLE_RATE (see iter_audio_blocks).
+    Audio is featurized block by block, and each batch of windows goes through
+    the model in a single call, so memory stays bounded however long the
+    recording is. Windows without speech are left out of the model call and
+    the aggregate. Returns the aggregated verdict plus a timeline.
+    """
+    labels = model_version.labels
+    timeline = []
+    window_scores = []
+    batches = iter_segment_batches(
+        blocks,
+        sr=SAMPLE_RATE,
+        duration=DURATION,
+        hop_seconds=hop_seconds,
+        batch_size=SEGMENT_BATCH_SIZE,
+        n_mfcc=N_MFCC,
+        vad=voice_detector
+    )
+    for spans, features, *gate in batches:
+        # Without the voice activity gate every window counts as speech
+        speech = gate[0] if gate else np.ones(len(spans), dtype=bool)
+        predictions = []
+        if speech.any():
+            # The model takes (batch, time, N_MFCC)
+            predictions = model_version.batchers['analyze'].predict(features[speech].transpose(0, 2, 1),
+                                                                    deadline=request_deadline())
+        window_labels = iter(labels.labels(predictions) if len(predictions) else [])
+        for (start, end), has_speech in zip(spans, speech.tolist()):
+            emotion, sentiment, confidence = next(window_labels) if has_speech else (NO_SPEECH, 'unknown', 0.0)
+            timeline.append({
+                'start': round(start, 3),
+                'end': round(end, 3),
+                'emotion': emotion,
+                'sentiment': sentiment,
+                'confidence': confidence
+            })
+        window_scores.extend(predictions)
+    
+    if not timeline:
+        raise InvalidAudio('Unsupported or undecodable audio (no samples decoded)')
+    
+    if window_scores:
+        mean_scores, shares = summarize_segments(window_scores)
+        log_results(labels, client_key(), mean_scores[np.newaxis])
+        result = labels.format(mean_scores, top_k)
+        result['emotion_shares'] = dict(zip(labels.classes, shares.tolist()))
+    else:
+        result = labels.no_speech(top_k)
+        result['emotion_shares'] = {}
+    result['speech_windows'] = len(window_scores)
+    result['duration'] = timeline[-1]['end']
+    result['timeline'] = timeline
+    return result
+
+def acquire_model_version(data=None):
+    """Lease the model version for this request and report it in X-Model-Version
+
+    A version named by the X-Model-Version header or a `model_version` field
+    (JSON body or query string) is used if loaded; otherwise the traffic split
+    decides, stable per X-Client-Id when the client sends one. The caller must
+    release() the returned version.
+    """
+    requested = request.headers.get('X-Model-Version') or request.args.get('model_version')
+    if not requested and isinstance(data, dict):
+        requested = data.get('model_version')
+    model_version = registry.acquire(requested or None, key=request.headers.get('X-Client-Id'))
+    g.model_version = model_version.version
+    return model_version
+
+def client_key():
+    """The client of the current request: X-Client-Id, else the remote address"""
+    return request.headers.get('X-Client-Id') or request.remote_addr or 'unknown'
+
+def request_deadline():
+    """Monotonic deadline of the current request, or None without one"""
+    return g.get('deadline') if has_request_context() else None
+
+def admit_request(default_priority, timeout=None):
+    """Claim a work slot for the current request from the admission controller
+
+    The priority class comes from the X-Priority header (default_priority
+    when absent) and the client from X-Client-Id, else the remote address.
+    The request's deadline, kept in g.deadline, is timeout seconds from now
+    or X-Request-Timeout-Ms if that is sooner; past it, downloads are cut
+    short and the request is dropped instead of queued. Returns the Ticket to
+    release (None with admission control off); raises ValueError for invalid
+    headers, Rejected or DeadlineExceeded.
+    """
+    priority = (request.headers.get('X-Priority') or default_priority).lower()
+    if priority not in PRIORITIES:
+        raise ValueError(f"X-Priority must be one of: {', '.join(PRIORITIES)}")
+    timeout_ms = request.headers.get('X-Request-Timeout-Ms')
+    if timeout_ms:
+        try:
+            timeout_ms = float(timeout_ms)
+        except ValueError:
+            raise ValueError('X-Request-Timeout-Ms must be a number')
+        if timeout_ms <= 0:
+            raise ValueError('X-Request-Timeout-Ms must be positive')
+        timeout = timeout_ms / 1000 if not timeout else min(timeout, timeout_ms / 1000)
+    g.deadline = deadline_after(timeout) if timeout else None
+    if admission is None:
+        return None
+    
+    client = client_key()
+    try:
+        with timed_stage('admission'):
+            ticket = admission.acquire(priority, client, request_deadline())
+    except Rejected as e:
+        ADMISSION_DECISIONS.inc(priority=priority, outcome=e.reason)
+        raise
+    except DeadlineExceeded:
+        ADMISSION_DECISIONS.inc(priority=priority, outcome='deadline')
+        raise
+    ADMISSION_DECISIONS.inc(priority=priority, outcome='admitted')
+    return ticket
+
+def admission_error(e):
+    """Error response for a request that admit_request() turned away"""
+    if isinstance(e, Rejected):
+        response = jsonify({'error': str(e)})
+        response.status_code = e.status
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    if isinstance(e, DeadlineExceeded):
+        return jsonify({'error': str(e)}), 504
+    return jsonify({'error': str(e)}), 400
 
 @app.route('/analyze', methods=['POST'])
 def analyze_audio():
-    """API endpoint to analyze audio file"""
+    """API endpoint to analyze audio file
+
+    Accepts JSON with an `audio_url`, or the audio itself as the request body
+    (application/octet-stream, audio/*) or as a multipart file. Options go in
+    the JSON body or, for uploads, in the query string. Requests are
+    interactive unless they send `X-Priority: bulk`.
+    """
     # Check if model is loaded
-    if model is None or label_encoder is None:
+    if not model_ready.is_set():
         try:
-            load_model_and_encoder()
+            startup()
         except Exception as e:
             return jsonify({
                 'error': f'Failed to load model: {str(e)}'
             }), 500
     
+    # Wait for a work slot before the body is read or anything is downloaded
+    try:
+        ticket = admit_request('interactive', REQUEST_TIMEOUT)
+    except (ValueError, Rejected, DeadlineExceeded) as e:
+        return admission_error(e)
+    try:
+        return analyze_admitted()
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+def analyze_admitted():
+    """Parse and serve an /analyze request that holds a work slot"""
     # Parse request
-    if not request.is_json:
-        return jsonify({'error': 'Request must be JSON'}), 400
+    if request.is_json:
+        data = request.get_json()
+        if 'audio_url' not in data:
+            return jsonify({'error': 'No audio_url provided'}), 400
+        audio_url = data['audio_url']
+    elif is_audio_upload():
+        data = request.args.to_dict()
+        audio_url = None
+        if 'hop_seconds' in data:
+            try:
+                data['hop_seconds'] = float(data['hop_seconds'])
+            except ValueError:
+                pass
+        data['segmented'] = data.get('segmented', '').lower() in ('1', 'true', 'yes')
+    else:
+        return jsonify({'error': 'Request must be JSON or an audio upload'}), 400
     
-    data = request.get_json()
-    if 'audio_url' not in data:
-        return jsonify({'error': 'No audio_url provided'}), 400
+    try:
+        model_version = acquire_model_version(data)
+    except UnknownVersion as e:
+        return jsonify({'error': e.args[0]}), 400
+    try:
+        return analyze_with_model(data, audio_url, model_version)
+    finally:
+        model_version.release()
+
+def analyze_with_model(data, audio_url, model_version):
+    """Serve a parsed /analyze request with a leased model version"""
+    try:
+        top_k = parse_top_k(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    audio_url = data['audio_url']
+    if data.get('segmented'):
+        hop_seconds = data.get('hop_seconds', SEGMENT_HOP_SECONDS)
+        if not isinstance(hop_seconds, (int, float)) or not 0.1 <= hop_seconds <= DURATION:
+            return jsonify({'error': f'hop_seconds must be between 0.1 and {DURATION}'}), 400
+        try:
+            if audio_url is None:
+                # Windows are analyzed while the rest of the upload is still arriving
+                with timed_stage('segments'):
+                    result = analyze_segments(decode_upload(iter_upload_chunks()), model_version, hop_seconds, top_k)
+            else:
+                # Timelines are not cached; the download itself is bounded by MAX_DOWNLOAD_MB
+                with timed_stage('download'):
+                    audio = download_audio(audio_url, request_deadline()).data
+                # Decoding, features and inference are interleaved batch by batch
+                with timed_stage('segments'):
+                    result = analyze_segments(iter_audio_blocks(audio, SAMPLE_RATE, quality=RESAMPLE_QUALITY),
+                                              model_version, hop_seconds, top_k)
+            with timed_stage('serialize'):
+                return jsonify(result)
+        except DeadlineExceeded as e:
+            return jsonify({'error': str(e)}), 504
+        except UploadTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        except InvalidAudio as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({
+                'error': f'Analysis failed: {str(e)}'
+            }), 500
     
     try:
-        # Download the audio file
-        file_path = download_audio_file(audio_url)
-        
-        # Extract features
-        features = extract_features(file_path)
+        # Download (or receive), decode and extract features, or find them in the cache
+        if audio_url is None:
+            prepared = prepare_upload(iter_upload_chunks(), model_version)
+        else:
+            prepared = prepare_url(audio_url, model_version, request_deadline())
         
-        # Make prediction
-        result = predict_emotion(features)
+        if prepared.features is None and prepared.scores is None:
+            # The voice activity gate found no speech: nothing to infer or cache
+            result = model_version.labels.no_speech(top_k)
+            with timed_stage('serialize'):
+                return jsonify(result)
         
-        # Clean up temporary file
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # Make prediction unless the scores were cached
+        scores = prepared.scores
+        if scores is None:
+            with timed_stage('inference'):
+                scores = model_version.batchers['analyze'].predict(prepared.features, deadline=request_deadline())[0]
+        remember_result(prepared, scores, model_version)
+        log_results(model_version.labels, client_key(), np.asarray(scores)[np.newaxis])
         
-        return jsonify(result)
+        with timed_stage('labels'):
+            result = model_version.labels.format(scores, top_k)
+        with timed_stage('serialize'):
+            return jsonify(result)
+    except DeadlineExceeded as e:
+        return jsonify({'error': str(e)}), 504
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except InvalidAudio as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({
             'error': f'Analysis failed: {str(e)}'
         }), 500
 
+class StreamError(Exception):
+    """A live stream request that cannot be served; status is the HTTP code to report"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def open_stream_session(model_version):
+    """Create a StreamSession from the query string and claim a stream slot
+
+    Options: sample_rate (of the client's audio, default SAMPLE_RATE),
+    encoding (pcm16 or float32) and hop_seconds (update interval).
+    """
+    global open_streams
+    try:
+        sample_rate = int(request.args.get('sample_rate', SAMPLE_RATE))
+        hop_seconds = float(request.args.get('hop_seconds', STREAM_HOP_SECONDS))
+    except ValueError:
+        raise StreamError('sample_rate and hop_seconds must be numbers')
+    encoding = request.args.get('encoding', 'pcm16')
+    if not 8000 <= sample_rate <= 48000:
+        raise StreamError('sample_rate must be between 8000 and 48000')
+    if not 0.1 <= hop_seconds <= DURATION:
+        raise StreamError(f'hop_seconds must be between 0.1 and {DURATION}')
+    if encoding not in PCM_ENCODINGS:
+        raise StreamError(f"encoding must be one of: {', '.join(PCM_ENCODINGS)}")
+    
+    with stream_lock:
+        if open_streams >= STREAM_CAPACITY:
+            raise StreamError(f'Too many open streams (at most {STREAM_CAPACITY})', status=503)
+        open_streams += 1
+    ticket = None
+    if admission is not None:
+        try:
+            ticket = admission.acquire_stream(client_key())
+        except Rejected as e:
+            ADMISSION_DECISIONS.inc(priority='stream', outcome=e.reason)
+            with stream_lock:
+                open_streams -= 1
+            raise StreamError(str(e), status=503)
+        ADMISSION_DECISIONS.inc(priority='stream', outcome='admitted')
+    session = StreamSession(
+        model_version.batchers['stream'].submit,
+        sample_rate=sample_rate,
+        encoding=encoding,
+        hop_seconds=hop_seconds,
+        max_pending=STREAM_MAX_PENDING,
+        sr=SAMPLE_RATE,
+        duration=DURATION,
+        n_mfcc=N_MFCC,
+        hop_length=HOP_LENGTH,
+        vad=voice_detector,
+        resample_quality=RESAMPLE_QUALITY
+    )
+    session.ticket = ticket
+    return session
+
+def close_stream_session(session):
+    """Cancel outstanding windows and release the stream slot"""
+    global open_streams
+    session.close()
+    if session.ticket is not None:
+        session.ticket.release()
+    STREAM_WINDOWS.inc(session.windows_submitted, result='analyzed')
+    STREAM_WINDOWS.inc(session.windows_skipped, result='skipped')
+    STREAM_WINDOWS.inc(session.windows_silent, result='no_speech')
+    with stream_lock:
+        open_streams -= 1
+
+def stream_started(session, model_version):
+    """First message of a stream: the effective settings"""
+    return {
+        'type': 'ready',
+        'model_version': model_version.version,
+        'window_seconds': DURATION,
+        'hop_seconds': session.hop / SAMPLE_RATE,
+        'memory_bytes': session.memory_bytes
+    }
+
+def stream_updates(session, labels, client, timeout=0):
+    """Collect finished windows of a session as update messages, logging them for client"""
+    windows = session.poll(timeout)
+    if not windows:
+        return []
+    # Windows without speech have no scores
+    scored = [scores for _, _, _, scores in windows if scores is not None]
+    if scored:
+        scored = np.stack(scored)
+        log_results(labels, client, scored)
+    results = iter(labels.format_batch(scored) if len(scored) else [])
+    updates = []
+    for start, end, skipped, scores in windows:
+        update = {'type': 'update', 'start': round(start, 3), 'end': round(end, 3)}
+        update.update(next(results) if scores is not None else labels.no_speech())
+        if skipped:
+            update['skipped'] = skipped
+        updates.append(update)
+    return updates
+
+def ensure_model_loaded():
+    """Start the model on first use; returns an error response or None"""
+    if not model_ready.is_set():
+        try:
+            startup()
+        except Exception as e:
+            return jsonify({
+                'error': f'Failed to load model: {str(e)}'
+            }), 500
+    return None
+
+@app.route('/stream', methods=['POST'])
+def stream_http():
+    """Continuous analysis of a live PCM stream sent as a chunked request body
+
+    The response is NDJSON: a `ready` line, then one `update` line per analyzed
+    window while the body is still being sent, and a final `end` line. The body
+    is read only as fast as it is processed, so TCP flow control slows down a
+    client that sends faster than the server keeps up.
+    """
+    error = ensure_model_loaded()
+    if error is not None:
+        return error
+    try:
+        model_version = acquire_model_version()
+    except UnknownVersion as e:
+        return jsonify({'error': e.args[0]}), 400
+    try:
+        session = open_stream_session(model_version)
+    except StreamError as e:
+        model_version.release()
+        return jsonify({'error': str(e)}), e.status
+    labels = model_version.labels
+    client = client_key()
+    
+    def ndjson_line(item):
+        return to_json(item) + '\n'
+    
+    def generate():
+        try:
+            yield ndjson_line(stream_started(session, model_version))
+            while True:
+                chunk = request.stream.read(STREAM_READ_BYTES)
+                if not chunk:
+                    break
+                session.feed(chunk)
+                for update in stream_updates(session, labels, client):
+                    yield ndjson_line(update)
+            session.finish()
+            for update in stream_updates(session, labels, client, timeout=None):
+                yield ndjson_line(update)
+            yield ndjson_line({'type': 'end', 'windows': session.windows_submitted,
+                               'skipped': session.windows_skipped, 'no_speech': session.windows_silent})
+        except Exception as e:
+            yield ndjson_line({'type': 'error', 'error': f'Analysis failed: {str(e)}'})
+    
+    def release():
+        close_stream_session(session)
+        model_version.release()
+    
+    # Runs when the server closes the response, even if the stream never started
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.call_on_close(release)
+    return response
+
+if Sock is not None:
+    # Bounded frames; pings keep idle connections open through proxies
+    app.config.setdefault('SOCK_SERVER_OPTIONS', {
+        'max_message_size': int(STREAM_MAX_BACKLOG_KB * 1024),
+        'ping_interval': 25
+    })
+    sock = Sock(app)
+    
+    @sock.route('/stream/ws')
+    def stream_websocket(ws):
+        """Continuous analysis of a live PCM stream over a WebSocket
+
+        Binary messages carry audio; a text message {"type": "end"} flushes the
+        remaining windows and closes the stream. Updates are sent as JSON text
+        messages, as for POST /stream.
+        """
+        if ensure_model_loaded() is not None:
+            ws.close(reason=1011, message='Model not loaded')
+            return
+        try:
+            model_version = acquire_model_version()
+        except UnknownVersion as e:
+            ws.send(to_json({'type': 'error', 'error': e.args[0]}))
+            ws.close(reason=1008, message=e.args[0])
+            return
+        try:
+            session = open_stream_session(model_version)
+        except StreamError as e:
+            model_version.release()
+            ws.send(to_json({'type': 'error', 'error': str(e)}))
+            ws.close(reason=1013 if e.status == 503 else 1008, message=str(e))
+            return
+        
+        labels = model_version.labels
+        client = client_key()
+        max_backlog = int(STREAM_MAX_BACKLOG_KB * 1024)
+        try:
+            ws.send(to_json(stream_started(session, model_version)))
+            idle_since = time.monotonic()
+            while True:
+                # Wake up for pending results, otherwise wait for audio
+                message = ws.receive(timeout=0.05 if session.pending else 1.0)
+                if message is None:
+                    if time.monotonic() - idle_since > STREAM_IDLE_TIMEOUT:
+                        ws.close(reason=1001, message='Idle timeout')
+                        return
+                elif isinstance(message, str):
+                    try:
+                        control = json.loads(message)
+                    except ValueError:
+                        control = None
+                    if not isinstance(control, dict):
+                        error = 'Text messages must be JSON objects such as {"type": "end"}'
+                        ws.send(to_json({'type': 'error', 'error': error}))
+                        ws.close(reason=1007, message=error)
+                        return
+                    if control.get('type') == 'end':
+                        break
+                else:
+                    idle_since = time.monotonic()
+                    session.feed(message)
+                    # Messages are queued by the socket reader thread; a client far ahead
+                    # of the analysis would otherwise grow that queue without bound
+                    if sum(len(m) for m in ws.input_buffer) > max_backlog:
+                        ws.send(to_json({'type': 'error', 'error': 'Stream backlog limit exceeded'}))
+                        ws.close(reason=1013, message='Stream backlog limit exceeded')
+                        return
+                for update in stream_updates(session, labels, client):
+                    ws.send(to_json(update))
+            
+            session.finish()
+            for update in stream_updates(session, labels, client, timeout=None):
+                ws.send(to_json(update))
+            ws.send(to_json({'type': 'end', 'windows': session.windows_submitted,
+                             'skipped': session.windows_skipped, 'no_speech': session.windows_silent}))
+            ws.close()
+        finally:
+            close_stream_session(session)
+            model_version.release()
+
+def shutdown():
+    """Drain every model version's inference batchers and stop worker processes"""
+    if registry is not None:
+        registry.close()
+    if feature_pool is not None:
+        feature_pool.shutdown()
+    for log in list(result_logs.values()):
+        log.close()
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: OK only once the model and label encoder are loaded"""
+    if not model_ready.is_set():
+        return jsonify({'status': 'loading'}), 503
+    return jsonify({
+        'status': 'ready',
+        'model_version': registry.default.version if registry.default is not None else None,
+        'startup_seconds': startup_timings
+    })
+
+@app.route('/stats', methods=['GET'])
+def server_stats():
+    """API endpoint exposing inference batching metrics for the default model version"""
+    default = default_batchers()
+    return jsonify({
+        'startup_seconds': startup_timings,
+        'model_version': registry.default.version if registry is not None and registry.default is not None else None,
+        'batcher': default['analyze'].stats() if 'analyze' in default else None,
+        'streams': {
+            'open': open_streams,
+            'capacity': STREAM_CAPACITY,
+            'batcher': default['stream'].stats() if 'stream' in default else None
+        },
+        'cache': result_cache.stats() if result_cache is not None else None,
+        'vad': voice_detector.stats() if voice_detector is not None else None,
+        'compiled': compiled_stats(registry.default) if registry is not None else None,
+        'admission': admission.stats() if admission is not None else None,
+        'result_log': [log.stats() for log in list(result_logs.values())] if RESULT_LOG_DIR is not None else None
+    })
+
+def compiled_stats(model_version):
+    """Bucket usage of a version's compiled Keras model, or None"""
+    compiled = getattr(model_version.model, 'compiled', None) if model_version is not None else None
+    return compiled.stats() if compiled is not None else None
+
+def default_batchers():
+    """Batchers of the default model version, empty before a model is loaded"""
+    if registry is None or registry.default is None:
+        return {}
+    return registry.default.batchers
+
+def batcher_samples(name):
+    samples = []
+    for version, model_version in (registry.versions() if registry is not None else {}).items():
+        batcher = model_version.batchers.get(name)
+        if batcher is None:
+            continue
+        stats = batcher.stats()
+        samples.extend(({'version': version, 'kind': key}, stats[key])
+                       for key in ['queue_depth', 'max_queue_depth', 'batches_run', 'rows_processed', 'expired'])
+    return samples
+
+def model_info_samples():
+    if registry is None:
+        return []
+    status = registry.status()
+    return [({'version': version, 'backend': INFERENCE_BACKEND, 'default': str(version == status['default']).lower()},
+             status['split'].get(version, 0))
+            for version in status['loaded']]
+
+def admission_samples():
+    if admission is None:
+        return []
+    stats = admission.stats()
+    return [({'priority': priority, 'kind': kind}, stats[kind][priority])
+            for kind in ('active', 'queued') for priority in PRIORITIES]
+
+def result_log_samples():
+    samples = []
+    for log in list(result_logs.values()):
+        stats = log.stats()
+        samples.extend(({'directory': os.path.basename(stats['directory']), 'kind': key}, stats[key])
+                       for key in ['rows', 'segments', 'buffered_rows', 'rows_appended'])
+    return samples
+
+def cache_samples():
+    if result_cache is None:
+        return []
+    stats = result_cache.stats()
+    return [({'kind': key}, value) for key, value in stats.items() if not isinstance(value, bool)]
+
+metrics.callback('emotion_batcher', 'Inference batcher queue and throughput counters', 'gauge',
+                 lambda: batcher_samples('analyze'))
+metrics.callback('emotion_stream_batcher', 'Live stream batcher queue and throughput counters', 'gauge',
+                 lambda: batcher_samples('stream'))
+metrics.callback('emotion_streams_open', 'Open live streams', 'gauge', lambda: [({}, open_streams)])
+metrics.callback('emotion_result_cache', 'Result cache hits, misses and memory use', 'gauge', cache_samples)
+metrics.callback('emotion_admission', 'Admission control: requests holding a work slot or queued, by priority', 'gauge',
+                 admission_samples)
+metrics.callback('emotion_result_log', 'Result log rows and segments', 'gauge', result_log_samples)
+metrics.callback('emotion_vad', 'Voice activity gate: windows checked and skipped without inference', 'gauge',
+                 lambda: [({'kind': key}, value) for key, value in voice_detector.stats().items()]
+                 if voice_detector is not None else [])
+metrics.callback('emotion_startup_seconds', 'Duration of each startup phase, including model load', 'gauge',
+                 lambda: [({'phase': phase}, seconds) for phase, seconds in startup_timings.items()])
+metrics.callback('emotion_model_info', 'Loaded model versions; the value is the version\'s traffic split weight',
+                 'gauge', model_info_samples)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profile', methods=['GET'])
+def debug_profile():
+    """Sample the server's threads for a few seconds and report the hot functions
+
+    Disabled unless PROFILER_TOKEN is set; the token must be sent in the
+    X-Profiler-Token header. ?seconds=N (default 10), ?interval_ms=N (default
+    5) and ?format=collapsed for flame graph input instead of JSON.
+    """
+    if PROFILER_TOKEN is None or request.headers.get('X-Profiler-Token') != PROFILER_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    try:
+        seconds = min(float(request.args.get('seconds', 10)), MAX_PROFILE_SECONDS)
+        interval_ms = max(float(request.args.get('interval_ms', 5)), 1.0)
+    except ValueError:
+        return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+    
+    profiler.interval = interval_ms / 1000
+    if not profiler.start(ignore_threads=[threading.get_ident()]):
+        return jsonify({'error': 'A profile is already running'}), 409
+    try:
+        time.sleep(seconds)
+    finally:
+        profiler.stop()
+    
+    if request.args.get('format') == 'collapsed':
+        return Response(profiler.collapsed(), mimetype='text/plain')
+    return jsonify(profiler.report())
+
+def parse_time(text):
+    """Epoch seconds from a number or an ISO 8601 time (UTC unless it has an offset)"""
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    moment = datetime.datetime.fromisoformat(text)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment.timestamp()
+
+@app.route('/results', methods=['GET'])
+def query_results():
+    """Emotion distribution per client and time bucket, from the result log
+
+    Disabled unless RESULT_LOG_DIR and RESULT_LOG_TOKEN are set; the token must
+    be sent in the X-Results-Token header. ?start= and ?end= (epoch seconds or
+    ISO 8601) bound the time range, ?client= picks one client, ?bucket_seconds=N
+    (default 3600) sets the bucket length and ?by_client=0 combines all
+    clients. Covers the label set of the default model version (or
+    ?model_version=).
+    """
+    if RESULT_LOG_DIR is None or RESULT_LOG_TOKEN is None or request.headers.get('X-Results-Token') != RESULT_LOG_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if registry is None or registry.default is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+    try:
+        start = parse_time(request.args['start']) if request.args.get('start') else None
+        end = parse_time(request.args['end']) if request.args.get('end') else None
+        bucket_seconds = int(request.args.get('bucket_seconds', 3600))
+    except ValueError:
+        return jsonify({'error': 'start and end must be epoch seconds or ISO 8601 times, bucket_seconds an integer'}), 400
+    if bucket_seconds < 1:
+        return jsonify({'error': 'bucket_seconds must be at least 1'}), 400
+    by_client = request.args.get('by_client', '1').lower() not in ('0', 'false', 'no')
+    
+    try:
+        model_version = registry.acquire(request.args.get('model_version') or registry.default.version)
+    except UnknownVersion as e:
+        return jsonify({'error': e.args[0]}), 400
+    try:
+        log = result_log_for(model_version.labels)
+    finally:
+        model_version.release()
+    with timed_stage('results'):
+        groups = log.aggregate(start, end, request.args.get('client') or None, bucket_seconds, by_client)
+    for group in groups:
+        group['client'] = group.pop('source')
+    return jsonify({
+        'classes': list(log.classes),
+        'bucket_seconds': bucket_seconds,
+        'groups': groups
+    })
+
+def admin_allowed():
+    return MODEL_ADMIN_TOKEN is not None and request.headers.get('X-Admin-Token') == MODEL_ADMIN_TOKEN
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    """Loaded, draining and available model versions and the traffic split"""
+    if registry is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+    return jsonify(registry.status())
+
+@app.route('/models/load', methods=['POST'])
+def load_model():
+    """Load and warm up a version in the background: {"version": ..., "activate": false}
+
+    Every worker loads it (and keeps it loaded until it has been routed to
+    and replaced). Returns 202 at once; poll GET /models until the version
+    shows up as loaded.
+    """
+    if not admin_allowed():
+        return jsonify({'error': 'Not found'}), 404
+    if registry is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+    data = request.get_json(silent=True) or {}
+    version = data.get('version')
+    if version not in registry.status()['available']:
+        return jsonify({'error': f'No model/encoder pair for version {version} in {MODEL_DIR}'}), 400
+    try:
+        if data.get('activate'):
+            registry.publish(default=version)
+        else:
+            registry.publish(standby=[version])
+    except OSError as e:
+        return routing_write_error(e)
+    return jsonify({'status': 'loading', 'version': version, 'pid': os.getpid()}), 202
+
+def routing_write_error(e):
+    return jsonify({'error': f'Could not write routing file {MODEL_ROUTING_FILE}: {e}', 'pid': os.getpid()}), 503
+
+@app.route('/models/activate', methods=['POST'])
+def activate_model():
+    """Make a version the default, loading it first if needed: {"version": ...}"""
+    if not admin_allowed():
+        return jsonify({'error': 'Not found'}), 404
+    if registry is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+    data = request.get_json(silent=True) or {}
+    try:
+        registry.activate(data.get('version'))
+    except UnknownVersion as e:
+        return jsonify({'error': e.args[0]}), 400
+    except OSError as e:
+        return routing_write_error(e)
+    return jsonify(registry.status())
+
+@app.route('/models/split', methods=['PUT'])
+def set_model_split():
+    """Replace the traffic split: {"weights": {"<version>": 90, "<version>": 10}}; {} clears it"""
+    if not admin_allowed():
+        return jsonify({'error': 'Not found'}), 404
+    if registry is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+    data = request.get_json(silent=True) or {}
+    weights = data.get('weights')
+    if not isinstance(weights, dict):
+        return jsonify({'error': 'weights must be an object of version -> weight'}), 400
+    try:
+        registry.set_split(weights)
+    except UnknownVersion as e:
+        return jsonify({'error': e.args[0]}), 400
+    except (TypeError, ValueError):
+        return jsonify({'error': 'weights must be numbers'}), 400
+    except OSError as e:
+        return routing_write_error(e)
+    return jsonify(registry.status())
+
+@app.route('/models/scan', methods=['POST'])
+def scan_models_now():
+    """Check MODEL_DIR for new versions now instead of waiting for the watcher
+
+    Only this worker scans; with auto-activation a new version it activates
+    goes through the routing file, so the other workers follow.
+    """
+    if not admin_allowed():
+        return jsonify({'error': 'Not found'}), 404
+    if registry is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+    threading.Thread(target=registry.poll, name='model-scan', daemon=True).start()
+    return jsonify({'status': 'scanning', 'pid': os.getpid()}), 202
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_audio_batch():
+    """API endpoint to analyze many audio files in one request
+
+    Accepts either JSON with an `audio_urls` list or a multipart form with one or
+    more audio files. Results are streamed back as NDJSON, one line per item.
+    Batches are bulk work unless they send `X-Priority: interactive`.
+    """
+    # Check if model is loaded
+    if not model_ready.is_set():
+        try:
+            startup()
+        except Exception as e:
+            return jsonify({
+                'error': f'Failed to load model: {str(e)}'
+            }), 500
+    
+    try:
+        ticket = admit_request('bulk', BATCH_REQUEST_TIMEOUT)
+    except (ValueError, Rejected, DeadlineExceeded) as e:
+        return admission_error(e)
+    try:
+        response = app.make_response(analyze_batch_admitted())
+    except Exception:
+        if ticket is not None:
+            ticket.release()
+        raise
+    if ticket is not None:
+        # Results are streamed, so the slot is held until the last line is sent
+        response.call_on_close(ticket.release)
+    return response
+
+def analyze_batch_admitted():
+    """Parse and serve an /analyze/batch request that holds a work slot"""
+    # Collect the work items: (source, loader, argument)
+    jobs = []
+    if request.is_json:
+        data = request.get_json()
+        audio_urls = data.get('audio_urls') if isinstance(data, dict) else None
+        if not isinstance(audio_urls, list) or not audio_urls:
+            return jsonify({'error': 'No audio_urls list provided'}), 400
+        for audio_url in audio_urls:
+            jobs.append((audio_url, functools.partial(prepare_url, deadline=request_deadline()), audio_url))
+    elif request.mimetype == 'multipart/form-data':
+        try:
+            form, uploads = read_batch_form()
+        except UploadTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        except InvalidAudio as e:
+            return jsonify({'error': str(e)}), 400
+        if not uploads:
+            return jsonify({'error': 'No audio files provided'}), 400
+        for source, audio in uploads:
+            jobs.append((source, prepare_bytes, audio))
+    else:
+        return jsonify({'error': 'Request must be JSON or multipart/form-data'}), 400
+    
+    if len(jobs) > MAX_BATCH_ITEMS:
+        return jsonify({'error': f'Too many items: at most {MAX_BATCH_ITEMS} per request'}), 413
+    try:
+        top_k = parse_top_k(data if request.is_json else form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Every item in the batch is served by the same model version
+    try:
+        model_version = acquire_model_version(data if request.is_json else None)
+    except UnknownVersion as e:
+        return jsonify({'error': e.args[0]}), 400
+    labels = model_version.labels
+    deadline = request_deadline()
+    client = client_key()
+    
+    def ndjson_line(item):
+        return to_json(item) + '\n'
+    
+    def generate():
+        # Download, decode and extract features concurrently. Each item goes to
+        # the shared batcher as soon as its features are ready (the batcher
+        # coalesces items that arrive close together) and its result is
+        # streamed as soon as its prediction returns. Futures map to
+        # (index, source, prepared); prepared is set once a future is a prediction.
+        batcher = model_version.batchers['analyze']
+        pending = {
+            batch_executor.submit(loader, argument, model_version): (index, source, None)
+            for index, (source, loader, argument) in enumerate(jobs)
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, source, prepared = pending.pop(future)
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    # Report failed items as soon as they fail
+                    yield ndjson_line({'index': index, 'source': source, 'error': f'Analysis failed: {str(e)}'})
+                    continue
+                if prepared is not None:
+                    log_results(labels, client, outcome)
+                    remember_result(prepared, outcome[0], model_version)
+                    yield ndjson_line({'index': index, 'source': source, 'result': labels.format(outcome[0], top_k)})
+                    continue
+                prepared = outcome
+                if prepared.features is None and prepared.scores is None:
+                    # No speech, so no inference either
+                    yield ndjson_line({'index': index, 'source': source, 'result': labels.no_speech(top_k)})
+                elif prepared.scores is not None:
+                    # Cached items need no inference
+                    remember_result(prepared, prepared.scores, model_version)
+                    log_results(labels, client, np.asarray(prepared.scores)[np.newaxis])
+                    yield ndjson_line({'index': index, 'source': source,
+                                       'result': labels.format(prepared.scores, top_k)})
+                else:
+                    try:
+                        pending[batcher.submit(prepared.features, deadline=deadline)] = (index, source, prepared)
+                    except Exception as e:
+                        yield ndjson_line({'index': index, 'source': source, 'error': f'Analysis failed: {str(e)}'})
+    
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.call_on_close(model_version.release)
+    return response
+
 if __name__ == '__main__':
-    # Load model on startup
-    load_model_and_encoder()
+    # Load and warm up the model on startup
+    startup()
     
-    # Start the Flask server
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    # Start the Flask development server (use serve.py in production)
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG') == '1') 
\ No newline at end of file
@@ -0,0 +1,114 @@
+# profiler.py
+# Low-overhead sampling profiler that can be switched on in a running server
+
+import collections
+import os
+import sys
+import threading
+import time
+
+class SamplingProfiler:
+    """Periodically sample the Python stacks of all other threads
+
+    A background thread wakes every interval, reads sys._current_frames() and
+    counts each stack, so the cost is proportional to the sampling rate rather
+    than to the work being profiled, and nothing is instrumented while the
+    profiler is off. Results are reported as collapsed stacks (the input format
+    of flamegraph.pl / speedscope) and as per-function sample counts.
+    """
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._ignore = set()
+        self._stacks = collections.Counter()
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0.0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, ignore_threads=()):
+        """Start sampling; returns False if a profile is already being taken
+
+        ignore_threads lists thread ids to leave out, e.g. the caller that
+        is sleeping while the profile is taken.
+        """
+        with self._lock:
+            if self.running:
+                return False
+            self._stacks = collections.Counter()
+            self.samples = 0
+            self._ignore = set(ignore_threads)
+            self._stop.clear()
+            self.started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._sample_loop, name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        """Stop sampling and keep the collected stacks"""
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+            self.duration = time.monotonic() - self.started_at
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        base = os.path.dirname(os.path.abspath(__file__))
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or thread_id in self._ignore:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    filename = code.co_filename
+                    if filename.startswith(base):
+                        filename = os.path.relpath(filename, base)
+                    else:
+                        filename = os.path.basename(filename)
+                    stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                # Idle threads blocked in the standard library are not interesting
+                if stack and not _is_idle(stack[0]):
+                    self._stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Collapsed stack lines: 'outer;...;inner count'"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self._stacks.most_common()) + '\n'
+
+    def top_functions(self, limit=25):
+        """Functions by samples where they were running (self) and on the stack (total)"""
+        own = collections.Counter()
+        total = collections.Counter()
+        for stack, count in self._stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        return [
+            {'function': name, 'self_samples': own[name], 'total_samples': total[name]}
+            for name, _ in total.most_common(limit)
+        ]
+
+    def report(self, limit=25):
+        return {
+            'duration_seconds': self.duration,
+            'interval_ms': self.interval * 1000,
+            'samples': self.samples,
+            'top_functions': self.top_functions(limit),
+        }
+
+# Innermost frames of threads that are waiting rather than working
+_IDLE_FUNCTIONS = ('wait (threading.py', 'select (selectors.py', '_worker (thread.py',
+                   'accept (socket.py', 'serve_forever (socketserver.py', 'get (queue.py')
+
+def _is_idle(frame):
+    return frame.startswith(_IDLE_FUNCTIONS)
@@ -0,0 +1,246 @@
+# result_cache.py
+# Two-level, content-addressed cache of analysis results
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+def audio_hasher():
+    """Incremental form of audio_digest for audio that arrives in chunks"""
+    return hashlib.sha256()
+
+def audio_digest(data):
+    """Content hash identifying a piece of audio independent of its URL"""
+    hasher = audio_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+def _entry_size(key, arrays):
+    """Approximate memory footprint of a cache entry in bytes"""
+    return len(key) + sum(array.nbytes for array in arrays.values()) + 256
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded by total entry size in bytes"""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, arrays):
+        size = _entry_size(key, arrays)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (arrays, size)
+            self.current_bytes += size
+
+            # Evict least recently used entries until we fit again
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+class DiskCache:
+    """Directory of .npz files, one per cache entry, bounded by total size
+
+    Entries are pruned least recently used first (a hit refreshes the file's
+    mtime) once the bytes written since the last scan push the estimated
+    total over max_bytes. Pruning rescans the directory, so files written by
+    other server processes sharing it are counted too, and deletes down to
+    90% of max_bytes. A corrupt or truncated file is deleted and reported as
+    a miss.
+    """
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.corrupt = 0
+        self.current_bytes = sum(size for _, _, size in self._scan())
+
+    def _path(self, key):
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name[:2], name + '.npz')
+
+    def _scan(self):
+        """(mtime, path, size) of every entry file"""
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.npz'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Truncated or corrupt entry (BadZipFile, bad header, ...): drop it
+            print(f"Removing unreadable result cache entry {path}: {e}")
+            self._remove(path)
+            with self._lock:
+                self.corrupt += 1
+            return None
+        try:
+            # Mark as recently used for pruning
+            os.utime(path)
+        except OSError:
+            pass
+        return arrays
+
+    def put(self, key, arrays):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        with self._lock:
+            self.current_bytes += size
+            if self.max_bytes is not None and self.current_bytes > self.max_bytes:
+                self._prune()
+
+    def _prune(self):
+        """Delete the least recently used entries down to 90% of max_bytes (lock held)"""
+        entries = sorted(self._scan())
+        total = sum(size for _, _, size in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, path, size in entries:
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+            self.evictions += 1
+        self.current_bytes = total
+
+class ResultCache:
+    """Cache analysis results at two levels
+
+    Level 1 maps (URL, ETag) to prediction scores, so an unchanged remote file
+    is answered without downloading it. Level 2 maps a hash of the audio bytes
+    to the extracted features and prediction scores, so the same audio under a
+    different URL skips decoding, feature extraction and inference. Both levels
+    are keyed by model version (within namespace, e.g. the inference backend)
+    and share an LRU memory tier with an optional on-disk tier behind it.
+    """
+    def __init__(self, namespace, max_memory_bytes=64 * 1024 * 1024, disk_dir=None, max_disk_bytes=None):
+        self.namespace = namespace
+        self.memory = LRUCache(max_memory_bytes)
+        self.disk = DiskCache(disk_dir, max_disk_bytes) if disk_dir else None
+        self._lock = threading.Lock()
+        self.counters = {
+            'url_hits': 0,
+            'url_misses': 0,
+            'audio_hits': 0,
+            'audio_misses': 0,
+            'disk_hits': 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _get(self, key):
+        arrays = self.memory.get(key)
+        if arrays is None and self.disk is not None:
+            arrays = self.disk.get(key)
+            if arrays is not None:
+                self._count('disk_hits')
+                # Promote to the memory tier
+                self.memory.put(key, arrays)
+        return arrays
+
+    def _put(self, key, arrays):
+        self.memory.put(key, arrays)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, arrays)
+            except OSError as e:
+                print(f"Error writing result cache entry: {e}")
+
+    def get_url(self, model_version, url, etag):
+        """Return cached prediction scores for (url, etag), or None"""
+        arrays = self._get(f"url:{self.namespace}:{model_version}:{etag}:{url}")
+        self._count('url_hits' if arrays is not None else 'url_misses')
+        return None if arrays is None else arrays['scores']
+
+    def put_url(self, model_version, url, etag, scores):
+        self._put(f"url:{self.namespace}:{model_version}:{etag}:{url}", {'scores': np.asarray(scores)})
+
+    def get_audio(self, model_version, digest):
+        """Return cached (features, scores) for an audio content hash, or None"""
+        arrays = self._get(f"audio:{self.namespace}:{model_version}:{digest}")
+        self._count('audio_hits' if arrays is not None else 'audio_misses')
+        return None if arrays is None else (arrays['features'], arrays['scores'])
+
+    def put_audio(self, model_version, digest, features, scores):
+        self._put(f"audio:{self.namespace}:{model_version}:{digest}", {
+            'features': np.asarray(features),
+            'scores': np.asarray(scores),
+        })
+
+    def stats(self):
+        """Return hit/miss counters and memory and disk tier usage"""
+        with self._lock:
+            stats = dict(self.counters)
+        stats.update({
+            'memory_entries': len(self.memory),
+            'memory_bytes': self.memory.current_bytes,
+            'memory_max_bytes': self.memory.max_bytes,
+            'memory_evictions': self.memory.evictions,
+            'disk_enabled': self.disk is not None,
+        })
+        if self.disk is not None:
+            stats.update({
+                'disk_bytes': self.disk.current_bytes,
+                'disk_max_bytes': self.disk.max_bytes or 0,
+                'disk_evictions': self.disk.evictions,
+                'disk_corrupt': self.disk.corrupt,
+            })
+        return stats
@@ -0,0 +1,379 @@
+# result_log.py
+# Append-only columnar log of analysis results with hourly rollups for aggregate queries
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from label_schema import SENTIMENTS, sentiment_for
+
+# Bump when the segment layout changes, so old logs are not misread
+LOG_FORMAT = 1
+SEGMENT_ROWS = 65536     # rows buffered in memory before a segment is written
+FLUSH_SECONDS = 60.0     # oldest buffered row age that also triggers a write
+ROLLUP_SECONDS = 3600    # granularity of the per-segment rollups
+
+def group_rows(sources, buckets):
+    """Group (source, bucket) pairs: the source and bucket of each group, and each row's group"""
+    sources = np.asarray(sources, dtype=np.int64)
+    buckets = np.asarray(buckets, dtype=np.int64)
+    # One int64 key per pair sorts far faster than unique rows of a 2-D array
+    low = int(buckets.min())
+    span = int(buckets.max()) - low + 1
+    keys, inverse = np.unique(sources * span + (buckets - low), return_inverse=True)
+    return keys // span, keys % span + low, inverse.ravel()
+
+def group_sums(inverse, n_groups, values):
+    """Column sums of values (rows x columns) per group"""
+    return np.stack([np.bincount(inverse, weights=values[:, j], minlength=n_groups)
+                     for j in range(values.shape[1])], axis=1)
+
+def summarize(times, sources, emotions, confidences, scores, bucket_seconds, n_classes):
+    """Group rows by (source, time bucket) and total them
+
+    Returns per-group arrays: source ids, bucket indices (time //
+    bucket_seconds), emotion counts (groups x classes), confidence sums and
+    score sums (groups x classes).
+    """
+    buckets = np.floor_divide(times, bucket_seconds)
+    group_sources, group_buckets, inverse = group_rows(sources, buckets)
+    n_groups = len(group_sources)
+    counts = np.bincount(inverse * n_classes + emotions, minlength=n_groups * n_classes).reshape(n_groups, n_classes)
+    confidence_sums = np.bincount(inverse, weights=confidences, minlength=n_groups)
+    return group_sources, group_buckets, counts, confidence_sums, group_sums(inverse, n_groups, scores)
+
+class ResultLog:
+    """Analysis results of one label set, as compact columns on disk
+
+    Each row holds a timestamp (float64 epoch seconds), a source id (uint32),
+    the predicted emotion and its sentiment (uint8 indices into classes and
+    label_schema.SENTIMENTS), the confidence and the per-class scores
+    (float16): about 16 + 2 * len(classes) bytes. Rows are buffered in
+    preallocated arrays and written as an immutable segment directory of .npy
+    columns once segment_rows are waiting or the oldest is flush_seconds old.
+    A segment is built under a temporary name, renamed into place and only then
+    appended to segments.tsv (with its row count and time range), so readers
+    never see a partial segment. Source names are dictionary-encoded per
+    segment, so several processes can append to the same log.
+
+    Every segment also stores hourly rollups (emotion counts, confidence and
+    score sums per source and hour). aggregate() answers hour-aligned queries
+    from the rollups alone and memory-maps the row columns otherwise, one
+    segment at a time, so queries over millions of rows never load them all.
+
+    Each label set gets its own directory under root, named after a hash of
+    the classes, so emotion indices always mean the same thing.
+    """
+    def __init__(self, root, classes, segment_rows=SEGMENT_ROWS, flush_seconds=FLUSH_SECONDS):
+        self.classes = tuple(str(name) for name in classes)
+        if not 0 < len(self.classes) < 256:
+            raise ValueError("A result log holds between 1 and 255 classes")
+        self.sentiment_index = np.array([SENTIMENTS.index(sentiment_for(name)) for name in self.classes],
+                                        dtype=np.uint8)
+        schema = {'format': LOG_FORMAT, 'classes': list(self.classes)}
+        schema_id = hashlib.sha256(json.dumps(schema, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        self.directory = os.path.join(root, f"results-{schema_id}")
+        self.segment_rows = max(1, int(segment_rows))
+        self.flush_seconds = float(flush_seconds)
+        os.makedirs(self.directory, exist_ok=True)
+
+        schema_path = os.path.join(self.directory, 'schema.json')
+        if not os.path.exists(schema_path):
+            with open(schema_path, 'w') as f:
+                json.dump(schema, f, indent=2)
+
+        self._lock = threading.Lock()
+        self._buffer = self._allocate(self.segment_rows)
+        self._buffered = 0
+        self._buffer_started = None
+        self._source_ids = {}    # source name -> id in the buffer
+        self._source_names = []
+        self._segments = []      # (name, rows, first time, last time) from segments.tsv
+        self._manifest_offset = 0
+        self._rollups = {}       # segment name -> loaded rollup arrays
+        self.rows_appended = 0
+        self.segments_written = 0
+        self._refresh()
+
+    def _allocate(self, rows):
+        n_classes = len(self.classes)
+        return {
+            'time': np.zeros(rows, dtype=np.float64),
+            'source': np.zeros(rows, dtype=np.uint32),
+            'emotion': np.zeros(rows, dtype=np.uint8),
+            'sentiment': np.zeros(rows, dtype=np.uint8),
+            'confidence': np.zeros(rows, dtype=np.float16),
+            'scores': np.zeros((rows, n_classes), dtype=np.float16),
+        }
+
+    def _segment_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _refresh(self):
+        """Pick up segments appended to segments.tsv since the last read, by any process"""
+        path = os.path.join(self.directory, 'segments.tsv')
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            f.seek(self._manifest_offset)
+            for line in f:
+                # A line still being written is read again next time
+                if not line.endswith('\n'):
+                    break
+                self._manifest_offset += len(line)
+                fields = line.split()
+                if len(fields) == 4:
+                    self._segments.append((fields[0], int(fields[1]), float(fields[2]), float(fields[3])))
+
+    def append(self, source, scores, timestamp=None):
+        """Log one result: a source (user, client or stream id) and its class probabilities"""
+        self.append_batch(source, np.asarray(scores)[np.newaxis],
+                          None if timestamp is None else [timestamp])
+
+    def append_batch(self, source, scores, timestamps=None):
+        """Log rows of class probabilities from one source (timestamps default to now)"""
+        scores = np.asarray(scores, dtype=np.float32)
+        if scores.ndim != 2 or scores.shape[1] != len(self.classes):
+            raise ValueError(f"Expected scores of shape (n, {len(self.classes)}), got {scores.shape}")
+        n = len(scores)
+        if n == 0:
+            return
+        now = time.time()
+        times = np.full(n, now) if timestamps is None else np.asarray(timestamps, dtype=np.float64)
+        emotions = scores.argmax(axis=1)
+        confidences = scores[np.arange(n), emotions]
+
+        source = str(source)
+        with self._lock:
+            offset = 0
+            while offset < n:
+                # Looked up per pass: a flush starts a new source dictionary
+                source_id = self._source_ids.get(source)
+                if source_id is None:
+                    source_id = self._source_ids[source] = len(self._source_names)
+                    self._source_names.append(source)
+                take = min(n - offset, self.segment_rows - self._buffered)
+                rows = slice(self._buffered, self._buffered + take)
+                batch = slice(offset, offset + take)
+                self._buffer['time'][rows] = times[batch]
+                self._buffer['source'][rows] = source_id
+                self._buffer['emotion'][rows] = emotions[batch]
+                self._buffer['sentiment'][rows] = self.sentiment_index[emotions[batch]]
+                self._buffer['confidence'][rows] = confidences[batch]
+                self._buffer['scores'][rows] = scores[batch]
+                if self._buffer_started is None:
+                    self._buffer_started = now
+                self._buffered += take
+                offset += take
+                if self._buffered >= self.segment_rows:
+                    self._flush()
+            self.rows_appended += n
+            if self._buffer_started is not None and now - self._buffer_started >= self.flush_seconds:
+                self._flush()
+
+    def flush(self):
+        """Write buffered rows as a new segment"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffered:
+            return
+        n = self._buffered
+        columns = {key: values[:n] for key, values in self._buffer.items()}
+
+        # Segment-local source dictionary: ids 0..k-1 for the sources in these rows
+        used, local = np.unique(columns['source'], return_inverse=True)
+        columns['source'] = local.ravel().astype(np.uint32)
+        sources = [self._source_names[i] for i in used.tolist()]
+        rollup = summarize(columns['time'], columns['source'], columns['emotion'],
+                           columns['confidence'].astype(np.float64), columns['scores'].astype(np.float64),
+                           ROLLUP_SECONDS, len(self.classes))
+
+        # Build the segment under a temporary name so readers never see it half written
+        name = f"segment-{uuid.uuid4().hex[:16]}"
+        temp_path = self._segment_path(name + '.tmp')
+        os.makedirs(temp_path)
+        try:
+            for key, values in columns.items():
+                np.save(os.path.join(temp_path, f"{key}.npy"), values)
+            with open(os.path.join(temp_path, 'sources.json'), 'w') as f:
+                json.dump(sources, f)
+            np.savez(os.path.join(temp_path, 'rollup.npz'), source=rollup[0], hour=rollup[1], counts=rollup[2],
+                     confidence_sums=rollup[3], score_sums=rollup[4])
+            os.rename(temp_path, self._segment_path(name))
+        except Exception:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+
+        first, last = float(columns['time'].min()), float(columns['time'].max())
+        with open(os.path.join(self.directory, 'segments.tsv'), 'a') as f:
+            f.write(f"{name}\t{n}\t{first!r}\t{last!r}\n")
+        self.segments_written += 1
+        self._buffered = 0
+        self._buffer_started = None
+        self._source_ids.clear()
+        self._source_names.clear()
+
+    def _load_rollup(self, name):
+        rollup = self._rollups.get(name)
+        if rollup is None:
+            with np.load(os.path.join(self._segment_path(name), 'rollup.npz')) as data:
+                rollup = self._rollups[name] = {key: data[key] for key in data.files}
+            with open(os.path.join(self._segment_path(name), 'sources.json')) as f:
+                rollup['sources'] = json.load(f)
+        return rollup
+
+    def _load_columns(self, name):
+        path = self._segment_path(name)
+        columns = {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode='r')
+                   for key in ('time', 'source', 'emotion', 'confidence', 'scores')}
+        with open(os.path.join(path, 'sources.json')) as f:
+            columns['sources'] = json.load(f)
+        return columns
+
+    def aggregate(self, start=None, end=None, source=None, bucket_seconds=ROLLUP_SECONDS, by_source=True):
+        """Emotion and sentiment distribution per source and time bucket
+
+        Covers rows with start <= time < end (epoch seconds, open-ended when
+        None), optionally of one source only. Buckets are bucket_seconds long
+        and aligned to the epoch; with by_source=False all sources are
+        combined. Queries whose bucket_seconds, start and end are whole hours
+        are answered from the hourly rollups. Returns a list of groups sorted
+        by source and bucket start.
+        """
+        bucket_seconds = int(bucket_seconds)
+        if bucket_seconds < 1:
+            raise ValueError("bucket_seconds must be at least 1")
+        use_rollups = bucket_seconds % ROLLUP_SECONDS == 0 and all(
+            t is None or float(t) % ROLLUP_SECONDS == 0 for t in (start, end))
+
+        with self._lock:
+            self._refresh()
+            segments = list(self._segments)
+            n = self._buffered
+            buffered = {key: values[:n].copy() for key, values in self._buffer.items()}
+            buffered['sources'] = list(self._source_names)
+
+        n_classes = len(self.classes)
+        source_ids = {}   # source name -> id across segments
+        parts = []
+
+        def add(sources, local_sources, buckets, counts, confidence_sums, score_sums):
+            """Keep one segment's group totals, with its source ids mapped to query-wide ones"""
+            if not by_source:
+                ids = np.zeros(len(local_sources), dtype=np.int64)
+            else:
+                lookup = np.array([source_ids.setdefault(name, len(source_ids)) for name in sources],
+                                  dtype=np.int64)
+                ids = lookup[local_sources]
+            parts.append((ids, buckets, counts, confidence_sums, score_sums))
+
+        def scan(columns):
+            """Summarize the matching rows of one segment (or the buffer)"""
+            times = columns['time']
+            mask = np.ones(len(times), dtype=bool)
+            if start is not None:
+                mask &= times >= start
+            if end is not None:
+                mask &= times < end
+            if source is not None:
+                if source not in columns['sources']:
+                    return
+                mask &= columns['source'] == columns['sources'].index(source)
+            rows = np.flatnonzero(mask)
+            if len(rows) == 0:
+                return
+            add(columns['sources'], *summarize(
+                times[rows], columns['source'][rows], columns['emotion'][rows],
+                columns['confidence'][rows].astype(np.float64), columns['scores'][rows].astype(np.float64),
+                bucket_seconds, n_classes))
+
+        for name, rows, first, last in segments:
+            # Segments entirely outside the time range are never opened
+            if (start is not None and last < start) or (end is not None and first >= end):
+                continue
+            if not use_rollups:
+                scan(self._load_columns(name))
+                continue
+            rollup = self._load_rollup(name)
+            hour_starts = rollup['hour'] * ROLLUP_SECONDS
+            mask = np.ones(len(hour_starts), dtype=bool)
+            if start is not None:
+                mask &= hour_starts >= start
+            if end is not None:
+                mask &= hour_starts < end
+            if source is not None:
+                if source not in rollup['sources']:
+                    continue
+                mask &= rollup['source'] == rollup['sources'].index(source)
+            rows = np.flatnonzero(mask)
+            if len(rows):
+                add(rollup['sources'], rollup['source'][rows], hour_starts[rows] // bucket_seconds,
+                    rollup['counts'][rows], rollup['confidence_sums'][rows], rollup['score_sums'][rows])
+        scan(buffered)
+        if not parts:
+            return []
+
+        # Merge the per-segment totals of groups that span several segments
+        ids, buckets, counts, confidence_sums, score_sums = (np.concatenate(column) for column in zip(*parts))
+        group_ids, group_buckets, inverse = group_rows(ids, buckets)
+        n_groups = len(group_ids)
+        counts = group_sums(inverse, n_groups, counts).astype(np.int64)
+        confidence_sums = np.bincount(inverse, weights=confidence_sums, minlength=n_groups)
+        score_sums = group_sums(inverse, n_groups, score_sums)
+
+        if by_source:
+            # Ids were handed out in the order sources were met; renumber them by name
+            names = sorted(source_ids)
+            renumber = np.empty(len(names), dtype=np.int64)
+            renumber[[source_ids[name] for name in names]] = np.arange(len(names))
+            group_ids = renumber[group_ids]
+        else:
+            names = [None]
+        order = np.lexsort((group_buckets, group_ids))
+        totals = counts.sum(axis=1)
+        sentiments = counts @ np.eye(len(SENTIMENTS), dtype=np.int64)[self.sentiment_index]
+        mean_confidences = confidence_sums / np.maximum(totals, 1)
+        mean_scores = score_sums / np.maximum(totals, 1)[:, np.newaxis]
+        results = []
+        for i in order.tolist():
+            results.append({
+                'source': names[group_ids[i]],
+                'start': int(group_buckets[i]) * bucket_seconds,
+                'count': int(totals[i]),
+                'emotions': dict(zip(self.classes, counts[i].tolist())),
+                'sentiments': {name: value for name, value in zip(SENTIMENTS, sentiments[i].tolist()) if value},
+                'mean_confidence': float(mean_confidences[i]),
+                'mean_scores': dict(zip(self.classes, mean_scores[i].tolist())),
+            })
+        return results
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {
+                'rows': sum(rows for _, rows, _, _ in self._segments) + self._buffered,
+                'segments': len(self._segments),
+                'buffered_rows': self._buffered,
+                'rows_appended': self.rows_appended,
+                'segments_written': self.segments_written,
+                'bytes_per_row': sum(values[:1].nbytes for values in self._buffer.values()),
+                'directory': self.directory,
+            }
+
+    def close(self):
+        self.flush()
+        self._rollups.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
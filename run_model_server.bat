@@ -3,6 +3,6 @@ echo Starting Voice Emotion Analysis Model Server...
 echo Make sure you have installed the required dependencies:
 echo pip install -r requirements.txt
 
-python model_server.py
+python serve.py
 
 pause 
\ No newline at end of file
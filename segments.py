@@ -0,0 +1,84 @@
+# segments.py
+# Sliding-window analysis of long recordings in bounded memory
+
+import numpy as np
+
+from audio_features import DURATION, HOP_LENGTH, N_FFT, N_MFCC, SAMPLE_RATE
+from streaming import RingBuffer, StreamingFeatureExtractor
+
+# Defaults for segmented analysis
+SEGMENT_HOP_SECONDS = 1.5   # window step; 3 s windows overlap by half
+SEGMENT_BATCH_SIZE = 32     # windows per model call
+
+def hop_samples_for(hop_seconds, sr=SAMPLE_RATE, hop_length=HOP_LENGTH):
+    """Window step in samples, rounded to whole STFT hops so frames are shared"""
+    return max(1, int(round(hop_seconds * sr / hop_length))) * hop_length
+
+def iter_segment_batches(blocks, feature_type='mfcc', normalize=False, sr=SAMPLE_RATE,
+                         duration=DURATION, hop_seconds=SEGMENT_HOP_SECONDS,
+                         batch_size=SEGMENT_BATCH_SIZE, n_mfcc=N_MFCC, vad=None):
+    """Cut a stream of waveform blocks into overlapping windows and featurize them
+
+    Yields (spans, features) where spans is a list of (start, end) times in
+    seconds and features has shape (len(spans), n_features, n_frames). Audio
+    passes through a ring buffer a few windows long and mel frames are shared
+    between overlapping windows, so memory depends on batch_size, not on the
+    length of the recording. The last window is zero-padded to full length, as
+    is the only window of a recording shorter than duration.
+
+    With a VoiceActivityDetector as vad, yields (spans, features, speech)
+    instead, where speech marks the windows that passed the gate. Features are
+    still computed for every window (later windows share their frames); the
+    caller saves the inference.
+    """
+    window = int(sr * duration)
+    hop = hop_samples_for(hop_seconds, sr)
+    buffer = RingBuffer(window + 2 * hop + N_FFT)
+    extractor = StreamingFeatureExtractor(buffer, feature_type=feature_type, normalize=normalize,
+                                          sr=sr, duration=duration, n_mfcc=n_mfcc)
+
+    spans = []
+    features = []
+    waveforms = []
+    next_end = window
+
+    def take_window(total):
+        start = next_end - window
+        spans.append((start / sr, min(next_end, total) / sr))
+        features.append(extractor.features_at(next_end))
+        if vad is not None:
+            waveforms.append(buffer.read(start, next_end))
+
+    def batch():
+        if vad is None:
+            return spans, np.stack(features)
+        return spans, np.stack(features), vad.gate(np.stack(waveforms))
+
+    for block in blocks:
+        # Write at most one hop at a time so no window is overwritten before use
+        for offset in range(0, len(block), hop):
+            buffer.write(block[offset:offset + hop])
+            while buffer.total_written >= next_end:
+                take_window(buffer.total_written)
+                next_end += hop
+                if len(features) == batch_size:
+                    yield batch()
+                    spans, features, waveforms = [], [], []
+
+    # Cover the tail (or a recording shorter than one window) with a padded window
+    total = buffer.total_written
+    covered = next_end - hop if total >= window else 0
+    if total > covered:
+        buffer.write(np.zeros(next_end - total, dtype=np.float32))
+        take_window(total)
+    if features:
+        yield batch()
+
+def summarize_segments(scores):
+    """Aggregate per-window class probabilities into one verdict
+
+    Returns (mean probabilities, fraction of windows won by each class).
+    """
+    scores = np.asarray(scores)
+    shares = np.bincount(scores.argmax(axis=1), minlength=scores.shape[1]) / len(scores)
+    return scores.mean(axis=0), shares
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# serve.py
+# Production entry point for the voice emotion model server
+#
+# On Linux/macOS this runs gunicorn with N pre-forked workers, each loading the
+# model once after fork. On Windows, where gunicorn is unavailable, it falls
+# back to a single multi-threaded waitress process.
+
+import os
+import sys
+
+import model_server
+
+BIND = os.environ.get('BIND', '0.0.0.0:5000')
+WORKERS = int(os.environ.get('WORKERS', 2))            # pre-forked processes
+# Request threads per process. Work in progress is bounded by model_server's
+# admission control, and a request waiting in its queue holds a thread, so
+# there are more threads than ADMISSION_MAX_ACTIVE work slots. Each open live
+# stream holds a thread too: model_server reads THREADS to admit at most
+# THREADS - STREAM_RESERVED_THREADS streams and to keep threads for /health
+THREADS = int(os.environ.get('THREADS', 32))
+# Seconds without a heartbeat before gunicorn restarts a worker process. This
+# catches a hung process, not a slow request: request threads are bounded by
+# model_server's per-request deadline (REQUEST_TIMEOUT) instead
+WORKER_TIMEOUT = int(os.environ.get('WORKER_TIMEOUT', 120))
+GRACEFUL_TIMEOUT = int(os.environ.get('GRACEFUL_TIMEOUT', 30)) # seconds to finish in-flight requests on shutdown
+KEEPALIVE = int(os.environ.get('KEEPALIVE', 5))
+
+def post_worker_init(worker):
+    """Load and warm up the model once in each worker, before it accepts requests"""
+    model_server.startup()
+
+def worker_exit(server, worker):
+    """Let queued inference finish and stop feature workers on shutdown"""
+    model_server.shutdown()
+
+def run_gunicorn():
+    """Serve with gunicorn's pre-forking gthread workers"""
+    from gunicorn.app.base import BaseApplication
+
+    class ModelServerApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return model_server.app
+
+    ModelServerApplication({
+        'bind': BIND,
+        'workers': WORKERS,
+        # Threaded workers: slow downloads occupy a request thread while the
+        # batcher thread keeps running inference for everyone else
+        'worker_class': 'gthread',
+        'threads': THREADS,
+        'timeout': WORKER_TIMEOUT,
+        'graceful_timeout': GRACEFUL_TIMEOUT,
+        'keepalive': KEEPALIVE,
+        # Import the app (but not TensorFlow) once in the master and share it
+        'preload_app': True,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }).run()
+
+def run_waitress():
+    """Serve with a single multi-threaded waitress process (Windows)"""
+    import waitress
+
+    model_server.startup()
+    try:
+        waitress.serve(
+            model_server.app,
+            listen=BIND,
+            threads=THREADS,
+            channel_timeout=WORKER_TIMEOUT
+        )
+    finally:
+        model_server.shutdown()
+
+if __name__ == '__main__':
+    if sys.platform == 'win32':
+        run_waitress()
+    else:
+        run_gunicorn()
@@ -0,0 +1,454 @@
+# streaming.py
+# Ring buffer, incremental feature extraction and audio sources for live analysis
+
+import concurrent.futures
+import threading
+import time
+
+import numpy as np
+
+from audio_decode import load_audio_file, soxr_quality
+from audio_features import (DURATION, HOP_LENGTH, N_FFT, N_MFCC, SAMPLE_RATE,
+                            features_from_mel, get_extractor)
+
+CHUNK_SIZE = 1024   # samples per read from an audio source
+
+class BufferOverrun(Exception):
+    """Raised when requested samples have already been overwritten"""
+
+class RingBuffer:
+    """Preallocated single-producer / single-consumer sample buffer
+
+    Positions are absolute sample indices since the stream started. The writer
+    never blocks and never reallocates: new samples overwrite the oldest ones.
+    Readers take no lock either; a read copies the samples out and then checks
+    that the writer did not reach them during the copy, raising BufferOverrun
+    if it did. Counter updates are single attribute stores, which are atomic
+    under the GIL.
+    """
+    def __init__(self, capacity, dtype=np.float32):
+        self.capacity = int(capacity)
+        self._data = np.zeros(self.capacity, dtype=dtype)
+        self._written = 0    # samples visible to readers
+        self._reserved = 0   # samples the writer may be overwriting right now
+
+    @property
+    def total_written(self):
+        """Absolute position one past the newest readable sample"""
+        return self._written
+
+    def write(self, samples):
+        """Append samples, overwriting the oldest data when full (writer thread only)"""
+        samples = np.asarray(samples, dtype=self._data.dtype).ravel()
+        start = self._written
+        if len(samples) > self.capacity:
+            # Only the newest capacity samples can be kept
+            start += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        end = start + len(samples)
+
+        self._reserved = end
+        offset = start % self.capacity
+        first = min(len(samples), self.capacity - offset)
+        self._data[offset:offset + first] = samples[:first]
+        self._data[:len(samples) - first] = samples[first:]
+        self._written = end
+
+    def read(self, start, stop, out=None):
+        """Copy samples [start, stop) into out (or a new array) and return it"""
+        if stop > self._written:
+            raise ValueError(f"Samples up to {stop} requested, only {self._written} written")
+        n = stop - start
+        if out is None:
+            out = np.empty(n, dtype=self._data.dtype)
+        if n > 0:
+            offset = start % self.capacity
+            first = min(n, self.capacity - offset)
+            out[:first] = self._data[offset:offset + first]
+            out[first:n] = self._data[:n - first]
+        # A write in progress may have overwritten the oldest part of the copy
+        if start < self._reserved - self.capacity:
+            raise BufferOverrun(f"Samples from {start} were overwritten (oldest is {self._reserved - self.capacity})")
+        return out
+
+    def latest(self, n):
+        """Copy of the newest n samples (fewer if less has been written)"""
+        stop = self._written
+        return self.read(max(0, stop - n), stop)
+
+class StreamingFeatureExtractor:
+    """Incrementally compute model features over a sliding window of a stream
+
+    Mel power frames are cached as the stream advances, so each window only
+    runs the STFT for frames that were not needed by an earlier window. Windows
+    start on hop boundaries, which makes every interior frame identical to one
+    computed for the previous window; the few frames at each edge see the
+    window's zero padding and are recomputed. The dB scaling, DCT and
+    standardization depend on the whole window and run per call, but operate on
+    the small (n_mels, n_frames) matrix rather than on audio.
+    """
+    def __init__(self, buffer, feature_type='mfcc', normalize=True, sr=SAMPLE_RATE,
+                 duration=DURATION, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH):
+        self.buffer = buffer
+        self.feature_type = feature_type
+        self.normalize = normalize
+        self.extractor = get_extractor(sr=sr, n_fft=n_fft, hop_length=hop_length, n_mfcc=n_mfcc)
+        self.hop_length = hop_length
+        self.window_samples = int(sr * duration)
+        self.n_frames = self.extractor.n_frames(self.window_samples)
+
+        # Window frames [0, first_interior) and [last_interior, n_frames) overlap the padding
+        pad = n_fft // 2
+        self._pad = pad
+        self.first_interior = -(-pad // hop_length)
+        self.last_interior = (self.window_samples - pad) // hop_length + 1
+
+        # Cached mel power of stream frames, indexed by frame number modulo n_frames
+        self._cache = np.zeros((self.extractor.n_mels, self.n_frames), dtype=np.float32)
+        self._cache_from = 0   # oldest stream frame held in the cache
+        self._cache_to = 0     # one past the newest stream frame held
+        self._mel = np.empty((1, self.extractor.n_mels, self.n_frames), dtype=np.float32)
+        self._samples = np.empty(self.window_samples, dtype=np.float32)
+
+        self.frames_computed = 0
+        self.windows = 0
+
+    def window_start(self, end):
+        """Hop-aligned start of the newest full window ending at or before end, or None"""
+        if end < self.window_samples:
+            return None
+        return (end - self.window_samples) // self.hop_length * self.hop_length
+
+    def _stream_frames(self, first, last):
+        """Cache mel power for stream frames [first, last), each centred on frame * hop"""
+        if first < self._cache_from or first > self._cache_to:
+            # A gap (or a jump back): restart the cache at first
+            self._cache_from = self._cache_to = first
+        first = max(first, self._cache_to)
+        if first >= last:
+            return
+        samples = self.buffer.read(first * self.hop_length - self._pad, (last - 1) * self.hop_length + self._pad)
+        mel = self.extractor.mel_power(samples[np.newaxis], center=False)[0]
+        self._cache[:, np.arange(first, last) % self.n_frames] = mel
+        self.frames_computed += last - first
+        self._cache_to = last
+        self._cache_from = max(self._cache_from, last - self.n_frames)
+
+    def _edge_frames(self, samples, frames):
+        """Mel power of window frames that extend into the zero padding"""
+        if not len(frames):
+            return None
+        pad = self._pad
+        lo = frames[0] * self.hop_length - pad
+        hi = frames[-1] * self.hop_length + pad
+        segment = np.zeros(hi - lo, dtype=np.float32)
+        segment[max(0, -lo):len(segment) - max(0, hi - len(samples))] = samples[max(0, lo):min(hi, len(samples))]
+        return self.extractor.mel_power(segment[np.newaxis], center=False)[0]
+
+    def features_at(self, end):
+        """Features of shape (n_features, n_frames) for the window ending at or before end
+
+        Returns None until a full window has been written. Raises BufferOverrun
+        if the window has already been overwritten in the ring buffer.
+        """
+        start = self.window_start(end)
+        if start is None:
+            return None
+        base = start // self.hop_length
+
+        # Interior frames come from (and extend) the cache
+        self._stream_frames(base + self.first_interior, base + self.last_interior)
+        columns = (base + np.arange(self.first_interior, self.last_interior)) % self.n_frames
+        self._mel[0, :, self.first_interior:self.last_interior] = self._cache[:, columns]
+
+        # Edge frames see the window's zero padding
+        samples = self.buffer.read(start, start + self.window_samples, out=self._samples)
+        left = self._edge_frames(samples, range(0, self.first_interior))
+        if left is not None:
+            self._mel[0, :, :self.first_interior] = left
+        right = self._edge_frames(samples, range(self.last_interior, self.n_frames))
+        if right is not None:
+            self._mel[0, :, self.last_interior:] = right
+        self.frames_computed += self.first_interior + self.n_frames - self.last_interior
+
+        self.windows += 1
+        return features_from_mel(self._mel, self.feature_type, self.normalize, self.extractor)[0]
+
+    def latest(self):
+        """Features for the newest full window in the buffer, or None"""
+        return self.features_at(self.buffer.total_written)
+
+class MicrophoneSource:
+    """Live audio from the default input device via PyAudio"""
+    live = True
+
+    def __init__(self, sample_rate=SAMPLE_RATE, chunk_size=CHUNK_SIZE, channels=1):
+        # PyAudio is only needed for live capture
+        import pyaudio
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.channels = channels
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(
+            format=pyaudio.paFloat32,
+            channels=channels,
+            rate=sample_rate,
+            input=True,
+            frames_per_buffer=chunk_size
+        )
+
+    def read(self):
+        """Block until the next chunk of float32 samples is available"""
+        data = self._stream.read(self.chunk_size)
+        return np.frombuffer(data, dtype=np.float32)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+            self._audio.terminate()
+
+class WavFileSource:
+    """Audio from a file, for headless runs and benchmarks
+
+    With realtime=True chunks are released at the rate they would arrive from a
+    microphone; otherwise the file is read as fast as the consumer pulls it.
+    """
+    def __init__(self, path, sample_rate=SAMPLE_RATE, chunk_size=CHUNK_SIZE, realtime=True, loop=False):
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.live = realtime
+        self.loop = loop
+        self.audio = load_audio_file(path, sample_rate)
+        self._position = 0
+        self._started = None
+        self._released = 0
+
+    def read(self):
+        """Return the next chunk, or None at the end of the file"""
+        if self._position >= len(self.audio):
+            if not self.loop or not len(self.audio):
+                return None
+            self._position = 0
+        chunk = self.audio[self._position:self._position + self.chunk_size]
+        self._position += len(chunk)
+
+        if self.live:
+            # Pace chunks to the wall clock
+            if self._started is None:
+                self._started = time.monotonic()
+            self._released += len(chunk)
+            delay = self._started + self._released / self.sample_rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return chunk
+
+    def close(self):
+        pass
+
+class StreamRecorder:
+    """Feed an audio source into a RingBuffer
+
+    Live sources are captured on a background thread. Non-live sources (a file
+    read as fast as possible) are pulled on demand by wait_for, so no audio is
+    dropped when analysis is slower than the file could be read.
+    """
+    def __init__(self, source, capacity_seconds=10.0):
+        self.source = source
+        self.buffer = RingBuffer(int(source.sample_rate * capacity_seconds))
+        self.finished = False
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        if self.source.live:
+            self._running = True
+            self._thread = threading.Thread(target=self._capture, daemon=True)
+            self._thread.start()
+
+    def _capture(self):
+        """Copy chunks from a live source into the ring buffer"""
+        while self._running:
+            try:
+                chunk = self.source.read()
+            except Exception as e:
+                print(f"Error recording audio: {e}")
+                break
+            if chunk is None:
+                break
+            self.buffer.write(chunk)
+        self.finished = True
+
+    def wait_for(self, position, timeout=None):
+        """Wait until position samples have been written; False if the stream ended first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.buffer.total_written < position:
+            if self.source.live:
+                if self.finished or (deadline is not None and time.monotonic() > deadline):
+                    return False
+                # Sleep until the missing samples should have arrived
+                missing = position - self.buffer.total_written
+                time.sleep(min(0.05, max(0.001, missing / self.source.sample_rate)))
+            else:
+                chunk = self.source.read()
+                if chunk is None:
+                    self.finished = True
+                    return False
+                self.buffer.write(chunk)
+        return True
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self.source.close()
+
+# Sample encodings accepted by StreamSession
+PCM_ENCODINGS = {'pcm16': np.dtype('<i2'), 'float32': np.dtype('<f4')}
+
+class StreamSession:
+    """One live client stream: raw PCM in, per-window predictions out
+
+    feed() takes raw little-endian mono PCM bytes (any split), resamples them
+    to sr and writes them to a ring buffer one hop at a time. Each time a
+    window of duration seconds ends on a hop boundary its features are
+    computed incrementally and handed to submit(), which returns a Future for
+    the prediction rows (an InferenceBatcher shared by all sessions). Results
+    are collected in order with poll().
+
+    Memory is fixed when the session is created: the ring buffer holds
+    buffer_seconds of audio and at most max_pending windows wait for
+    inference. When inference falls behind, windows that come due while the
+    session is at its limit are skipped rather than queued, so a slow model
+    costs update frequency instead of memory; the number skipped is reported
+    with the next result.
+
+    With a VoiceActivityDetector as vad, windows without speech are neither
+    featurized nor submitted; poll() reports them with scores of None.
+    """
+    def __init__(self, submit, sample_rate=SAMPLE_RATE, encoding='pcm16', hop_seconds=1.0,
+                 buffer_seconds=None, max_pending=4, sr=SAMPLE_RATE, duration=DURATION,
+                 n_mfcc=N_MFCC, hop_length=HOP_LENGTH, vad=None, resample_quality='hq'):
+        if encoding not in PCM_ENCODINGS:
+            raise ValueError(f"Unsupported encoding {encoding!r} (use {', '.join(PCM_ENCODINGS)})")
+        self.submit = submit
+        self.vad = vad
+        self.sr = sr
+        self.dtype = PCM_ENCODINGS[encoding]
+        self.max_pending = max(1, int(max_pending))
+        self.hop = max(1, int(round(hop_seconds * sr / hop_length))) * hop_length
+        self.window = int(sr * duration)
+
+        # The buffer must hold a window plus the hop being written and the STFT margin
+        capacity = self.window + 2 * self.hop + N_FFT
+        if buffer_seconds is not None:
+            capacity = max(capacity, int(sr * buffer_seconds))
+        self.buffer = RingBuffer(capacity)
+        self.extractor = StreamingFeatureExtractor(self.buffer, normalize=False, sr=sr,
+                                                   duration=duration, n_mfcc=n_mfcc,
+                                                   hop_length=hop_length)
+        self._resampler = None
+        if sample_rate != sr:
+            import soxr
+            self._resampler = soxr.ResampleStream(sample_rate, sr, 1, dtype='float32',
+                                                  quality=soxr_quality(resample_quality))
+
+        self._partial = b''
+        self._next_end = self.window
+        self._pending = []
+        self._skipped = 0
+        self.windows_submitted = 0
+        self.windows_skipped = 0
+        self.windows_silent = 0
+
+    @property
+    def memory_bytes(self):
+        """Approximate fixed memory held by the session"""
+        features = self.extractor._mel.nbytes + self.extractor._cache.nbytes + self.extractor._samples.nbytes
+        return self.buffer._data.nbytes + features + self.max_pending * self.extractor._mel.nbytes
+
+    @property
+    def pending(self):
+        """Windows submitted for inference whose results have not been collected"""
+        return len(self._pending)
+
+    def feed(self, data):
+        """Add the next raw PCM bytes to the stream and submit any windows that came due"""
+        data = self._partial + data
+        usable = len(data) - len(data) % self.dtype.itemsize
+        self._partial = data[usable:]
+        y = np.frombuffer(data, dtype=self.dtype, count=usable // self.dtype.itemsize)
+        if self.dtype.kind == 'i':
+            y = y.astype(np.float32) * np.float32(1 / 32768)
+        self._write(y)
+
+    def finish(self):
+        """End of stream: flush the resampler (a final partial window is not analyzed)"""
+        if self._resampler is not None:
+            tail = self._resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+            self._resampler = None
+            self._write(tail, resample=False)
+
+    def _write(self, y, resample=True):
+        if resample and self._resampler is not None:
+            y = self._resampler.resample_chunk(y)
+        # Write at most one hop at a time so no window is overwritten before use
+        for offset in range(0, len(y), self.hop):
+            self.buffer.write(y[offset:offset + self.hop])
+            while self.buffer.total_written >= self._next_end:
+                self._take_window(self._next_end)
+                self._next_end += self.hop
+
+    def _take_window(self, end):
+        if len(self._pending) >= self.max_pending:
+            self._skipped += 1
+            self.windows_skipped += 1
+            return
+        if self.vad is not None and not self.vad.gate(self.buffer.read(end - self.window, end))[0]:
+            # No speech: an already finished result, nothing for the model
+            future = concurrent.futures.Future()
+            future.set_result([None])
+            self._pending.append(((end - self.window) / self.sr, end / self.sr, self._skipped, future))
+            self._skipped = 0
+            self.windows_silent += 1
+            return
+        features = self.extractor.features_at(end)
+        # The model takes (batch, time, n_mfcc)
+        future = self.submit(features.T[np.newaxis])
+        self._pending.append(((end - self.window) / self.sr, end / self.sr, self._skipped, future))
+        self._skipped = 0
+        self.windows_submitted += 1
+
+    def poll(self, timeout=0):
+        """Collect finished predictions in stream order
+
+        Returns a list of (start, end, skipped, scores); skipped is the number
+        of windows dropped just before this one, and scores is None for a
+        window without speech. With timeout > 0, waits up to
+        that long for the oldest pending window; with None, waits for all.
+        """
+        results = []
+        while self._pending:
+            start, end, skipped, future = self._pending[0]
+            if not future.done():
+                wait = timeout if timeout is None or not results else 0
+                if wait == 0:
+                    break
+                try:
+                    future.result(wait)
+                except concurrent.futures.TimeoutError:
+                    break
+                except Exception:
+                    pass
+            self._pending.pop(0)
+            # A failed batch raises here, ending the session
+            results.append((start, end, skipped, future.result()[0]))
+        return results
+
+    def close(self):
+        """Cancel windows still waiting for inference"""
+        for _, _, _, future in self._pending:
+            future.cancel()
+        self._pending = []
@@ -0,0 +1,41 @@
+# conftest.py
+# Shared fixtures: a model server test client backed by a stub model version
+
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+from sklearn.preprocessing import LabelEncoder
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import model_server
+from inference_batcher import InferenceBatcher
+from model_registry import ModelRegistry, ModelVersion
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """A test client whose registry holds a stub version with uniform scores
+
+    The server counts as started, so nothing real is loaded. Admission
+    control is off: the test client does not close streamed responses, so
+    their work slots would never be released.
+    """
+    for name in ('emotion_model_test.h5', 'label_encoder_test.pkl'):
+        (tmp_path / name).touch()
+    encoder = LabelEncoder().fit(['female_happy', 'male_sad'])
+    def load(version, model_path, encoder_path):
+        uniform = lambda features: np.full((len(features), len(encoder.classes_)), 1 / len(encoder.classes_))
+        return ModelVersion(version, model_path, encoder_path, None, encoder,
+                            batchers={'analyze': InferenceBatcher(uniform)})
+    registry = ModelRegistry(str(tmp_path), load)
+    registry.load('test', activate=True)
+    ready = threading.Event()
+    ready.set()
+    monkeypatch.setattr(model_server, 'registry', registry)
+    monkeypatch.setattr(model_server, 'model_ready', ready)
+    monkeypatch.setattr(model_server, 'admission', None)
+    yield model_server.app.test_client()
+    registry.close()
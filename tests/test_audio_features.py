@@ -0,0 +1,73 @@
+# test_audio_features.py
+# Parity of the batched feature extractor with the per-clip librosa pipeline
+
+import os
+import sys
+
+import librosa
+import numpy as np
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+# Shared modules live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from audio_features import (DURATION, HOP_LENGTH, MAX_CHUNK_CLIPS, N_FFT, N_MELS, N_MFCC, SAMPLE_RATE,
+                            extract_features_batch)
+
+# Per-clip standardization sums in a different order than the reference, so
+# normalized MFCCs only agree to float32 rounding
+NORMALIZED_ATOL = 1e-4
+
+def synthetic_clips(n, seed=0):
+    """Fixed-length tone-plus-noise clips at random levels, as float32"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * DURATION)) / SAMPLE_RATE
+    clips = []
+    for _ in range(n):
+        tone = np.sin(2 * np.pi * rng.uniform(100, 800) * t)
+        noise = rng.standard_normal(len(t))
+        clips.append(rng.uniform(0.01, 0.5) * (0.7 * tone + 0.3 * noise))
+    return np.stack(clips).astype(np.float32)
+
+def reference_mfcc(clip):
+    return librosa.feature.mfcc(y=clip, sr=SAMPLE_RATE, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH)
+
+def reference_melspec(clip):
+    melspec = librosa.feature.melspectrogram(y=clip, sr=SAMPLE_RATE, n_mels=N_MELS)
+    return librosa.power_to_db(melspec, ref=np.max)
+
+@pytest.fixture(scope='module')
+def clips():
+    # More clips than one chunk, so the chunked path is covered too
+    return synthetic_clips(MAX_CHUNK_CLIPS + 3)
+
+def test_mfcc_matches_librosa(clips):
+    batched = extract_features_batch(clips, 'mfcc')
+    reference = np.stack([reference_mfcc(clip) for clip in clips])
+    assert batched.shape == reference.shape
+    assert np.array_equal(batched, reference)
+
+def test_melspec_matches_librosa(clips):
+    batched = extract_features_batch(clips, 'melspec')
+    reference = np.stack([reference_melspec(clip) for clip in clips])
+    assert batched.shape == reference.shape
+    assert np.array_equal(batched, reference)
+
+def test_combined_stacks_mfcc_and_melspec(clips):
+    batched = extract_features_batch(clips, 'combined')
+    reference = np.stack([np.concatenate([reference_mfcc(clip), reference_melspec(clip)[:N_MFCC]]) for clip in clips])
+    assert np.array_equal(batched, reference)
+
+def test_normalized_mfcc_is_standardized_per_clip(clips):
+    batched = extract_features_batch(clips, 'mfcc', normalize=True)
+    # StandardScaler over frames, as in the training scripts
+    reference = np.stack([StandardScaler().fit_transform(reference_mfcc(clip).T).T for clip in clips])
+    np.testing.assert_allclose(batched, reference, rtol=0, atol=NORMALIZED_ATOL)
+
+def test_batch_of_one_matches_same_clip_in_a_batch(clips):
+    single = extract_features_batch(clips[3:4], 'mfcc')
+    assert np.array_equal(single[0], extract_features_batch(clips, 'mfcc')[3])
+
+def test_unknown_feature_type_is_rejected(clips):
+    with pytest.raises(ValueError):
+        extract_features_batch(clips[:1], 'chroma')
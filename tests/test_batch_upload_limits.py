@@ -0,0 +1,49 @@
+# test_batch_upload_limits.py
+# Multipart /analyze/batch bodies are bounded per item, per count and in total
+
+import io
+import json
+
+import model_server
+
+def post_files(client, sizes, **fields):
+    files = [(io.BytesIO(b'x' * size), f'clip{i}.wav') for i, size in enumerate(sizes)]
+    return client.post('/analyze/batch', data={'audio': files, **fields}, content_type='multipart/form-data')
+
+def test_too_many_files(client, monkeypatch):
+    monkeypatch.setattr(model_server, 'MAX_BATCH_ITEMS', 2)
+    response = post_files(client, [10, 10, 10])
+    assert response.status_code == 413
+    assert response.get_json()['error'] == 'Too many items: at most 2 per request'
+
+def test_file_over_item_limit(client, monkeypatch):
+    monkeypatch.setattr(model_server, 'MAX_UPLOAD_MB', 0.001)
+    response = post_files(client, [10, 2000])
+    assert response.status_code == 413
+    assert response.get_json()['error'] == 'Item clip1.wav exceeds 0.001 MB'
+
+def test_body_over_batch_limit(client, monkeypatch):
+    monkeypatch.setattr(model_server, 'MAX_BATCH_UPLOAD_MB', 0.01)
+    response = post_files(client, [6000, 6000])
+    assert response.status_code == 413
+    assert response.get_json()['error'] == 'Upload exceeds 0.01 MB'
+
+def test_form_without_files(client):
+    response = client.post('/analyze/batch', data={'top_k': '2'}, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'No audio files provided'
+
+def test_form_fields_are_read(client):
+    response = post_files(client, [10], top_k='many')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'top_k must be an integer'
+
+def test_every_file_gets_a_line(client):
+    files = [(io.BytesIO(model_server.synthetic_wav_bytes()), 'speech.wav'), (io.BytesIO(b'x' * 10), 'junk.wav')]
+    response = client.post('/analyze/batch', data={'audio': files, 'top_k': '1'}, content_type='multipart/form-data')
+    assert response.status_code == 200
+    lines = {line['source']: line for line in map(json.loads, response.get_data(as_text=True).splitlines())}
+    assert lines['speech.wav']['index'] == 0
+    assert 'emotion' in lines['speech.wav']['result']
+    assert lines['junk.wav']['index'] == 1
+    assert lines['junk.wav']['error'].startswith('Analysis failed')
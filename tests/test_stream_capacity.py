@@ -0,0 +1,39 @@
+# test_stream_capacity.py
+# Live streams hold a request thread each, so they are capped and counted by admission control
+
+import pytest
+
+import model_server
+from admission import AdmissionController, Rejected
+
+def test_streams_and_queued_requests_share_the_thread_budget():
+    controller = AdmissionController(max_active=1, max_queue_wait=0.01, max_threads=3)
+    streams = [controller.acquire_stream(), controller.acquire_stream()]
+    ticket = controller.acquire('interactive')
+    # The last thread is taken: neither a queue place nor another stream is left
+    with pytest.raises(Rejected) as e:
+        controller.acquire('interactive')
+    assert e.value.reason == 'threads'
+    with pytest.raises(Rejected):
+        controller.acquire_stream()
+    streams[0].release()
+    assert controller.stats()['streams'] == 1
+    controller.acquire_stream().release()
+    ticket.release()
+    assert controller.stats()['active']['interactive'] == 0
+
+def test_stream_over_capacity_is_refused(client, monkeypatch):
+    monkeypatch.setattr(model_server, 'STREAM_CAPACITY', 0)
+    response = client.post('/stream', data=b'', content_type='application/octet-stream')
+    assert response.status_code == 503
+    assert response.get_json()['error'] == 'Too many open streams (at most 0)'
+
+def test_stream_refused_when_admission_has_no_thread(client, monkeypatch):
+    controller = AdmissionController(max_active=1, max_threads=1)
+    monkeypatch.setattr(model_server, 'admission', controller)
+    ticket = controller.acquire('interactive')
+    response = client.post('/stream', data=b'', content_type='application/octet-stream')
+    ticket.release()
+    assert response.status_code == 503
+    assert response.get_json()['error'] == 'Server busy: every request thread is taken'
+    assert model_server.open_streams == 0
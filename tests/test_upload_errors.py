@@ -0,0 +1,32 @@
+# test_upload_errors.py
+# Client input errors on /analyze uploads come back as 400 with a specific message
+
+import io
+
+import pytest
+
+@pytest.mark.parametrize('query', ['', '?segmented=1'])
+def test_empty_raw_body(client, query):
+    response = client.post('/analyze' + query, data=b'', content_type='application/octet-stream')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Empty upload: the request body is empty'
+
+def test_empty_file_part(client):
+    response = client.post('/analyze', data={'file': (io.BytesIO(b''), 'clip.wav')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Empty upload: the file part is empty'
+
+def test_missing_file_part(client):
+    response = client.post('/analyze', data={'top_k': '3'}, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Multipart upload without a file part'
+
+@pytest.mark.parametrize('query', ['', '?segmented=1'])
+@pytest.mark.parametrize('body', [b'not audio at all' * 64, b'RIFF\x00\x00'], ids=['text', 'truncated-wav'])
+def test_undecodable_audio(client, query, body):
+    response = client.post('/analyze' + query, data=body, content_type='application/octet-stream')
+    assert response.status_code == 400
+    error = response.get_json()['error']
+    assert error.startswith('Unsupported or undecodable audio (')
+    assert not error.endswith('()')